@@ -1,3 +1,54 @@
-from .client import *
-from .collection import *
-from .const import *
\ No newline at end of file
+import importlib
+import importlib.util
+import sys
+import typing as t
+
+# public names are resolved from these modules on first access, so that importing
+# the package (i.e. by `python -m aio_anyrun --help`) doesn't load aiohttp.
+# earlier module wins, same as star imports which were here in reverse order
+# (`const`, `collection` then `client`, so later one won).
+_LAZY_MODULES = ('client', 'collection', 'const')
+
+__all__ = [
+    # client
+    'AnyRunClient', 'AnyRunError', 'AnyRunTimeoutError',
+    'DEFAULT_BASE_URL', 'DEFAULT_CONTENT_URL', 'DEFAULT_MAX_MSG_SIZE', 'DEFAULT_COMPRESS',
+    'DEFAULT_USER_AGENT', 'SPILL_CHUNK_SIZE', 'DOWNLOAD_CHUNK_SIZE', 'DOWNLOAD_BUFFER_SIZE',
+    'DOWNLOAD_MAX_PENDING', 'generate_token', 'generate_id', 'generate_random_int_str',
+    'generate_google_analytics_id', 'generate_random_cookies_with_token', 'download_pcap', 'download_file',
+    # collection
+    'BaseCollection', 'Task', 'LazyTask', 'TaskUpdate', 'TASK_FINISHED_STATUS', 'REPUTATION_TABLE',
+    'IoCObject', 'IoC', 'Incident', 'MITRE_Attack',
+    # const
+    'AnyRunConsts', 'RUN_TYPES', 'EXTENSIONS', 'VERDICTS', 'LOCAL_MODES',
+    'HANDLER_FUNC', 'STREAM_HANDLER_FUNC', 'TRANSPORT_FUNC', 'FILTER_FUNC',
+]
+
+
+def __getattr__(name: str) -> t.Any:
+    if not name.startswith('_'):
+        # submodule, i.e. `from aio_anyrun import fakeserver`
+        if importlib.util.find_spec(f'{__name__}.{name}') is not None:
+            return importlib.import_module(f'{__name__}.{name}')
+        for module_name in _LAZY_MODULES:
+            module = importlib.import_module(f'{__name__}.{module_name}')
+            if hasattr(module, name):
+                value = getattr(module, name)
+                globals()[name] = value
+                return value
+    raise AttributeError(f'module {__name__!r} has no attribute {name!r}')
+
+
+def __dir__() -> t.List[str]:
+    names = set(globals())
+    for module_name in _LAZY_MODULES:
+        module = importlib.import_module(f'{__name__}.{module_name}')
+        names.update(name for name in dir(module) if not name.startswith('_'))
+    return sorted(names)
+
+
+if sys.version_info < (3, 7):
+    # module `__getattr__` is not supported
+    from .const import *
+    from .collection import *
+    from .client import *
@@ -1,16 +1,17 @@
+''' Command line interface.
+heavy modules (aiohttp, client, bulk runner) are imported in commands which use them,
+so that `--help` and argument errors return quickly.
+'''
 import click
 import logging
 import os
-import asyncio
 import typing as t
 from functools import wraps
-from uuid import UUID
-from getpass import getpass
 
-from aio_anyrun.client import AnyRunClient
 from aio_anyrun import const as cst
 
 def is_valid_uuid(ctx, param, value):
+    from uuid import UUID
     try:
         UUID(value)
     except ValueError:
@@ -26,6 +27,7 @@ def get_email():
 def get_password():
     password = os.environ.get('ANYRUN_PASSWORD')
     if password is None:
+        from getpass import getpass
         password = getpass('Password: ')
     return password
 
@@ -38,6 +40,7 @@ def enable_debug_logging():
 def coro(f):
     @wraps(f)
     def wrapper(*args, **kwargs):
+        import asyncio
         return asyncio.run(f(*args, **kwargs))
     return wrapper
 
@@ -55,6 +58,8 @@ def cli(ctx):
 @click.option('-d', '--dest', type=str, default='.', help='path to save file')
 @coro
 async def download_file(uuid: str, email: str, dest: str):
+    from aio_anyrun.client import AnyRunClient
+
     # get credentials
     email = email or get_email()
     password = get_password()
@@ -78,8 +83,12 @@ async def download_file(uuid: str, email: str, dest: str):
 @click.option('-u', '--uuid', callback=is_valid_uuid, type=str, required=True, help='UUID for task')
 @click.option('-e', '--email', type=str, help='email address for ANY.RUN')
 @click.option('-d', '--dest', type=str, default='.', help='path to save pcap')
+@click.option('-s', '--summarize', is_flag=True, default=False, help='save flow summary next to pcap')
+@click.option('--summary-only', is_flag=True, default=False, help='save flow summary only, not pcap')
 @coro
-async def download_pcap(uuid: str, email: str, dest: str):
+async def download_pcap(uuid: str, email: str, dest: str, summarize: bool, summary_only: bool):
+    from aio_anyrun.client import AnyRunClient
+
     # get credentials
     email = email or get_email()
     password = get_password()
@@ -90,7 +99,8 @@ async def download_pcap(uuid: str, email: str, dest: str):
                 raise RuntimeError(f'Login failed.')
 
             task = await c.get_single_task(uuid)
-            saved_path = await c.download_pcap(task, dest)
+            saved_path = await c.download_pcap(
+                task, dest, summarize=summarize or summary_only, keep_pcap=not summary_only)
             click.echo(f'[*] download success.\npath:\t{saved_path.absolute()}')
     except Exception as e:
         click.echo(f'[!] download fail. err: {e}')
@@ -124,6 +134,8 @@ async def search(
     tag: str,
     debug: bool
 ):
+    from aio_anyrun.client import AnyRunClient
+
     if debug:
         enable_debug_logging()
 
@@ -158,6 +170,8 @@ async def search(
 @click.option('--debug', is_flag=True, default=False, help='enable debug logging')
 @coro
 async def get_ioc(uuid: str, raw: bool, debug: bool):
+    from aio_anyrun.client import AnyRunClient
+
     if debug:
         enable_debug_logging()
 
@@ -173,6 +187,32 @@ async def get_ioc(uuid: str, raw: bool, debug: bool):
                     click.echo()
 
 
+@cli.command(help='Fetch tasks or IoCs of many UUIDs with process pool, results are saved as JSON lines')
+@click.option('-i', '--input', 'input_', type=click.File('r'), required=True, help='file of UUIDs, one per line')
+@click.option('-o', '--output', type=str, required=True, help='path of JSON lines output, existing output is resumed')
+@click.option('--ioc', is_flag=True, default=False, help='fetch IoCs instead of tasks')
+@click.option('-p', '--processes', type=int, default=None, help='number of worker processes')
+@click.option('-e', '--email', type=str, help='email address for ANY.RUN, login if given')
+@click.option('--debug', is_flag=True, default=False, help='enable debug logging')
+def bulk(input_: t.TextIO, output: str, ioc: bool, processes: t.Optional[int], email: t.Optional[str], debug: bool):
+    from aio_anyrun.bulk import BulkRunner
+
+    if debug:
+        enable_debug_logging()
+
+    uuids = [line.strip() for line in input_ if line.strip()]
+    password = get_password() if email else None
+    with click.progressbar(length=len(uuids), label='fetching') as bar:
+        def progress(done: int, total: int):
+            bar.update(done - bar.pos)
+
+        runner = BulkRunner(
+            output, operation='ioc' if ioc else 'task', processes=processes,
+            email=email, password=password, progress=progress)
+        runner.run(uuids)
+    click.echo(f'[*] bulk run finished. output: {output}')
+
+
 def main():
     cli()
 
@@ -0,0 +1,200 @@
+''' Bounded-memory aggregation of IoCs across many tasks.
+
+Usage:
+    ... from aio_anyrun.aggregate import IoCAggregator
+    ... aggregator = IoCAggregator(k=50)
+    ... async with AnyRunClient.connect() as client:
+    ...     for task in await client.get_public_tasks():
+    ...         aggregator.add(await client.get_ioc(task.task_uuid))
+    ... aggregator.top(10, category='DNS requests', reputation='malicious')
+
+IoCs are grouped by category and reputation, and each group keeps heavy hitters (`TopK`),
+`CountMinSketch` for count of any value and `HyperLogLog` for number of distinct values.
+counts are number of tasks which have the value, so memory doesn't grow with number of tasks.
+aggregators built by different workers can be merged, and saved to file.
+'''
+import json
+import os
+import struct
+import typing as t
+from pathlib import Path
+
+from aio_anyrun import collection
+from aio_anyrun.sketch import CountMinSketch, HyperLogLog, TopK
+
+
+# (category, reputation)
+GROUP_KEY = t.Tuple[str, str]
+
+
+class _Group:
+    __slots__ = ('top', 'counts', 'distinct')
+
+    def __init__(self, top: TopK, counts: CountMinSketch, distinct: HyperLogLog):
+        self.top = top
+        self.counts = counts
+        self.distinct = distinct
+
+    def add(self, value: str):
+        self.top.add(value)
+        self.counts.add(value)
+        self.distinct.add(value)
+
+    def merge(self, other: '_Group'):
+        self.top.merge(other.top)
+        self.counts.merge(other.counts)
+        self.distinct.merge(other.distinct)
+
+
+class IoCAggregator:
+    ''' Aggregate `collection.IoC` of many tasks into sketches per category and reputation.
+
+    Args:
+        k: number of heavy hitters which are expected to be exact.
+        capacity: counters of heavy hitters kept per group, default is `10 * k`.
+        width: counters per row of count-min sketch.
+        depth: rows of count-min sketch.
+        precision: index bits of HyperLogLog.
+    '''
+    _HEADER = struct.Struct('<4sI')
+    _MAGIC = b'AGG1'
+
+    def __init__(
+        self,
+        k: int = 100,
+        capacity: t.Optional[int] = None,
+        width: int = 2048,
+        depth: int = 4,
+        precision: int = 12
+    ):
+        self.k = k
+        self.capacity = capacity or 10 * k
+        self.width = width
+        self.depth = depth
+        self.precision = precision
+        # number of added IoC reports
+        self.tasks = 0
+        self._groups: t.Dict[GROUP_KEY, _Group] = {}
+
+    def _new_group(self) -> _Group:
+        return _Group(TopK(self.capacity), CountMinSketch(self.width, self.depth), HyperLogLog(self.precision))
+
+    @property
+    def groups(self) -> t.List[GROUP_KEY]:
+        return sorted(self._groups)
+
+    def add(self, ioc: collection.IoC):
+        ''' add IoC report of one task. same value in one report is counted once.
+        '''
+        seen: t.Set[t.Tuple[str, str, str]] = set()
+        for objects in ioc.raw_data.values():
+            for obj in objects or []:
+                value = obj.get('ioc')
+                if not value:
+                    continue
+                category = obj.get('category') or ''
+                reputation = collection.REPUTATION_TABLE.get(obj.get('reputation'), 'unknown')
+                if (category, reputation, value) in seen:
+                    continue
+                seen.add((category, reputation, value))
+                group = self._groups.get((category, reputation))
+                if group is None:
+                    group = self._groups[(category, reputation)] = self._new_group()
+                group.add(value)
+        self.tasks += 1
+
+    def update(self, iocs: t.Iterable[collection.IoC]):
+        for ioc in iocs:
+            self.add(ioc)
+
+    def _select(self, category: t.Optional[str], reputation: t.Optional[str]) -> t.List[_Group]:
+        return [
+            group for (group_category, group_reputation), group in sorted(self._groups.items())
+            if (category is None or group_category == category)
+            and (reputation is None or group_reputation == reputation)]
+
+    def top(
+        self,
+        n: t.Optional[int] = None,
+        category: t.Optional[str] = None,
+        reputation: t.Optional[str] = None
+    ) -> t.List[t.Tuple[str, int, int]]:
+        ''' most recurring values as list of `(value, tasks, error)`.
+        count is overestimated by at most `error`. None of `category` or `reputation` means all.
+        '''
+        groups = self._select(category, reputation)
+        if len(groups) == 1:
+            return groups[0].top.top(n or self.k)
+        merged = TopK(self.capacity)
+        for group in groups:
+            merged.merge(group.top)
+        return merged.top(n or self.k)
+
+    def estimate(self, value: str, category: t.Optional[str] = None, reputation: t.Optional[str] = None) -> int:
+        ''' number of tasks which have `value`, never underestimated.
+        '''
+        return sum(group.counts.estimate(value) for group in self._select(category, reputation))
+
+    def distinct(self, category: t.Optional[str] = None, reputation: t.Optional[str] = None) -> int:
+        ''' estimated number of distinct values.
+        '''
+        merged = HyperLogLog(self.precision)
+        for group in self._select(category, reputation):
+            merged.merge(group.distinct)
+        return merged.count()
+
+    def merge(self, other: 'IoCAggregator'):
+        ''' add counts of `other`, which must be built with same sketch parameters.
+        '''
+        if (self.width, self.depth, self.precision) != (other.width, other.depth, other.precision):
+            raise ValueError('Sketch parameters of aggregators differ.')
+        for key, group in other._groups.items():
+            if key not in self._groups:
+                self._groups[key] = self._new_group()
+            self._groups[key].merge(group)
+        self.tasks += other.tasks
+
+    def to_bytes(self) -> bytes:
+        groups = []
+        blobs = []
+        for (category, reputation), group in sorted(self._groups.items()):
+            parts = [group.top.to_bytes(), group.counts.to_bytes(), group.distinct.to_bytes()]
+            groups.append([category, reputation, [len(part) for part in parts]])
+            blobs.extend(parts)
+        meta = json.dumps({
+            'k': self.k, 'capacity': self.capacity, 'width': self.width, 'depth': self.depth,
+            'precision': self.precision, 'tasks': self.tasks, 'groups': groups
+        }).encode('utf-8')
+        return self._HEADER.pack(self._MAGIC, len(meta)) + meta + b''.join(blobs)
+
+    @classmethod
+    def from_bytes(cls, data: bytes) -> 'IoCAggregator':
+        magic, meta_size = cls._HEADER.unpack_from(data)
+        if magic != cls._MAGIC:
+            raise ValueError('Not a serialized IoCAggregator.')
+        pos = cls._HEADER.size
+        meta = json.loads(data[pos:pos + meta_size].decode('utf-8'))
+        pos += meta_size
+
+        aggregator = cls(meta['k'], meta['capacity'], meta['width'], meta['depth'], meta['precision'])
+        aggregator.tasks = meta['tasks']
+        for category, reputation, sizes in meta['groups']:
+            parts = []
+            for size in sizes:
+                parts.append(data[pos:pos + size])
+                pos += size
+            aggregator._groups[(category, reputation)] = _Group(
+                TopK.from_bytes(parts[0]), CountMinSketch.from_bytes(parts[1]), HyperLogLog.from_bytes(parts[2]))
+        if pos != len(data):
+            raise ValueError('Broken IoCAggregator.')
+        return aggregator
+
+    def save(self, path: t.Union[str, Path]):
+        path = Path(path)
+        tmp = path.with_name(path.name + '.tmp')
+        tmp.write_bytes(self.to_bytes())
+        os.replace(str(tmp), str(path))
+
+    @classmethod
+    def load(cls, path: t.Union[str, Path]) -> 'IoCAggregator':
+        return cls.from_bytes(Path(path).read_bytes())
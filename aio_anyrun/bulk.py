@@ -0,0 +1,266 @@
+''' Bulk runner to fetch huge number of tasks with process pool.
+
+Usage:
+    ... from aio_anyrun.bulk import BulkRunner
+    ... runner = BulkRunner('tasks.jsonl', processes=8)
+    ... runner.run(uuids)
+
+Inputs are split into chunks and sent to worker processes, each of them has its own
+`AnyRunClient` connection (and login). JSON decoding and building results are done in workers,
+and results are written to output in the same order as inputs, one JSON line per input:
+    {"input": <uuid or query>, "result": <raw document(s)>}
+    {"input": <uuid or query>, "error": <message>}
+
+Output is flushed chunk by chunk, so running again with the same inputs resumes after
+the last written line. error lines are kept as done on resume, unless `retry_errors` is given
+to `BulkRunner.run`. Connections of workers are logged out and closed when pool finishes.
+'''
+import asyncio
+import json
+import logging
+import multiprocessing
+import multiprocessing.util
+import os
+import typing as t
+from pathlib import Path
+
+from aio_anyrun.client import AnyRunClient
+
+
+logger = logging.getLogger(__name__)
+
+OPERATIONS = ('task', 'ioc', 'search')
+
+PROGRESS_FUNC = t.Callable[[int, int], None]
+
+# state of worker process, set by `_init_worker`
+_worker: t.Dict[str, t.Any] = {}
+
+
+def _init_worker(email: t.Optional[str], password: t.Optional[str], connect_kwargs: dict):
+    loop = asyncio.new_event_loop()
+    asyncio.set_event_loop(loop)
+    _worker.update(
+        loop=loop, lock=None, context=None, client=None, email=email, password=password, connect_kwargs=connect_kwargs)
+    # run when worker process exits, after pool is closed and joined
+    multiprocessing.util.Finalize(None, _close_worker, exitpriority=10)
+
+
+async def _disconnect():
+    context, client = _worker['context'], _worker['client']
+    _worker.update(context=None, client=None)
+    if context is None:
+        return
+    try:
+        if _worker['email'] and client._reader_error is None:
+            await client.logout(timeout=10)
+    except Exception as e:
+        logger.debug(f'Failed to logout. err={e}')
+    finally:
+        await context.__aexit__(None, None, None)
+
+
+def _close_worker():
+    loop = _worker.get('loop')
+    if loop is None or loop.is_closed():
+        return
+    try:
+        loop.run_until_complete(_disconnect())
+    except Exception as e:
+        logger.debug(f'Failed to close connection of worker. err={e}')
+    finally:
+        loop.close()
+
+
+async def _connect() -> AnyRunClient:
+    client: t.Optional[AnyRunClient] = _worker['client']
+    if client is not None and client.client is not None and not client.client.closed \
+            and client._reader_error is None:
+        return client
+    context, _worker['context'], _worker['client'] = _worker['context'], None, None
+    if context is not None:
+        await context.__aexit__(None, None, None)
+
+    # connection lives as long as worker process
+    context = AnyRunClient.connect(**_worker['connect_kwargs'])
+    client = await context.__aenter__()
+    try:
+        if _worker['email'] and _worker['password']:
+            if not await client.login(_worker['email'], _worker['password']):
+                raise RuntimeError('Login failed.')
+    except BaseException:
+        await context.__aexit__(None, None, None)
+        raise
+    _worker.update(context=context, client=client)
+    return client
+
+
+async def _get_client() -> AnyRunClient:
+    # inputs of chunk are requested concurrently over one connection
+    if _worker['lock'] is None:
+        _worker['lock'] = asyncio.Lock()
+    async with _worker['lock']:
+        return await _connect()
+
+
+async def _fetch(operation: str, item: t.Any) -> t.Any:
+    client = await _get_client()
+    if operation == 'task':
+        return (await client.get_single_task(item)).raw_data
+    if operation == 'ioc':
+        return (await client.get_ioc(item)).raw_data
+    return [task.raw_data for task in await client.search(**item)]
+
+
+async def _run_chunk(operation: str, chunk: t.List[t.Any]) -> t.List[str]:
+    async def run(item: t.Any) -> str:
+        try:
+            return json.dumps({'input': item, 'result': await _fetch(operation, item)})
+        except Exception as e:
+            logger.debug(f'Failed to fetch. input={item}, err={e}')
+            return json.dumps({'input': item, 'error': str(e)})
+
+    return await asyncio.gather(*(run(item) for item in chunk))
+
+
+def _work(job: t.Tuple[str, t.List[t.Any]]) -> t.List[str]:
+    operation, chunk = job
+    return _worker['loop'].run_until_complete(_run_chunk(operation, chunk))
+
+
+def _count_lines(path: Path) -> t.Tuple[int, t.Optional[bytes]]:
+    ''' count complete lines of output, and drop incomplete last line written by crashed run.
+    return the count and the last complete line.
+    '''
+    if not path.exists():
+        return 0, None
+    count = 0
+    complete = 0
+    last = None
+    with path.open('rb') as fd:
+        for line in fd:
+            if not line.endswith(b'\n'):
+                break
+            count += 1
+            complete += len(line)
+            last = line
+    if complete != path.stat().st_size:
+        with path.open('r+b') as fd:
+            fd.truncate(complete)
+    return count, last
+
+
+def _error_lines(path: Path) -> t.List[int]:
+    ''' indices of lines of output which have error instead of result.
+    '''
+    with path.open('rb') as fd:
+        return [i for i, line in enumerate(fd) if b'"error"' in line and 'error' in json.loads(line)]
+
+
+class BulkRunner:
+    ''' Fetch tasks, IoCs or search results of many inputs with process pool.
+
+    Args:
+        output: path of JSON lines output.
+        operation: 'task' (input is UUID), 'ioc' (input is UUID)
+            or 'search' (input is dict of `AnyRunClient.search` parameters).
+        processes: number of worker processes, default is number of CPUs.
+        chunk_size: number of inputs sent to worker at once, they are requested concurrently.
+        email: email to login in each worker, optional.
+        password: password to login in each worker, optional.
+        progress: function called as `progress(done, total)` after each chunk is written.
+        mp_context: multiprocessing context, i.e. `multiprocessing.get_context('spawn')`.
+        connect_kwargs: keyword arguments for `AnyRunClient.connect`.
+    '''
+    def __init__(
+        self,
+        output: t.Union[str, Path],
+        operation: str = 'task',
+        processes: t.Optional[int] = None,
+        chunk_size: int = 20,
+        email: t.Optional[str] = None,
+        password: t.Optional[str] = None,
+        progress: t.Optional[PROGRESS_FUNC] = None,
+        mp_context: t.Optional[t.Any] = None,
+        **connect_kwargs
+    ):
+        if operation not in OPERATIONS:
+            raise ValueError(f'Unknown operation. operation={operation}, choices={OPERATIONS}')
+        self.output = Path(output)
+        self.operation = operation
+        self.processes = processes or os.cpu_count() or 1
+        self.chunk_size = chunk_size
+        self.email = email
+        self.password = password
+        self.progress = progress
+        self.mp_context = mp_context or multiprocessing
+        self.connect_kwargs = connect_kwargs
+
+    def _chunks(self, items: t.List[t.Any], start: int) -> t.Iterator[t.Tuple[str, t.List[t.Any]]]:
+        for i in range(start, len(items), self.chunk_size):
+            yield self.operation, items[i:i + self.chunk_size]
+
+    def _replace_lines(self, replaced: t.Dict[int, str]):
+        ''' rewrite output with lines of given indices replaced.
+        '''
+        tmp = self.output.with_name(self.output.name + '.tmp')
+        with self.output.open(encoding='utf-8') as src, tmp.open('w', encoding='utf-8') as dst:
+            for i, line in enumerate(src):
+                dst.write(replaced[i] + '\n' if i in replaced else line)
+        os.replace(str(tmp), str(self.output))
+
+    def run(self, items: t.Iterable[t.Any], resume: bool = True, retry_errors: bool = False) -> int:
+        ''' fetch all inputs and write results to output.
+        return number of inputs processed by this run.
+
+        Args:
+            items: UUIDs, or queries for 'search' operation.
+            resume: skip inputs which already have results in output.
+                if False, output is overwritten.
+            retry_errors: on resume, fetch again inputs whose line has error, and replace the lines.
+                otherwise they are kept as done (i.e. unknown UUID fails again anyway).
+        '''
+        items = list(items)
+        done, last = _count_lines(self.output) if resume else (0, None)
+        if done > len(items):
+            raise ValueError(f'Output has more lines than inputs. output={self.output}, lines={done}')
+        # inputs are compared as written to output
+        if last is not None and json.loads(last)['input'] != json.loads(json.dumps(items[done - 1])):
+            raise ValueError(
+                f'Output is written for other inputs. output={self.output}, line={done}, input={items[done - 1]}')
+        if done:
+            logger.info(f'Resume bulk run. output={self.output}, done={done}, total={len(items)}')
+
+        retry = _error_lines(self.output) if done and retry_errors else []
+        if retry:
+            logger.info(f'Retry errors of bulk run. output={self.output}, errors={len(retry)}')
+
+        start = done
+        initargs = (self.email, self.password, self.connect_kwargs)
+        with self.mp_context.Pool(self.processes, _init_worker, initargs) as pool:
+            if retry:
+                retried = [line for lines in pool.imap(_work, self._chunks([items[i] for i in retry], 0))
+                           for line in lines]
+                self._replace_lines(dict(zip(retry, retried)))
+
+            with self.output.open('a' if resume else 'w', encoding='utf-8') as fd:
+                # `imap` returns results in order of chunks
+                for lines in pool.imap(_work, self._chunks(items, start)):
+                    fd.write(''.join(line + '\n' for line in lines))
+                    fd.flush()
+                    done += len(lines)
+                    if self.progress is not None:
+                        self.progress(done, len(items))
+                    logger.debug(f'Bulk progress. done={done}, total={len(items)}')
+            # let workers exit by themselves to close their connections, instead of terminating them
+            pool.close()
+            pool.join()
+        return done - start + len(retry)
+
+
+def read_results(path: t.Union[str, Path]) -> t.Iterator[dict]:
+    ''' read output of `BulkRunner`.
+    '''
+    with Path(path).open(encoding='utf-8') as fd:
+        for line in fd:
+            yield json.loads(line)
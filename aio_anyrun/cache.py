@@ -0,0 +1,86 @@
+''' Short-lived cache of query results, shared by identical queries.
+
+Usage:
+    ... from aio_anyrun.cache import QueryCache
+    ... async with AnyRunClient.connect(query_cache=QueryCache(ttl=30)) as client:
+    ...     tasks = await client.search(run_type='file', tag='emotet')
+    ...     tasks = await client.search(run_type=['file'], tag='emotet')   # served from cache
+    ...     tasks = await client.search(run_type='file', tag='emotet', cache=False)   # always requested
+
+Queries are keyed on normalized request parameters: lists are sorted and parameters
+equal to their defaults are dropped, so different spellings of the same query share entry.
+results are cached as JSON text by client, and new objects are decoded from them on every hit.
+'''
+import collections
+import json
+import time
+import typing as t
+
+
+def normalize(params: dict, defaults: t.Optional[dict] = None) -> dict:
+    ''' parameters without defaults, with lists sorted.
+    '''
+    defaults = defaults or {}
+    normalized = {}
+    for key, value in params.items():
+        if isinstance(value, (list, tuple)):
+            value = sorted(value, key=lambda item: json.dumps(item, sort_keys=True))
+        if key in defaults and value == defaults[key]:
+            continue
+        normalized[key] = value
+    return normalized
+
+
+class QueryCache:
+    ''' TTL cache of query results with LRU eviction.
+
+    Args:
+        ttl: seconds to keep result.
+        max_size: max number of results, least recently used one is evicted first.
+        clock: function returning current time as second.
+    '''
+    def __init__(self, ttl: float = 30.0, max_size: int = 128, clock: t.Callable[[], float] = time.monotonic):
+        self.ttl = ttl
+        self.max_size = max_size
+        self.clock = clock
+        self.hits = 0
+        self.misses = 0
+        # key: (expiry, result)
+        self._entries: 'collections.OrderedDict[str, t.Tuple[float, t.Any]]' = collections.OrderedDict()
+
+    @staticmethod
+    def key(name: str, params: dict, defaults: t.Optional[dict] = None) -> str:
+        return name + ':' + json.dumps(normalize(params, defaults), sort_keys=True, separators=(',', ':'))
+
+    def get(self, key: str) -> t.Optional[t.Any]:
+        entry = self._entries.get(key)
+        if entry is not None and entry[0] <= self.clock():
+            del self._entries[key]
+            entry = None
+        if entry is None:
+            self.misses += 1
+            return None
+        self._entries.move_to_end(key)
+        self.hits += 1
+        return entry[1]
+
+    def put(self, key: str, result: t.Any):
+        self._entries[key] = (self.clock() + self.ttl, result)
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_size:
+            self._entries.popitem(last=False)
+
+    def invalidate(self, key: t.Optional[str] = None):
+        ''' drop result of `key`, or all results.
+        '''
+        if key is None:
+            self._entries.clear()
+        else:
+            self._entries.pop(key, None)
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def __contains__(self, key: str) -> bool:
+        entry = self._entries.get(key)
+        return entry is not None and entry[0] > self.clock()
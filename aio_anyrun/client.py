@@ -1,4 +1,11 @@
 import aiohttp
+import asyncio
+import collections
+import contextlib
+import contextvars
+import copy
+import gzip
+import inspect
 import json
 import hashlib
 import logging
@@ -6,6 +13,9 @@ import time
 import string
 import random
 import typing as t
+from datetime import datetime, timezone
+from concurrent.futures import ThreadPoolExecutor
+from functools import partial, wraps
 from pathlib import Path
 
 try:
@@ -15,11 +25,43 @@ except ImportError:
 
 from aio_anyrun import collection
 from aio_anyrun import const as cst
+from aio_anyrun import pcap
+from aio_anyrun.cache import QueryCache
+from aio_anyrun.index import IndexQueryError, TaskIndex
+from aio_anyrun.mitre import DEFAULT_REFRESH_INTERVAL, MitreCatalog
+from aio_anyrun.scheduler import RequestScheduler
 
 
 logger = logging.getLogger(__name__)
 
 
+# base URLs of ANY.RUN, can be overridden to target another server (i.e. `aio_anyrun.fakeserver`)
+DEFAULT_BASE_URL = 'https://app.any.run'
+DEFAULT_CONTENT_URL = 'https://content.any.run'
+
+# max size of websocket message, 0 means unlimited. same as default of aiohttp
+DEFAULT_MAX_MSG_SIZE = 4 * 1024 * 1024
+
+# window bits of permessage-deflate to negotiate, 0 disables compression (opt-in)
+DEFAULT_COMPRESS = 0
+
+# chunk size of writing bulky result to file
+SPILL_CHUNK_SIZE = 1024 * 1024
+
+# chunk size of reading download, and size of buffer written to file at once
+DOWNLOAD_CHUNK_SIZE = 64 * 1024
+DOWNLOAD_BUFFER_SIZE = 1024 * 1024
+# max number of buffers waiting for disk per download
+DOWNLOAD_MAX_PENDING = 4
+
+# priority class of requests sent in current context, see `AnyRunClient.priority`
+_request_priority: 'contextvars.ContextVar[t.Optional[str]]' = contextvars.ContextVar('request_priority', default=None)
+# set while public method runs, so that its nested requests are limited by its timeout only
+_in_request: 'contextvars.ContextVar[bool]' = contextvars.ContextVar('in_request', default=False)
+
+# used to sort tasks without start time
+_EPOCH = datetime.fromtimestamp(0, timezone.utc)
+
 # this will be used on downloading file
 DEFAULT_USER_AGENT = 'Mozilla/5.0 (Macintosh; Intel Mac OS X 10_15_2) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/79.0.3945.88 Safari/537.36'
 
@@ -45,36 +87,217 @@ def generate_random_cookies_with_token(token: str) -> dict:
         '_gid': generate_google_analytics_id(),
         'tokenLogin': token}
 
+async def _default_transport(
+    session: aiohttp.ClientSession,
+    url: str,
+    **kwargs
+) -> aiohttp.ClientWebSocketResponse:
+    ''' Default transport, open websocket with given aiohttp session.
+    '''
+    return await session.ws_connect(url, **kwargs)
+
+class _RawResult(str):
+    ''' JSON text of result, which is not decoded.
+    '''
+
+
+_decoder = json.JSONDecoder()
+
+
+def _skip_space(text: str, pos: int) -> int:
+    while pos < len(text) and text[pos] in ' \t\n\r':
+        pos += 1
+    return pos
+
+def _split_result(text: str) -> t.Optional[t.Tuple[dict, str]]:
+    ''' split text of DDP result message into its other fields and JSON text of 'result',
+    without decoding the result. None if it's not such a message, or 'result' is not placed
+    after 'msg' and 'id' (then it's decoded as usual).
+    '''
+    pos = _skip_space(text, 0)
+    if not text.startswith('{', pos):
+        return None
+    fields: t.Dict[str, t.Any] = {}
+    pos += 1
+    while True:
+        pos = _skip_space(text, pos)
+        key, pos = _decoder.raw_decode(text, pos)
+        pos = _skip_space(text, pos)
+        if not isinstance(key, str) or not text.startswith(':', pos):
+            return None
+        pos = _skip_space(text, pos + 1)
+        if key == 'result':
+            if fields.get('msg') != 'result' or 'id' not in fields:
+                return None
+            end = text.rstrip().rfind('}')
+            return fields, text[pos:end].rstrip()
+        fields[key], pos = _decoder.raw_decode(text, pos)
+        if key == 'msg' and fields[key] != 'result':
+            return None
+        pos = _skip_space(text, pos)
+        if not text.startswith(',', pos):
+            return None
+        pos += 1
+
+def _save_result(data: t.Any, dest: Path, compress: bool = False) -> Path:
+    ''' write result into file chunk by chunk, gzipped if `compress` is True.
+    result other than str is saved as json, `_RawResult` as its text.
+    '''
+    if isinstance(data, _RawResult):
+        if data.startswith('"'):
+            data = json.loads(data)
+    elif not isinstance(data, str):
+        data = json.dumps(data)
+    opener = partial(gzip.open, compresslevel=6) if compress else open
+    with opener(str(dest), 'wt', encoding='utf-8') as fd:
+        for i in range(0, len(data), SPILL_CHUNK_SIZE):
+            fd.write(data[i:i + SPILL_CHUNK_SIZE])
+    return dest
+
+def _result_path(dest: t.Union[str, Path], filename: str, compress: bool) -> Path:
+    dest = Path(dest)
+    if dest.is_dir():
+        dest = dest / filename
+    if compress and dest.suffix != '.gz':
+        dest = dest.with_name(dest.name + '.gz')
+    return dest
+
+class _FileWriter:
+    ''' Write chunks to file on its own thread, so that slow disk doesn't block event loop.
+    chunks are coalesced into buffers of `buffer_size`, and `write` waits while
+    `max_pending` buffers are waiting for disk.
+    '''
+    def __init__(
+        self,
+        path: Path,
+        buffer_size: int = DOWNLOAD_BUFFER_SIZE,
+        max_pending: int = DOWNLOAD_MAX_PENDING
+    ):
+        self.path = path
+        self.buffer_size = buffer_size
+        self.max_pending = max_pending
+        # single thread keeps writes in order
+        self._executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix='aio_anyrun_writer')
+        self._pending: t.Deque[asyncio.Future] = collections.deque()
+        self._chunks: t.List[bytes] = []
+        self._size = 0
+        self._fd: t.Optional[t.BinaryIO] = None
+
+    def _submit(self, func: t.Callable, *args) -> asyncio.Future:
+        return asyncio.get_event_loop().run_in_executor(self._executor, func, *args)
+
+    async def open(self):
+        self._fd = await self._submit(self.path.open, 'wb')
+
+    async def write(self, chunk: bytes):
+        self._chunks.append(chunk)
+        self._size += len(chunk)
+        if self._size >= self.buffer_size:
+            await self._flush()
+
+    async def _flush(self):
+        if self._chunks:
+            data = self._chunks[0] if len(self._chunks) == 1 else b''.join(self._chunks)
+            self._chunks, self._size = [], 0
+            self._pending.append(self._submit(self._fd.write, data))
+        while self._pending and (len(self._pending) >= self.max_pending or self._pending[0].done()):
+            await self._pending.popleft()
+
+    async def close(self, abort: bool = False):
+        ''' flush buffered chunks and close file. if `abort`, buffered chunks are dropped
+        and errors of pending writes are ignored.
+        '''
+        try:
+            if not abort:
+                await self._flush()
+            pending, self._pending = list(self._pending), collections.deque()
+            results = await asyncio.gather(*pending, return_exceptions=True)
+            if not abort:
+                for result in results:
+                    if isinstance(result, BaseException):
+                        raise result
+        finally:
+            if self._fd is not None:
+                await self._submit(self._fd.close)
+            self._executor.shutdown(wait=False)
+
 async def _download(
     url: str,
     dest: str,
-    chunk_size: int = 1024,
+    chunk_size: int = DOWNLOAD_CHUNK_SIZE,
+    on_chunk: t.Optional[t.Callable[[bytes], None]] = None,
+    save: bool = True,
     **kwargs
 ) -> Path:
+    ''' Download content to `dest`, and return saved path.
+    file is written on separate thread, see `_FileWriter`.
+
+    Args:
+        on_chunk: function called with each downloaded chunk, in order.
+        save: if False, content is not saved and returned path doesn't exist.
+    '''
     async with aiohttp.ClientSession() as session:
         async with session.get(url, **kwargs) as resp:
             save_path = Path(dest, resp.content_disposition.filename)
-            with save_path.open('wb') as fd:
+            writer = _FileWriter(save_path) if save else None
+            try:
+                if writer is not None:
+                    await writer.open()
                 async for chunk in resp.content.iter_chunked(chunk_size):
-                    fd.write(chunk)
-                return save_path
+                    if on_chunk is not None:
+                        on_chunk(chunk)
+                    if writer is not None:
+                        await writer.write(chunk)
+            except BaseException:
+                if writer is not None:
+                    await writer.close(abort=True)
+                raise
+            if writer is not None:
+                await writer.close()
+            return save_path
 
 async def download_pcap(
     task_uuid: str,
     token: str,
     dest: str = '.',
-    raise_for_status: bool = True
+    raise_for_status: bool = True,
+    base_url: str = DEFAULT_BASE_URL,
+    content_url: str = DEFAULT_CONTENT_URL,
+    summarize: bool = False,
+    keep_pcap: bool = True
 ) -> Path:
-    url = f'https://content.any.run/tasks/{task_uuid}/download/pcap'
+    ''' Download pcap from ANY.RUN.
+    Args:
+        task_uuid: UUID of task
+        token: login token, this can be retrieve when you login
+        raise_for_status: if True, raise exception when status is not 200
+        base_url: base URL of ANY.RUN app, used for Referer
+        content_url: base URL of ANY.RUN content server
+        summarize: build flow summary while downloading, and save it as '<pcap name>.summary.json'.
+            see `aio_anyrun.pcap`.
+        keep_pcap: save pcap. if False, only summary is saved and its path is returned.
+    '''
+    if not (keep_pcap or summarize):
+        raise ValueError('Nothing to save, `keep_pcap` or `summarize` is required.')
+
+    url = f'{content_url}/tasks/{task_uuid}/download/pcap'
 
     headers = {
-        'Referer': f'https://app.any.run/tasks/{task_uuid}/',
+        'Referer': f'{base_url}/tasks/{task_uuid}/',
         'User-Agent': DEFAULT_USER_AGENT
     }
     cookies = generate_random_cookies_with_token(token)
 
-    return await _download(
-        url, dest, headers=headers, cookies=cookies, raise_for_status=raise_for_status)
+    summarizer = pcap.FlowSummarizer() if summarize else None
+    saved_path = await _download(
+        url, dest, headers=headers, cookies=cookies, raise_for_status=raise_for_status,
+        on_chunk=summarizer.feed if summarizer is not None else None, save=keep_pcap)
+    if summarizer is None:
+        return saved_path
+
+    summary_path = await asyncio.get_event_loop().run_in_executor(
+        None, pcap.save_summary, summarizer.summary(), pcap.summary_path(saved_path))
+    return saved_path if keep_pcap else summary_path
 
 
 async def download_file(
@@ -82,7 +305,9 @@ async def download_file(
     object_uuid: str,
     token: str,
     dest: str = '.',
-    raise_for_status: bool = True
+    raise_for_status: bool = True,
+    base_url: str = DEFAULT_BASE_URL,
+    content_url: str = DEFAULT_CONTENT_URL
 ) -> Path:
     ''' Download file from ANY.RUN.
     Args:
@@ -90,13 +315,14 @@ async def download_file(
         object_uuid: UUID of object in task
         token: login token, this can be retrieve when you login
         raise_for_status: if True, raise exception when status is not 200
-        chunk_size: chunk size to read for each time
+        base_url: base URL of ANY.RUN app, used for Referer
+        content_url: base URL of ANY.RUN content server
     '''
 
-    url = f'https://content.any.run/tasks/{task_uuid}/download/files/{object_uuid}'
+    url = f'{content_url}/tasks/{task_uuid}/download/files/{object_uuid}'
 
     headers = {
-        'Referer': f'https://app.any.run/tasks/{task_uuid}/',
+        'Referer': f'{base_url}/tasks/{task_uuid}/',
         'User-Agent': DEFAULT_USER_AGENT
     }
     cookies = generate_random_cookies_with_token(token)
@@ -116,7 +342,7 @@ async def _incidents_request_handler(
         logger.debug(f'Start receiving message. name={name}')
         results = []
         while True:
-            msg = await client.recv_message_loop()
+            msg = await client.recv_message_loop(task_id)
 
             if msg.get('msg') == 'added':
                 if msg.get('collection') == name:
@@ -127,6 +353,52 @@ async def _incidents_request_handler(
         return results
     return _handle
 
+async def _incidents_stream_handler(
+    client: 'AnyRunClient',
+    name: str,
+    task_id: str,
+    accept: t.Optional[t.Callable[[dict], bool]] = None
+) -> cst.STREAM_HANDLER_FUNC:
+    ''' Response handler for incidents, which yields fields of incident as soon as it arrives.
+    incidents rejected by `accept` are dropped before anything is built from them.
+    '''
+    async def _handle() -> t.AsyncIterator[dict]:
+        logger.debug(f'Start receiving message. name={name}')
+        while True:
+            msg = await client.recv_message_loop(task_id)
+
+            if msg.get('msg') == 'added':
+                if msg.get('collection') == name:
+                    fields = msg.get('fields')
+                    if accept is None or accept(fields):
+                        yield fields
+            elif msg.get('msg') == 'ready':
+                if msg.get('subs')[0] == task_id:
+                    break
+    return _handle
+
+async def _watch_request_handler(
+    client: 'AnyRunClient',
+    name: str,
+    task_id: str
+) -> cst.STREAM_HANDLER_FUNC:
+    ''' Response handler for subscription kept open, which yields 'added', 'changed' and 'removed'
+    messages of collection, and 'ready' of subscription, until subscription is stopped.
+    '''
+    async def _handle() -> t.AsyncIterator[dict]:
+        logger.debug(f'Start receiving message. name={name}')
+        while True:
+            msg = await client.recv_message_loop(task_id)
+
+            if msg.get('msg') in ('added', 'changed', 'removed'):
+                if msg.get('collection') == name:
+                    yield msg
+            elif msg.get('msg') == 'ready':
+                yield msg
+            elif msg.get('msg') == 'nosub':
+                break
+    return _handle
+
 async def _login_request_handler(
     client: 'AnyRunClient',
     name: str,
@@ -137,7 +409,7 @@ async def _login_request_handler(
     async def _handle() -> t.Optional[dict]:
         logger.debug(f'Start receiving message. name={name}')
         while True:
-            msg = await client.recv_message_loop()
+            msg = await client.recv_message_loop(task_id)
 
             if msg.get('msg') == 'added':
                 if msg.get('collection') == name:
@@ -147,19 +419,23 @@ async def _login_request_handler(
 async def _sub_request_handler(
     client: 'AnyRunClient',
     name: str,
-    task_id: str
+    task_id: str,
+    accept: t.Optional[cst.FILTER_FUNC] = None
 ) -> cst.HANDLER_FUNC:
     ''' Default response handler for sub request.
+    documents rejected by `accept` are dropped as soon as they arrive.
     '''
     async def _handle() -> t.List[dict]:
         logger.debug(f'Start receiving message. name={name}')
         results = []
         while True:
-            msg = await client.recv_message_loop()
+            msg = await client.recv_message_loop(task_id)
             
             if msg.get('msg') == 'added':
                 if msg.get('collection') == name:
-                    results.append(msg.get('fields'))
+                    fields = msg.get('fields')
+                    if accept is None or accept(fields):
+                        results.append(fields)
             elif msg.get('msg') == 'ready':
                 if msg.get('subs')[0] == task_id:
                     break
@@ -176,17 +452,128 @@ async def _method_request_handler(
     async def _handle():
         logger.debug(f'Start receiving message. name={name}')
         while True:
-            msg = await client.recv_message_loop()
+            msg = await client.recv_message_loop(task_id)
             
             if msg.get('msg') == 'result':
                 if msg.get('id') == task_id:
                     return msg.get('result')
     return _handle 
 
+def _object_id(obj_id: t.Union[dict, str]) -> str:
+    ''' document id of task, which is value of its ObjectID.
+    '''
+    return obj_id.get('$value') if isinstance(obj_id, dict) else obj_id
+
 class AnyRunError(Exception):
     pass
 
 
+class AnyRunTimeoutError(AnyRunError, asyncio.TimeoutError):
+    pass
+
+
+# default of `timeout`, which means `request_timeout` of client
+_DEFAULT: t.Any = object()
+
+
+def _with_timeout(func: t.Optional[t.Callable] = None, client_default: bool = True) -> t.Callable:
+    ''' add `timeout` keyword argument to public method of `AnyRunClient`.
+    when it's not given, `request_timeout` of client is used, and explicit None means no deadline.
+    nested requests of public method are limited by its timeout, not by client default.
+    when it expires, request is cancelled (its routing state is freed and subscription is unsubscribed)
+    and `AnyRunTimeoutError` is raised. for async generator, timeout is deadline of whole iteration.
+
+    Args:
+        client_default: use `request_timeout` of client when `timeout` is not given.
+            streams and downloads, which may take long as they should, are not limited by default.
+    '''
+    if func is None:
+        return partial(_with_timeout, client_default=client_default)
+
+    def _timeout(self: 'AnyRunClient', timeout: t.Optional[float]) -> t.Optional[float]:
+        if timeout is _DEFAULT:
+            return self.request_timeout if client_default and not _in_request.get() else None
+        return timeout
+
+    def _error(timeout: float) -> AnyRunTimeoutError:
+        return AnyRunTimeoutError(f'Request timed out. method={func.__name__}, timeout={timeout}')
+
+    if inspect.isasyncgenfunction(func):
+        @wraps(func)
+        async def _iterate(self: 'AnyRunClient', *args, timeout: t.Optional[float] = _DEFAULT, **kwargs):
+            timeout = _timeout(self, timeout)
+            agen = func(self, *args, **kwargs)
+            loop = asyncio.get_event_loop()
+            deadline = None if timeout is None else loop.time() + timeout
+            try:
+                while True:
+                    token = _in_request.set(True)
+                    try:
+                        if deadline is None:
+                            item = await agen.__anext__()
+                        else:
+                            item = await asyncio.wait_for(agen.__anext__(), max(deadline - loop.time(), 0))
+                    except StopAsyncIteration:
+                        return
+                    except asyncio.TimeoutError as e:
+                        if isinstance(e, AnyRunTimeoutError):
+                            raise
+                        raise _error(timeout) from e
+                    finally:
+                        _in_request.reset(token)
+                    yield item
+            finally:
+                await agen.aclose()
+        return _iterate
+
+    @wraps(func)
+    async def _call(self: 'AnyRunClient', *args, timeout: t.Optional[float] = _DEFAULT, **kwargs):
+        timeout = _timeout(self, timeout)
+        token = _in_request.set(True)
+        try:
+            if timeout is None:
+                return await func(self, *args, **kwargs)
+            return await asyncio.wait_for(func(self, *args, **kwargs), timeout)
+        except asyncio.TimeoutError as e:
+            # timeout of nested request is raised as is
+            if timeout is None or isinstance(e, AnyRunTimeoutError):
+                raise
+            raise _error(timeout) from e
+        finally:
+            _in_request.reset(token)
+    return _call
+
+
+class _Route:
+    ''' Routing state of in-flight request. messages for request are put into `queue`.
+    '''
+    __slots__ = ('task_id', 'name', 'queue', 'is_sub', 'keep_open', 'ready', 'lock', 'priority')
+
+    def __init__(
+        self,
+        task_id: str,
+        name: str,
+        is_sub: bool = False,
+        keep_open: bool = False,
+        lock: t.Optional[asyncio.Lock] = None
+    ):
+        self.task_id = task_id
+        self.name = name
+        self.queue: 'asyncio.Queue[t.Union[dict, BaseException]]' = asyncio.Queue()
+        self.is_sub = is_sub
+        self.keep_open = keep_open
+        self.ready = False
+        # lock of collection, held by subscription until it gets ready
+        self.lock = lock
+        # priority class of scheduler slot held by request
+        self.priority: t.Optional[str] = None
+
+    def release(self):
+        if self.lock is not None:
+            self.lock.release()
+            self.lock = None
+
+
 class AnyRunClient:
     ''' Asynchronous client for AnyRun.
     Usage:
@@ -214,23 +601,74 @@ class AnyRunClient:
         'rawincidents': 'events.rawincidents' 
     }
 
-    def __init__(self):
+    def __init__(
+        self,
+        transport: t.Optional[cst.TRANSPORT_FUNC] = None,
+        base_url: str = DEFAULT_BASE_URL,
+        content_url: str = DEFAULT_CONTENT_URL,
+        index: t.Optional[TaskIndex] = None,
+        lazy: bool = False,
+        scheduler: t.Optional[RequestScheduler] = None,
+        request_timeout: t.Optional[float] = None,
+        query_cache: t.Optional[QueryCache] = None
+    ):
         self.session = aiohttp.ClientSession()
         self.client = None
         self.login_token = None
+        self.base_url = base_url.rstrip('/')
+        self.content_url = content_url.rstrip('/')
+        # local index to add fetched tasks and IoCs, see `search`
+        self.index = index
+        # class of returned tasks
+        self.task_class: t.Type[collection.Task] = collection.LazyTask if lazy else collection.Task
+        # scheduler of concurrent requests, see `aio_anyrun.scheduler`
+        self.scheduler = scheduler
+        # default timeout as second of each public method, None means no timeout
+        self.request_timeout = request_timeout
+        # cache of search results, see `aio_anyrun.cache`
+        self.query_cache = query_cache
+        self._mitre_catalog: t.Optional[MitreCatalog] = None
         self._current_token_id = 1
+        self._transport = transport or _default_transport
+        # messages of batched SockJS frame which are not consumed yet, as json text
+        self._pending_messages: t.Deque[str] = collections.deque()
+        # id of method requests whose result is kept as `_RawResult`
+        self._raw_results: t.Set[str] = set()
+        # in-flight requests by id, and by collection name
+        self._routes: t.Dict[str, _Route] = {}
+        self._collection_routes: t.Dict[str, t.Dict[str, _Route]] = {}
+        self._collection_locks: t.Dict[str, asyncio.Lock] = {}
+        # server sends each document once per connection ("merge box"), so documents held by
+        # kept subscriptions are not sent again to other subscriptions of same collection.
+        # they are kept here by collection name, while kept subscriptions are alive.
+        self._kept_routes: t.Dict[str, t.Set[str]] = {}
+        self._documents: t.Dict[str, t.Dict[str, dict]] = {}
+        self._reader: t.Optional[asyncio.Future] = None
+        self._reader_error: t.Optional[BaseException] = None
+
+    @property
+    def websocket_url(self) -> str:
+        ''' SockJS websocket endpoint, scheme is derived from `base_url`.
+        '''
+        ws_base = 'ws' + self.base_url[len('http'):] if self.base_url.startswith('http') else self.base_url
+        return f'{ws_base}/sockjs/{generate_id()}/{generate_token()}/websocket'
     
     async def _init_client(
         self,
         user_agent: str = '',
         autoclose: bool = True,
-        timeout: int = 30
+        timeout: int = 30,
+        max_msg_size: int = DEFAULT_MAX_MSG_SIZE,
+        compress: int = DEFAULT_COMPRESS
     ):
-        self.client = await self.session.ws_connect(
-            f'wss://app.any.run/sockjs/{generate_id()}/{generate_token()}/websocket',
+        self.client = await self._transport(
+            self.session,
+            self.websocket_url,
             headers={'User-Agent': user_agent},
             autoclose=autoclose,
-            timeout=timeout)
+            timeout=timeout,
+            max_msg_size=max_msg_size,
+            compress=compress)
         
     async def _init_connection(self):
         await self._send_message({
@@ -246,7 +684,16 @@ class AnyRunClient:
         await self._init_connection()
     
     async def close(self):
-        await self.client.close()
+        if self._reader is not None:
+            self._reader.cancel()
+            try:
+                await self._reader
+            except asyncio.CancelledError:
+                pass
+            self._reader = None
+        self._fail_routes(AnyRunError('Client closed.'))
+        if self.client is not None:
+            await self.client.close()
         await self.session.close()
 
     @staticmethod
@@ -254,17 +701,47 @@ class AnyRunClient:
     async def connect(
         user_agent: str = '',
         autoclose: bool = True,
-        timeout: int = 30
+        timeout: int = 30,
+        transport: t.Optional[cst.TRANSPORT_FUNC] = None,
+        base_url: str = DEFAULT_BASE_URL,
+        content_url: str = DEFAULT_CONTENT_URL,
+        index: t.Optional[TaskIndex] = None,
+        max_msg_size: int = DEFAULT_MAX_MSG_SIZE,
+        compress: int = DEFAULT_COMPRESS,
+        lazy: bool = False,
+        scheduler: t.Optional[RequestScheduler] = None,
+        request_timeout: t.Optional[float] = None,
+        query_cache: t.Optional[QueryCache] = None
     ) -> t.AsyncIterator['AnyRunClient']:
         ''' Create AnyRun client with contextmanager.
         Args:
             user_agent: User-Agent for client, default is no string
             autoclose: to close connection automatically or not
             timeout: connection timeout as second, default is 30 second.
+            transport: coroutine function to open websocket, called as
+                `transport(session, url, **kwargs)`. default is `session.ws_connect`.
+                see `aio_anyrun.replay` for recording and replaying transports.
+            base_url: base URL of ANY.RUN app, default is 'https://app.any.run'.
+            content_url: base URL of ANY.RUN content server for downloading,
+                default is 'https://content.any.run'.
+            index: local index to add fetched tasks and IoCs.
+            max_msg_size: max size of websocket message, 0 means unlimited.
+                raise bigger one for huge responses of `get_process_graph`, `get_ioc` or `get_mitre`.
+            compress: window bits of permessage-deflate to negotiate (9-15), default 0 disables compression.
+                enable it (i.e. 15) for big responses on slow link, it costs CPU on both sides.
+            lazy: return `collection.LazyTask`, which keeps bulky sections of task as JSON text
+                until they are accessed. it saves memory when many tasks are held.
+            scheduler: run concurrent requests by priority class, see `aio_anyrun.scheduler`.
+            request_timeout: default timeout as second of each request, default is no timeout.
+                every public method takes `timeout` to override it per call (None disables it),
+                and raises `AnyRunTimeoutError` when it expires. streams (`watch_task`, `iter_incidents`)
+                and downloads are limited only by their own `timeout`.
+            query_cache: cache results of identical `search` for a short time, see `aio_anyrun.cache`.
         '''
+        anyrun = AnyRunClient(
+            transport, base_url, content_url, index, lazy, scheduler, request_timeout, query_cache)
         try:
-            anyrun = AnyRunClient()
-            await anyrun._init_client(user_agent, autoclose, timeout)
+            await anyrun._init_client(user_agent, autoclose, timeout, max_msg_size, compress)
             await anyrun._init_connection()
             yield anyrun
             
@@ -280,7 +757,219 @@ class AnyRunClient:
     async def _send_message(self, msg: dict):
         logger.debug(f'(send) -> {msg}')
         await self.client.send_json([json.dumps(msg)])
+
+    def _open_route(
+        self,
+        task_id: str,
+        name: str,
+        is_sub: bool = False,
+        keep_open: bool = False,
+        lock: t.Optional[asyncio.Lock] = None,
+        priority: t.Optional[str] = None
+    ) -> _Route:
+        error = None
+        if self._reader_error is not None:
+            error = AnyRunError(f'Connection is not available. err={self._reader_error}')
+        elif task_id in self._routes:
+            error = AnyRunError(f'Request of same id is in flight. id={task_id}')
+        if error is not None:
+            if lock is not None:
+                lock.release()
+            if priority is not None:
+                self.scheduler.release(priority)
+            raise error
+
+        route = _Route(task_id, name, is_sub, keep_open, lock)
+        route.priority = priority
+        self._routes[task_id] = route
+        self._collection_routes.setdefault(name, {})[task_id] = route
+        if self._reader is None:
+            self._reader = asyncio.ensure_future(self._read_loop())
+        return route
+
+    def _close_route(self, task_id: str):
+        route = self._routes.pop(task_id, None)
+        if route is None:
+            return
+        self._collection_routes.get(route.name, {}).pop(task_id, None)
+        self._release_slot(route)
+        if not route.is_sub or self._reader_error is not None:
+            route.release()
+            self._release_kept(route)
+        elif route.keep_open or (not route.ready and route.lock is not None):
+            # subscription which is kept open, or cancelled before it gets ready, is still alive on server
+            asyncio.ensure_future(self._unsubscribe(route))
+        # otherwise lock is released by `_unsubscribe` scheduled on 'ready' (or on 'nosub'),
+        # after unsub is sent
+
+    def _release_slot(self, route: _Route):
+        if route.priority is not None:
+            self.scheduler.release(route.priority)
+            route.priority = None
+
+    def _bind_route(self, task_id: str, handle: t.Callable) -> t.Callable:
+        ''' wrap response handler to free routing state of request when it finishes.
+        '''
+        if inspect.isasyncgenfunction(handle):
+            async def _stream():
+                try:
+                    async for item in handle():
+                        yield item
+                finally:
+                    self._close_route(task_id)
+            return _stream
+
+        async def _call():
+            try:
+                return await handle()
+            finally:
+                self._close_route(task_id)
+        return _call
+
+    async def _unsubscribe(self, route: _Route):
+        ''' send unsub so that server forgets documents of subscription, then let next
+        subscription of same collection go. messages are processed in order by server,
+        so documents of next subscription are sent as 'added' again.
+        '''
+        try:
+            await self._send_message({'msg': 'unsub', 'id': route.task_id})
+        except Exception as e:
+            logger.debug(f'Failed to unsubscribe. id={route.task_id}, err={e}')
+        finally:
+            route.release()
+            self._release_kept(route)
+
+    def _keep(self, route: _Route):
+        kept = self._kept_routes.setdefault(route.name, set())
+        if not kept:
+            self._documents[route.name] = {}
+        kept.add(route.task_id)
+
+    def _release_kept(self, route: _Route):
+        ''' forget kept subscription after it's unsubscribed,
+        and documents of collection when it was the last one.
+        '''
+        kept = self._kept_routes.get(route.name)
+        if not route.keep_open or not kept or route.task_id not in kept:
+            return
+        kept.discard(route.task_id)
+        if not kept:
+            self._documents.pop(route.name, None)
+
+    def _held_documents(self, name: str) -> t.List[dict]:
+        ''' copies of documents held by kept subscriptions of collection,
+        which server doesn't send to other subscriptions.
+        '''
+        return [copy.deepcopy(doc) for doc in self._documents.get(name, {}).values()]
+
+    def _update_documents(self, msg: dict):
+        docs = self._documents.get(msg.get('collection'))
+        if docs is None:
+            return
+        kind, doc_id = msg.get('msg'), msg.get('id')
+        if kind == 'added':
+            docs[doc_id] = dict(msg.get('fields') or {})
+        elif kind == 'changed' and doc_id in docs:
+            docs[doc_id].update(msg.get('fields') or {})
+            for key in msg.get('cleared') or []:
+                docs[doc_id].pop(key, None)
+        elif kind == 'removed':
+            docs.pop(doc_id, None)
+
+    def _fail_routes(self, error: BaseException):
+        for route in list(self._routes.values()):
+            route.queue.put_nowait(error)
+            route.release()
+        self._kept_routes.clear()
+        self._documents.clear()
+
+    def _dispatch(self, msg: dict):
+        ''' route received message to in-flight requests.
+        '''
+        kind = msg.get('msg')
+        if kind in ('added', 'changed', 'removed'):
+            self._update_documents(msg)
+            for route in list(self._collection_routes.get(msg.get('collection'), {}).values()):
+                if not route.ready or route.keep_open:
+                    route.queue.put_nowait(msg)
+        elif kind == 'result':
+            route = self._routes.get(msg.get('id'))
+            if route is not None:
+                route.queue.put_nowait(msg)
+        elif kind == 'ready':
+            for sub_id in msg.get('subs') or []:
+                route = self._routes.get(sub_id)
+                if route is None:
+                    continue
+                route.ready = True
+                route.queue.put_nowait(dict(msg, subs=[sub_id]))
+                if route.keep_open:
+                    # initial documents are received, changes don't take slot or lock
+                    route.release()
+                    self._release_slot(route)
+                else:
+                    asyncio.ensure_future(self._unsubscribe(route))
+        elif kind == 'nosub':
+            route = self._routes.get(msg.get('id'))
+            if route is not None:
+                route.queue.put_nowait(msg)
+                route.release()
+        elif kind == 'ping':
+            pong = {'msg': 'pong', 'id': msg['id']} if 'id' in msg else {'msg': 'pong'}
+            asyncio.ensure_future(self._send_message(pong))
+        elif kind == 'error':
+            for route in list(self._routes.values()):
+                route.queue.put_nowait(msg)
+
+    async def _read_loop(self):
+        ''' read messages from websocket and route them, while connection is open.
+        '''
+        try:
+            while True:
+                msg = await self.recv_message()
+                logger.debug(f'(recv) <- {msg}')
+                self._dispatch(msg)
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            logger.debug(f'Stop receiving message. err={e}')
+            self._reader_error = e
+            self._fail_routes(e)
         
+    @contextlib.contextmanager
+    def priority(self, priority: str) -> t.Iterator[None]:
+        ''' set priority class of requests sent in this context (and tasks created in it).
+        only works with `scheduler`, see `aio_anyrun.scheduler`.
+
+        ... with client.priority('bulk'):
+        ...     tasks = await client.get_public_tasks()
+        '''
+        if self.scheduler is not None and priority not in self.scheduler.priorities:
+            raise ValueError(f'Unknown priority. priority={priority}, choices={self.scheduler.priorities}')
+        token = _request_priority.set(priority)
+        try:
+            yield
+        finally:
+            _request_priority.reset(token)
+
+    async def _acquire_slot(self, name: str) -> t.Optional[str]:
+        ''' wait for slot of scheduler, and return priority class of it.
+        '''
+        if self.scheduler is None:
+            return None
+        priority = _request_priority.get() or self.scheduler.priority_of(name)
+        await self.scheduler.acquire(priority)
+        return priority
+
+    @asynccontextmanager
+    async def _slot(self, name: str) -> t.AsyncIterator[None]:
+        priority = await self._acquire_slot(name)
+        try:
+            yield
+        finally:
+            if priority is not None:
+                self.scheduler.release(priority)
+
     async def send_message(
         self,
         name: str,
@@ -298,39 +987,84 @@ class AnyRunClient:
         '''
         task_id = task_id or self._task_id
         params = [params] if isinstance(params, dict) else params
-        await self._send_message(
-            {
-                'msg': 'method',
-                'method': name,
-                'params': params,
-                'id': task_id
-            }
-        )
-        return await handler(self, self.METHOD_COLLECTION_TABLE.get(name) or name, task_id)
+        collection_name = self.METHOD_COLLECTION_TABLE.get(name) or name
+        priority = await self._acquire_slot(name)
+        self._open_route(task_id, collection_name, priority=priority)
+        try:
+            await self._send_message(
+                {
+                    'msg': 'method',
+                    'method': name,
+                    'params': params,
+                    'id': task_id
+                }
+            )
+            return self._bind_route(task_id, await handler(self, collection_name, task_id))
+        except BaseException:
+            self._close_route(task_id)
+            raise
     
     async def subscribe(
         self, 
         name: str, 
         params: t.Optional[list] = None,
-        handler: t.Callable[['AnyRunClient', str, str], cst.HANDLER_FUNC] =_sub_request_handler
+        handler: t.Callable[['AnyRunClient', str, str], cst.HANDLER_FUNC] =_sub_request_handler,
+        keep_open: bool = False,
+        doc_id: t.Optional[str] = None
     ) -> cst.HANDLER_FUNC:
         ''' Send subscription request message.
+        'added' messages don't tell which subscription they belong to, so subscriptions
+        of same collection are sent one by one, each waits until previous one gets ready.
+
         Args:
             name: subscription name for request
             params: request parameters
             handler: response handler for sub request.
+            keep_open: keep subscription after it gets ready to receive 'changed' messages,
+                until response handler finishes. otherwise unsubscribe when it gets ready.
+            doc_id: id of the only document requested, if known. if kept subscription holds it,
+                it's taken from client since server doesn't send it again. other subscriptions
+                don't get documents held by kept ones either, see `_held_documents`.
         '''
         task_id = generate_token(n=17)
-        await self._send_message(
-            {
-                'msg': 'sub',
-                'name': name,
-                'params': params or [],
-                'id': task_id
-            }
-        )
-        return await handler(
-            self, self.METHOD_COLLECTION_TABLE.get(name) or name, task_id)
+        collection_name = self.METHOD_COLLECTION_TABLE.get(name) or name
+        # take slot first, so that waiting on collection lock is ordered by priority
+        priority = await self._acquire_slot(name)
+        lock = self._collection_locks.setdefault(collection_name, asyncio.Lock())
+        try:
+            await lock.acquire()
+        except BaseException:
+            if priority is not None:
+                self.scheduler.release(priority)
+            raise
+        route = self._open_route(
+            task_id, collection_name, is_sub=True, keep_open=keep_open, lock=lock, priority=priority)
+        known = self._documents.get(collection_name, {}).get(doc_id)
+        if known is not None:
+            route.queue.put_nowait(
+                {'msg': 'added', 'collection': collection_name, 'id': doc_id, 'fields': copy.deepcopy(known)})
+        if known is not None and not keep_open:
+            # nothing to ask server
+            route.queue.put_nowait({'msg': 'ready', 'subs': [task_id]})
+            route.is_sub = False
+            route.ready = True
+            route.release()
+        elif keep_open:
+            self._keep(route)
+        try:
+            if route.is_sub:
+                await self._send_message(
+                    {
+                        'msg': 'sub',
+                        'name': name,
+                        'params': params or [],
+                        'id': task_id
+                    }
+                )
+            return self._bind_route(task_id, await handler(self, collection_name, task_id))
+        except BaseException:
+            self._close_route(task_id)
+            raise
         
     @staticmethod
     def _to_json(data: str) -> dict:
@@ -338,28 +1072,71 @@ class AnyRunClient:
         so we should remove first meaningless char and parse as json.
         '''
         return json.loads(json.loads(data[1:])[0])
+
+    @staticmethod
+    def _to_messages(data: str) -> t.List[dict]:
+        ''' parse all messages in response from ANY.RUN.
+        SockJS may batch several messages in one frame like '"a[{...},{...}]"'.
+        '''
+        return [json.loads(msg) for msg in json.loads(data[1:])]
     
+    def _decode_message(self, text: str) -> dict:
+        if self._raw_results:
+            split = _split_result(text)
+            if split is not None and split[0]['id'] in self._raw_results:
+                fields, result = split
+                return dict(fields, result=_RawResult(result))
+        return json.loads(text)
+
     async def recv_message(self) -> dict:
-        r = await self.client.receive()
-        try:
-            return self._to_json(r.data)
-        except:
-            return await self.recv_message()
+        while True:
+            while not self._pending_messages:
+                r = await self.client.receive()
+                if r.type in (aiohttp.WSMsgType.CLOSE, aiohttp.WSMsgType.CLOSING,
+                              aiohttp.WSMsgType.CLOSED, aiohttp.WSMsgType.ERROR):
+                    # i.e. message exceeds `max_msg_size`
+                    raise AnyRunError(f'Connection closed. type={r.type.name}, data={r.data}')
+                try:
+                    texts = json.loads(r.data[1:])
+                except:
+                    # open/heartbeat frames of SockJS ('o', 'h') are not json.
+                    continue
+                if isinstance(texts, list):
+                    self._pending_messages.extend(texts)
+            try:
+                return self._decode_message(self._pending_messages.popleft())
+            except (TypeError, ValueError):
+                continue
     
-    async def recv_message_loop(self) -> dict:
+    @staticmethod
+    def _check_message(msg: dict) -> dict:
+        if msg.get('msg') == 'error':
+            raise AnyRunError(f'{msg["reason"]}, offendingMessage={msg.get("offendingMessage")}')
+        elif msg.get('error') is not None:
+            raise AnyRunError(msg['error']['message'])
+        return msg
+
+    async def recv_message_loop(self, task_id: t.Optional[str] = None) -> dict:
         ''' do loop and return message when any valid response is retrieved. 
         if any error message is returned, raise exception.
+
+        Args:
+            task_id: id of in-flight request. if given, return message routed to the request,
+                otherwise read next message from websocket directly, which is only allowed
+                before any request is sent (websocket is read by dispatcher after that).
         '''
+        if task_id is not None and task_id in self._routes:
+            msg = await self._routes[task_id].queue.get()
+            if isinstance(msg, BaseException):
+                raise AnyRunError(f'Connection closed while waiting response. err={msg}')
+            return self._check_message(msg)
+        if self._reader is not None:
+            raise AnyRunError(f'Websocket is read by dispatcher, no in-flight request of id. id={task_id}')
+
         while True:
             msg = await self.recv_message()
             logger.debug(f'(recv) <- {msg}')
-            
-            if msg.get('msg') == 'error':
-                raise AnyRunError(f'{msg["reason"]}, offendingMessage={msg["offendingMessage"]}')
-            elif msg.get('error') is not None:
-                raise AnyRunError(msg['error']['message'])
-            else:
-                return msg   
+            return self._check_message(msg)
     
     @staticmethod
     def _create_params(
@@ -422,26 +1199,86 @@ class AnyRunClient:
         }
         return params
     
-    async def get_public_tasks(self, **kwargs) -> t.List[collection.Task]:
+    def _add_to_index(self, tasks: t.List[collection.Task]) -> t.List[collection.Task]:
+        if self.index is not None:
+            self.index.add_tasks(tasks)
+        return tasks
+
+    @_with_timeout
+    async def get_public_tasks(
+        self,
+        where: t.Optional[cst.FILTER_FUNC] = None,
+        **kwargs
+    ) -> t.List[collection.Task]:
         '''Get public tasks based on the given query parameters.
         currently only latest 50 task will be retrieved. for more details 
         of available parameters, see `_create_params`.
+
+        Args:
+            where: filter of raw task document, i.e. `aio_anyrun.filters.F`.
+                tasks are built only for matching documents.
         '''
         params = self._create_params(**kwargs)
         
         resp_handler = await self.subscribe(
-            'publicTasks', [params['skip']+50, params['skip'], params])
-        
-        return [collection.Task(msg) for msg in await resp_handler()]
+            'publicTasks', [params['skip']+50, params['skip'], params],
+            handler=partial(_sub_request_handler, accept=where))
+        # taken when subscription is sent, documents held then are not sent to it
+        held = [doc for doc in self._held_documents('tasks') if where is None or where(doc)]
+
+        tasks = [self.task_class(msg) for msg in await resp_handler()]
+        if held:
+            tasks = self._merge_held(tasks, held, params['skip'], kwargs)
+        return self._add_to_index(tasks)
+
+    def _merge_held(
+        self,
+        tasks: t.List[collection.Task],
+        held: t.List[dict],
+        skip: int,
+        query: dict
+    ) -> t.List[collection.Task]:
+        ''' add documents held by kept subscriptions (i.e. `watch_task`) to page of public tasks.
+        they are matched with query by `TaskIndex`, and placed in the page by start time.
+        IoCs of them are not known, so they are left out of queries by `ip` or `domain`.
+        '''
+        page_size = 50
+        fetched = {task.task_uuid for task in tasks}
+        candidates = TaskIndex()
+        candidates.add_tasks(self.task_class(doc) for doc in held if doc.get('uuid') not in fetched)
+        try:
+            matched = candidates.search(**{key: value for key, value in query.items() if key != 'skip'})
+        except IndexQueryError as e:
+            logger.debug(f'Held tasks are not merged. err={e}')
+            return tasks
+
+        times = [task.start_time for task in tasks if task.start_time is not None]
+        newest, oldest = (max(times), min(times)) if times else (None, None)
+        added = False
+        for task in matched:
+            started = task.start_time
+            if len(tasks) >= page_size and (started is None or oldest is None or started < oldest):
+                # belongs to later page
+                continue
+            if skip and started is not None and newest is not None and started > newest:
+                # belongs to earlier page
+                continue
+            tasks.append(task)
+            added = True
+        if added:
+            tasks.sort(key=lambda task: task.start_time or _EPOCH, reverse=True)
+        return tasks[:page_size]
     
+    @_with_timeout
     async def check_task_exists(self, task_uuid: str) -> t.List[dict]:
         resp_handler = await self.subscribe('taskexists', [task_uuid])
         return [msg['taskObjectId'] for msg in await resp_handler()]
     
     async def _get_single_task(self, task_obj_id: dict):
-        resp_handler = await self.subscribe('singleTask', [task_obj_id, False])
+        resp_handler = await self.subscribe('singleTask', [task_obj_id, False], doc_id=_object_id(task_obj_id))
         return await resp_handler()
     
+    @_with_timeout
     async def get_single_task(self, task_uuid: str) -> collection.Task:
         ''' Search task based on given UUID.
         you can get UUID by using `get_public_tasks` or just copy <UUID> part of 
@@ -455,17 +1292,83 @@ class AnyRunClient:
         if not task:
             raise AnyRunError(f'Failed to get task. uuid={task_uuid}')
             
-        return collection.Task(task[0])
+        return self._add_to_index([self.task_class(task[0])])[0]
     
-    async def search(self, **kwargs) -> t.List[collection.Task]:
+    async def _search_remote(
+        self,
+        where: t.Optional[cst.FILTER_FUNC] = None,
+        cache: bool = True,
+        **kwargs
+    ) -> t.List[collection.Task]:
+        params = self._create_params(**kwargs)
+        key = None
+        if self.query_cache is not None:
+            key = self.query_cache.key('getTasks', params, self._create_params())
+            cached = self.query_cache.get(key) if cache else None
+            if cached is not None:
+                logger.debug(f'Search result is served from cache. key={key}')
+                # cached as JSON text, so that returned tasks can't modify cache
+                return self._add_to_index(
+                    [self.task_class(doc) for doc in json.loads(cached) if where is None or where(doc)])
+
+        resp_handler = await self.send_message('getTasks', params)
+        docs = (await resp_handler())['res']
+        if key is not None:
+            self.query_cache.put(key, json.dumps(docs, separators=(',', ':')))
+        return self._add_to_index(
+            [self.task_class(doc) for doc in docs if where is None or where(doc)])
+
+    def _search_local(self, where: t.Optional[cst.FILTER_FUNC] = None, **kwargs) -> t.List[collection.Task]:
+        tasks = self.index.search(**kwargs)
+        # filter reads document of task, which doesn't decode whole `LazyTask`
+        return tasks if where is None else [task for task in tasks if where(task._doc)]
+
+    @_with_timeout
+    async def search(
+        self,
+        local: t.Optional[cst.LOCAL_MODES] = None,
+        where: t.Optional[cst.FILTER_FUNC] = None,
+        cache: bool = True,
+        **kwargs
+    ) -> t.List[collection.Task]:
         ''' Search based on given params. currently only latest 50 task will be retrieved.
         for more details of available parameters, see `_create_params`.
+
+        Args:
+            local: how to use local index (`index` of client).
+                None: search only on ANY.RUN (default)
+                'only': search only on local index, no network
+                'fallback': search on local index if search on ANY.RUN fails
+                'merge': search on both and merge results, newest first
+            where: filter of raw task document, i.e. `aio_anyrun.filters.F`.
+                tasks are built only for matching documents.
+            cache: use cached result of identical search, if `query_cache` of client is set.
+                if False, search is always sent, and its result replaces cached one.
         '''
-        params = self._create_params(**kwargs)
-        resp_handler = await self.send_message('getTasks', params, generate_id())
-        tasks = await resp_handler()
-        return [collection.Task(res) for res in tasks['res']]
+        if local is None:
+            return await self._search_remote(where, cache, **kwargs)
+        if self.index is None:
+            raise AnyRunError('Local index is not set.')
+        if local == 'only':
+            return self._search_local(where, **kwargs)
+        if local == 'fallback':
+            try:
+                return await self._search_remote(where, cache, **kwargs)
+            except (AnyRunError, aiohttp.ClientError, asyncio.TimeoutError) as e:
+                logger.debug(f'Search failed, fallback to local index. err={e}')
+                return self._search_local(where, **kwargs)
+        if local == 'merge':
+            try:
+                local_tasks = self._search_local(where, **kwargs)
+            except IndexQueryError:
+                local_tasks = []
+            remote_tasks = await self._search_remote(where, cache, **kwargs)
+            remote_uuids = {task.task_uuid for task in remote_tasks}
+            tasks = remote_tasks + [task for task in local_tasks if task.task_uuid not in remote_uuids]
+            return sorted(tasks, key=lambda task: task.start_time or _EPOCH, reverse=True)
+        raise ValueError(f'Unknown local mode. local={local}')
 
+    @_with_timeout(client_default=False)
     async def download_file(self, task: collection.Task, dest: str = '.') -> Path:
         ''' Download file based on given task. saved filename is based on filename on AnyRun.
 
@@ -481,28 +1384,47 @@ class AnyRunClient:
             raise AnyRunError(
                 f'Task(guid={task.task_uuid}) is "{task.run_type}" type. not downloadable.')
         
-        return await download_file(
-            task.task_uuid, task.object_uuid, self.login_token, dest)
+        async with self._slot('download'):
+            return await download_file(
+                task.task_uuid, task.object_uuid, self.login_token, dest,
+                base_url=self.base_url, content_url=self.content_url)
 
-    async def download_pcap(self, task: collection.Task, dest: str = '.') -> Path:
+    @_with_timeout(client_default=False)
+    async def download_pcap(
+        self,
+        task: collection.Task,
+        dest: str = '.',
+        summarize: bool = False,
+        keep_pcap: bool = True
+    ) -> Path:
         ''' Download pcap based on given task. saved filename will be like '<UUID>.pcap'.
 
         Args:
             task: Task object which can be retrieved by 
                 `get_single_task`, `get_public_tasks` or `search`.
             dest: destination folder to save file.
+            summarize: build flow summary (5-tuples, byte counts and DNS names) while downloading,
+                and save it next to pcap as '<UUID>.pcap.summary.json'.
+            keep_pcap: save pcap. if False, only summary is saved and its path is returned.
         '''
         if not self.login_token:
             raise AnyRunError('Token not found. Need to login before downloading file.')
         
-        return await download_pcap(
-            task.task_uuid, self.login_token, dest)
+        async with self._slot('download'):
+            return await download_pcap(
+                task.task_uuid, self.login_token, dest,
+                base_url=self.base_url, content_url=self.content_url,
+                summarize=summarize, keep_pcap=keep_pcap)
 
+    @_with_timeout
     async def logout(self):
         if self.login_token is not None:
-            await self.send_message('logout')
+            # wait for result, so that connection can be closed right after
+            resp_handler = await self.send_message('logout')
+            await resp_handler()
             self.login_token = None
     
+    @_with_timeout
     async def login(self, email: str, password: str) -> bool:
         ''' Login to ANY.RUN. make sure you have correct account info.
         '''
@@ -525,6 +1447,7 @@ class AnyRunClient:
 
         return self.login_token is not None
     
+    @_with_timeout
     async def get_ioc(self, task_uuid: str) -> collection.IoC:
         ''' Get IoC information of given UUID.
         '''
@@ -532,12 +1455,66 @@ class AnyRunClient:
             'getIOC',
             params=['any.run', task_uuid]
         )
-        ioc = await resp_handler()
-        return collection.IoC(ioc)
+        ioc = collection.IoC(await resp_handler())
+        if self.index is not None:
+            self.index.add_ioc(task_uuid, ioc)
+        return ioc
+
+    async def _spill_result(
+        self,
+        name: str,
+        params: list,
+        dest: t.Union[str, Path],
+        filename: str,
+        compress: bool
+    ) -> Path:
+        ''' Send method request and write its result to file, instead of keeping it.
+        JSON text of result is sliced from received message and written as is, without
+        building objects of it. whole message is still received into memory first.
+        file is written on executor so that event loop is not blocked.
+        '''
+        task_id = self._task_id
+        self._raw_results.add(task_id)
+        try:
+            resp_handler = await self.send_message(name, params=params, task_id=task_id)
+            result = await resp_handler()
+        finally:
+            self._raw_results.discard(task_id)
+        path = _result_path(dest, filename, compress)
+        return await asyncio.get_event_loop().run_in_executor(
+            None, _save_result, result, path, compress)
 
-    async def get_process_graph(self, task_uuid: str) -> str:
+    @_with_timeout
+    async def save_ioc(self, task_uuid: str, dest: t.Union[str, Path] = '.', compress: bool = False) -> Path:
+        ''' Save raw IoC report of given UUID as json, without building `IoC`.
+
+        Args:
+            task_uuid: UUID of task
+            dest: file path or folder to save report. saved filename in folder is '<UUID>.ioc.json'.
+            compress: gzip report. '.gz' is appended to filename.
+        '''
+        return await self._spill_result(
+            'getIOC', ['any.run', task_uuid], dest, f'{task_uuid}.ioc.json', compress)
+
+    @_with_timeout
+    async def get_process_graph(
+        self,
+        task_uuid: str,
+        dest: t.Optional[t.Union[str, Path]] = None,
+        compress: bool = False
+    ) -> t.Union[str, Path]:
         ''' Get process sequence graph as SVG.
+        if `dest` is given, graph is written to file and its path is returned instead.
+
+        Args:
+            task_uuid: UUID of task
+            dest: file path or folder to save graph. saved filename in folder is '<UUID>.svg'.
+            compress: gzip graph. '.gz' is appended to filename.
         '''
+        if dest is not None:
+            return await self._spill_result(
+                'renderGraph', [task_uuid, 'any.run'], dest, f'{task_uuid}.svg', compress)
+
         resp_handler = await self.send_message(
             'renderGraph',
             params=[task_uuid, 'any.run']
@@ -545,6 +1522,7 @@ class AnyRunClient:
         graph = await resp_handler()
         return graph
     
+    @_with_timeout
     async def get_incidents(self, task_uuid: str) -> t.List[dict]:
         ''' Get indicators of suspicious behavior.
         '''
@@ -560,10 +1538,135 @@ class AnyRunClient:
         
         incidents = await resp_handler()
         return incidents
+
+    @_with_timeout(client_default=False)
+    async def iter_incidents(
+        self,
+        task_uuid: str,
+        min_threat: t.Optional[int] = None,
+        types: t.Optional[t.Union[str, t.List[str]]] = None,
+        raw: bool = False
+    ) -> t.AsyncIterator[collection.Incident]:
+        ''' Iterate indicators of suspicious behavior as they arrive.
+        non-matching incidents are dropped before building any object.
+
+        Args:
+            task_uuid: UUID of task
+            min_threat: minimum threat level of incident to yield.
+            types: type or types of incident to yield.
+            raw: use 'rawincidents' instead of 'allIncidents'.
+        '''
+        types = {types} if isinstance(types, str) else set(types or [])
+
+        def accept(fields: dict) -> bool:
+            if min_threat is not None and (fields.get('threatLevel') or 0) < min_threat:
+                return False
+            return not types or fields.get('type') in types
+
+        task_obj_id = await self.check_task_exists(task_uuid)
+        if not task_obj_id:
+            raise AnyRunError(f'No task found. uuid={task_uuid}')
+
+        resp_handler = await self.subscribe(
+            'rawincidents' if raw else 'allIncidents',
+            task_obj_id,
+            handler=partial(_incidents_stream_handler, accept=accept)
+        )
+        async for fields in resp_handler():
+            yield collection.Incident(fields)
     
+    @_with_timeout(client_default=False)
+    async def watch_task(self, task_uuid: str) -> t.AsyncIterator[collection.TaskUpdate]:
+        ''' Watch running task, instead of polling `get_single_task`.
+        'singleTask' subscription is kept open, and field diffs sent by ANY.RUN are applied
+        to one task in place. yield `collection.TaskUpdate` for the first document and each change,
+        and stop after task finishes (or is removed). use `timeout` to limit time of whole watch.
+        other requests of the client keep running while watching. server doesn't send watched
+        task to other subscriptions, so `get_single_task` and `get_public_tasks` take it from client.
+
+        ... async for update in client.watch_task(task_uuid):
+        ...     if update.verdict_changed:
+        ...         print(update.task.verdict)
+        '''
+        task_obj_id = await self.check_task_exists(task_uuid)
+        if not task_obj_id:
+            raise AnyRunError(f'No task found. uuid={task_uuid}')
+
+        resp_handler = await self.subscribe(
+            'singleTask', [task_obj_id[0], False], handler=_watch_request_handler, keep_open=True,
+            doc_id=_object_id(task_obj_id[0]))
+        stream = resp_handler()
+        task: t.Optional[collection.Task] = None
+        doc_id = None
+        try:
+            async for msg in stream:
+                kind = msg['msg']
+                if kind == 'ready':
+                    if task is None:
+                        raise AnyRunError(f'Failed to get task. uuid={task_uuid}')
+                    continue
+                if task is None:
+                    # other subscriptions of 'tasks' may send documents of other tasks
+                    if kind != 'added' or (msg.get('fields') or {}).get('uuid') != task_uuid:
+                        continue
+                    doc_id = msg.get('id')
+                    task = self.task_class(msg['fields'])
+                    update = collection.TaskUpdate(kind, task, msg['fields'])
+                elif msg.get('id') != doc_id:
+                    continue
+                elif kind == 'changed':
+                    fields, cleared = msg.get('fields') or {}, msg.get('cleared') or []
+                    previous = task._apply_changes(fields, cleared)
+                    update = collection.TaskUpdate(kind, task, [*fields, *cleared], previous)
+                elif kind == 'removed':
+                    update = collection.TaskUpdate(kind, task, [])
+                else:
+                    continue
+
+                yield update
+                if update.finished:
+                    break
+        finally:
+            # unsubscribe now, not when stream is garbage collected
+            await stream.aclose()
+
+        if task is not None:
+            self._add_to_index([task])
+
+    @_with_timeout
     async def get_mitre(self) -> t.Dict[str, collection.MITRE_Attack]:
         ''' Get MITRE ATT&CK list.
         '''
         resp_handler = await self.subscribe('mitre')
         return {mitre['technique']: collection.MITRE_Attack(mitre) 
-                for mitre in await resp_handler()}
\ No newline at end of file
+                for mitre in await resp_handler()}
+
+    @_with_timeout
+    async def get_mitre_catalog(
+        self,
+        path: t.Optional[t.Union[str, Path]] = None,
+        refresh_interval: float = DEFAULT_REFRESH_INTERVAL
+    ) -> MitreCatalog:
+        ''' Get indexed MITRE ATT&CK catalog. catalog is fetched once and cached on client,
+        and re-fetched when it gets older than `refresh_interval`.
+
+        Args:
+            path: file path to persist catalog. if given and file is fresh enough,
+                catalog is loaded from file without request to ANY.RUN.
+            refresh_interval: interval as second to re-fetch catalog.
+        '''
+        # file is read and written on executor so that event loop is not blocked
+        loop = asyncio.get_event_loop()
+        catalog = self._mitre_catalog
+        if (catalog is None or catalog.is_stale(refresh_interval)) and path is not None \
+                and await loop.run_in_executor(None, Path(path).exists):
+            catalog = await loop.run_in_executor(None, MitreCatalog.load, path)
+
+        if catalog is None or catalog.is_stale(refresh_interval):
+            resp_handler = await self.subscribe('mitre')
+            catalog = MitreCatalog.from_raw(await resp_handler())
+            if path is not None:
+                await loop.run_in_executor(None, catalog.save, path)
+
+        self._mitre_catalog = catalog
+        return catalog
\ No newline at end of file
@@ -1,6 +1,6 @@
 import json
 import typing as t
-from datetime import datetime
+from datetime import datetime, timezone
 
 from aio_anyrun import const as cst
 
@@ -29,9 +29,14 @@ class BaseCollection:
 
 
 class Task(BaseCollection):    
+    @property
+    def _doc(self) -> dict:
+        # document which properties read, see `LazyTask`
+        return self.raw_data
+
     @property
     def threat_level(self) -> int:
-        return self.raw_data['scores']['verdict']['threat_level']
+        return self._doc['scores']['verdict']['threat_level']
     
     @property
     def verdict(self) -> str:
@@ -43,27 +48,43 @@ class Task(BaseCollection):
     
     @property
     def tags(self) -> t.List[str]:
-        return self.raw_data['tags']
+        return self._doc['tags']
     
     @property
     def task_uuid(self) -> str:
-        return self.raw_data['uuid']
+        return self._doc['uuid']
     
+    @property
+    def start_time(self) -> t.Optional[datetime]:
+        started = (self._doc.get('times') or {}).get('taskStart')
+        if started:
+            return datetime.fromtimestamp(started['$date'] / 1000, timezone.utc)
+
+    @property
+    def status(self) -> t.Optional[int]:
+        ''' progress of analysis, `TASK_FINISHED_STATUS` or more when finished.
+        '''
+        return self._doc.get('status')
+
     @property
     def os_version(self) -> dict:
-        return self.raw_data['public']['environment']['OS']
+        return self._doc['public']['environment']['OS']
     
     @property
     def run_type(self) -> str:
-        return self.raw_data['public']['objects']['runType']
+        return self._doc['public']['objects']['runType']
     
+    @property
+    def _main_object(self) -> dict:
+        return self._doc['public']['objects']['mainObject']
+
     @property
     def main_object(self) -> dict:
-        return self.raw_data['public']['objects']['mainObject']
+        return self._main_object
     
     @property
     def hashes(self) -> dict:
-        return self.main_object['hashes']
+        return self._main_object['hashes']
 
     @property
     def md5(self) -> str:
@@ -79,11 +100,11 @@ class Task(BaseCollection):
     
     @property
     def object_uuid(self) -> str:
-        return self.main_object['uuid']
+        return self._main_object['uuid']
     
     @property
     def names(self) -> dict:
-        return self.main_object['names']
+        return self._main_object['names']
     
     @property
     def name(self) -> str:
@@ -94,7 +115,7 @@ class Task(BaseCollection):
     
     @property
     def info(self) -> dict:
-        return self.main_object['info']
+        return self._main_object['info']
         
     @property
     def file_type(self) -> t.Optional[str]:
@@ -120,9 +141,142 @@ class Task(BaseCollection):
     def is_downloadable(self) -> bool:
         return self.run_type != 'url'
 
+    def _apply_changes(self, fields: t.Optional[dict] = None, cleared: t.Optional[t.List[str]] = None) -> dict:
+        ''' apply top-level fields of DDP 'changed' message to document in place.
+        return previous values of changed fields.
+        '''
+        fields = fields or {}
+        cleared = cleared or []
+        previous = {key: self[key] for key in [*fields, *cleared]}
+        doc = self._doc
+        for key, value in fields.items():
+            doc[key] = value
+        for key in cleared:
+            doc.pop(key, None)
+        return previous
+
+
+class _Packed:
+    ''' JSON text of section of document, which is much smaller than decoded one.
+    '''
+    __slots__ = ('text',)
+
+    def __init__(self, value: t.Any):
+        self.text = json.dumps(value, separators=(',', ':'))
+
+    def unpack(self) -> t.Any:
+        return json.loads(self.text)
+
+
+class _LazyDict(dict):
+    ''' dict which decodes packed section on first access, and keeps decoded one.
+    '''
+    def __getitem__(self, key):
+        value = dict.__getitem__(self, key)
+        if isinstance(value, _Packed):
+            value = value.unpack()
+            dict.__setitem__(self, key, value)
+        return value
+
+    def get(self, key, default=None):
+        return self[key] if key in self else default
+
+    def hydrate(self) -> dict:
+        ''' plain dict of whole document. packed sections are decoded but not kept.
+        '''
+        return {
+            key: value.hydrate() if isinstance(value, _LazyDict)
+            else value.unpack() if isinstance(value, _Packed) else value
+            for key, value in self.items()
+        }
+
+
+class LazyTask(Task):
+    ''' Task which keeps bulky sections of document (`LAZY_PATHS`) as compact JSON text,
+    and decodes each of them when property which needs it is accessed first.
+    light properties like `task_uuid`, `sha256` or `verdict` don't decode anything.
+
+    Args:
+        raw_data: task document, or its JSON text.
+    '''
+    LAZY_PATHS: t.Tuple[t.Tuple[str, ...], ...] = (
+        ('public', 'objects', 'mainObject', 'info'),
+        ('public', 'objects', 'mainObject', 'content'),
+        ('public', 'objects', 'mainObject', 'times'),
+        ('public', 'environment'),
+        ('public', 'options'),
+        ('scores', 'specs'),
+    )
+    # properties by class, subclasses may add their own
+    _properties: t.Dict[type, t.List[str]] = {}
+
+    def __init__(self, raw_data: t.Union[str, dict]):
+        if isinstance(raw_data, str):
+            raw_data = json.loads(raw_data)
+        self._lazy_doc = self._pack(raw_data)
+        self._ignores = ['items', 'json', 'raw_data', 'keys', 'values', 'LAZY_PATHS']
+        # properties are same for all instances of class, `dir` is slow
+        properties = LazyTask._properties.get(type(self))
+        if properties is None:
+            properties = LazyTask._properties[type(self)] = [
+                prop for prop in dir(self) if not prop.startswith('_') and prop not in self._ignores]
+        self.properties = properties
+
+    @classmethod
+    def _pack(cls, doc: dict) -> _LazyDict:
+        doc = _LazyDict(doc)
+        for path in cls.LAZY_PATHS:
+            parent = doc
+            for key in path[:-1]:
+                child = dict.get(parent, key)
+                if not isinstance(child, dict):
+                    break
+                if not isinstance(child, _LazyDict):
+                    # copy, not to modify given document
+                    child = _LazyDict(child)
+                    dict.__setitem__(parent, key, child)
+                parent = child
+            else:
+                value = dict.get(parent, path[-1])
+                if value is not None and not isinstance(value, _Packed):
+                    dict.__setitem__(parent, path[-1], _Packed(value))
+        return doc
+
+    @property
+    def _doc(self) -> dict:
+        return self._lazy_doc
+
+    @property
+    def raw_data(self) -> dict:
+        ''' whole document as plain dict, which is decoded on every access.
+        use `__getitem__` or properties for parts of it.
+        '''
+        return self._lazy_doc.hydrate()
+
+    def json(self):
+        # packed sections are decoded one by one while encoding, not into copy of whole document
+        return json.dumps(self._lazy_doc, indent=4, default=_Packed.unpack)
+
+    @property
+    def main_object(self) -> dict:
+        return self._main_object.hydrate()
+
+    def __getitem__(self, key):
+        value = self._lazy_doc.get(key)
+        return value.hydrate() if isinstance(value, _LazyDict) else value
+
+    def _apply_changes(self, fields: t.Optional[dict] = None, cleared: t.Optional[t.List[str]] = None) -> dict:
+        previous = super()._apply_changes(fields, cleared)
+        # pack bulky sections of new values
+        self._lazy_doc = self._pack(self._lazy_doc)
+        return previous
+
 
 StrOrInt = t.Union[int, str]
 
+# `Task.status` of finished task
+TASK_FINISHED_STATUS = 100
+
 REPUTATION_TABLE: t.Dict[int, str] = {
     0: 'unknown',
     1: 'suspicious',
@@ -131,6 +285,33 @@ REPUTATION_TABLE: t.Dict[int, str] = {
     4: 'unsafe'
 }
 
+class TaskUpdate:
+    ''' Update of watched task, see `AnyRunClient.watch_task`.
+
+    Args:
+        kind: 'added' (first document), 'changed' or 'removed'.
+        task: watched task, same object for all updates of a watch and already updated.
+        fields: top-level fields set or cleared by this update.
+        previous: values of `fields` before this update.
+    '''
+    def __init__(self, kind: str, task: Task, fields: t.Iterable[str], previous: t.Optional[dict] = None):
+        self.kind = kind
+        self.task = task
+        self.fields = set(fields)
+        self.previous = previous or {}
+        # task keeps changing, so state at this update is kept
+        self.verdict_changed = kind == 'changed' and 'scores' in self.fields and \
+            (self.previous.get('scores') or {}).get('verdict') != (task['scores'] or {}).get('verdict')
+        self.finished = kind == 'removed' or (task.status or 0) >= TASK_FINISHED_STATUS
+
+    @property
+    def scores_changed(self) -> bool:
+        return 'scores' in self.fields
+
+    def __repr__(self) -> str:
+        return f'TaskUpdate(kind={self.kind}, uuid={self.task.task_uuid}, fields={sorted(self.fields)})'
+
+
 class IoCObject(BaseCollection):
     @property
     def category(self):
@@ -179,17 +360,60 @@ class IoC(BaseCollection):
         return self._parse(self.raw_data.get('Connections'))
 
 
-class MITRE_Attack(BaseCollection):    
+class Incident(BaseCollection):
+    ''' Class to represent indicator of suspicious behavior.
+    '''
+    @property
+    def threat_level(self) -> int:
+        return self.raw_data.get('threatLevel') or 0
+
+    @property
+    def title(self) -> t.Optional[str]:
+        return self.raw_data.get('title')
+
+    @property
+    def types(self) -> t.Optional[str]:
+        return self.raw_data.get('type')
+
+    @property
+    def mitre(self) -> t.List[str]:
+        return self.raw_data.get('mitre') or []
+
+    @property
+    def count(self) -> int:
+        return self.raw_data.get('count') or 0
+
+    @property
+    def first_seen(self) -> t.Optional[datetime]:
+        if self.raw_data.get('firstSeen'):
+            return datetime.fromtimestamp(self.raw_data['firstSeen'] / 1000, timezone.utc)
+
+
+class MITRE_Attack(BaseCollection):
+    def __init__(self, raw_data: dict):
+        super().__init__(raw_data)
+        # parse once, these are accessed repeatedly on mapping incidents
+        self._mitre_url = self._find_mitre_url()
+        self._created = self._parse_created()
+
     @property
     def _external_references(self) -> t.Optional[t.List[dict]]:
         return self.raw_data.get('external_references')
-    
-    @property
-    def mitre_url(self) -> t.Optional[str]:
-        for ref in self._external_references:
+
+    def _find_mitre_url(self) -> t.Optional[str]:
+        for ref in self._external_references or []:
             if ref.get('source_name') == 'mitre-attack':
                 return ref.get('url')
         return ''
+
+    def _parse_created(self) -> t.Optional[datetime]:
+        if self.raw_data.get('created'):
+            return datetime.strptime(self.raw_data['created'], '%Y-%m-%dT%H:%M:%S.%f%z')
+        return None
+    
+    @property
+    def mitre_url(self) -> t.Optional[str]:
+        return self._mitre_url
     
     @property
     def technique(self) -> t.Optional[str]:
@@ -210,6 +434,10 @@ class MITRE_Attack(BaseCollection):
     @property
     def kill_chain_phases(self) -> t.Optional[t.List[dict]]:
         return self.raw_data.get('kill_chain_phases')
+
+    @property
+    def tactics(self) -> t.List[str]:
+        return [phase['phase_name'] for phase in self.kill_chain_phases or [] if phase.get('phase_name')]
     
     @property
     def description(self) -> t.Optional[str]:
@@ -221,5 +449,4 @@ class MITRE_Attack(BaseCollection):
     
     @property
     def created(self) -> t.Optional[datetime]:
-        if self.raw_data.get('created'):
-            return datetime.strptime(self.raw_data['created'], '%Y-%m-%dT%H:%M:%S.%f%z')
+        return self._created
@@ -45,5 +45,17 @@ VERDICTS = AnyRunConsts(
     }
 )
 
+# how to use local index on search
+LOCAL_MODES = Literal['only', 'fallback', 'merge']
+
 # type of handler for websocket response
 HANDLER_FUNC = t.Callable[[], t.Awaitable[dict]]
+
+# type of handler for websocket response, which yields messages as they arrive
+STREAM_HANDLER_FUNC = t.Callable[[], t.AsyncIterator[dict]]
+
+# type of transport to open websocket, called as `transport(session, url, **kwargs)`
+TRANSPORT_FUNC = t.Callable[..., t.Awaitable[t.Any]]
+
+# type of filter on raw document, see `aio_anyrun.filters`
+FILTER_FUNC = t.Callable[[dict], bool]
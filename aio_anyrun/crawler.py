@@ -0,0 +1,181 @@
+''' Incremental crawler of public tasks.
+
+Usage:
+    ... from aio_anyrun.client import AnyRunClient
+    ... from aio_anyrun.crawler import IncrementalCrawler
+    ... async with AnyRunClient.connect() as client:
+    ...     crawler = IncrementalCrawler(client, 'state/', run_type='file', verdict='malicious')
+    ...     async for task in crawler.crawl():
+    ...         print(task.task_uuid)
+
+State of each query is saved in `state_dir` as '<query key>.json' (watermark) and
+'<query key>.bloom' (seen UUIDs), so next run fetches only tasks newer than the last run.
+'''
+import hashlib
+import json
+import logging
+import os
+import typing as t
+from pathlib import Path
+
+from aio_anyrun import collection
+from aio_anyrun.client import AnyRunClient
+from aio_anyrun.sketch import BloomFilter
+
+
+logger = logging.getLogger(__name__)
+
+
+def _write_atomic(path: Path, data: bytes):
+    tmp = path.with_name(path.name + '.tmp')
+    tmp.write_bytes(data)
+    os.replace(str(tmp), str(path))
+
+
+class IncrementalCrawler:
+    ''' Crawl tasks of given query, skipping tasks which previous runs already fetched.
+
+    tasks are returned newest first, so paging stops at the first page which reaches
+    known territory, which is tasks older than the watermark (start time of the newest task
+    of previous runs) or already seen UUIDs.
+    when `max_pages` runs out before that, watermark is kept (newest task is saved as `pending`),
+    so that next run continues to fetch the rest, skipping tasks already seen.
+
+    Args:
+        client: connected `AnyRunClient`.
+        state_dir: directory to persist state.
+        name: name of state files, default is derived from query parameters.
+        use_search: use `search` (getTasks) instead of `get_public_tasks` (publicTasks).
+        max_pages: max number of pages to fetch in a run. each page has 50 tasks.
+        capacity: expected number of UUIDs in seen filter.
+        error_rate: false positive rate of seen filter.
+        query: query parameters, see `AnyRunClient._create_params`.
+    '''
+    PAGE_SIZE = 50
+
+    def __init__(
+        self,
+        client: AnyRunClient,
+        state_dir: t.Union[str, Path],
+        name: t.Optional[str] = None,
+        use_search: bool = False,
+        max_pages: int = 20,
+        capacity: int = 100000,
+        error_rate: float = 0.001,
+        **query
+    ):
+        if 'skip' in query:
+            raise ValueError('`skip` is controlled by crawler.')
+        self.client = client
+        self.query = query
+        self.use_search = use_search
+        self.max_pages = max_pages
+        self.state_dir = Path(state_dir)
+        self.name = name or self.query_key(query, use_search)
+        self.watermark: t.Optional[dict] = None
+        # newest task of run which stopped at `max_pages` before reaching watermark
+        self.pending: t.Optional[dict] = None
+        self.seen = BloomFilter(capacity, error_rate)
+        self._capacity = capacity
+        self._error_rate = error_rate
+        self.load()
+
+    @staticmethod
+    def query_key(query: dict, use_search: bool = False) -> str:
+        ''' stable key of query, based on parameters sent to ANY.RUN.
+        '''
+        params = AnyRunClient._create_params(**query)
+        params['method'] = 'getTasks' if use_search else 'publicTasks'
+        return hashlib.sha1(json.dumps(params, sort_keys=True).encode('utf-8')).hexdigest()
+
+    @property
+    def state_path(self) -> Path:
+        return self.state_dir / f'{self.name}.json'
+
+    @property
+    def seen_path(self) -> Path:
+        return self.state_dir / f'{self.name}.bloom'
+
+    def load(self):
+        if self.state_path.exists():
+            state = json.loads(self.state_path.read_text())
+            self.watermark = state.get('watermark')
+            self.pending = state.get('pending')
+        if self.seen_path.exists():
+            self.seen = BloomFilter.from_bytes(self.seen_path.read_bytes())
+
+    def save(self):
+        self.state_dir.mkdir(parents=True, exist_ok=True)
+        _write_atomic(self.seen_path, self.seen.to_bytes())
+        state = {
+            'query': self.query, 'use_search': self.use_search,
+            'watermark': self.watermark, 'pending': self.pending}
+        _write_atomic(self.state_path, json.dumps(state, indent=4).encode('utf-8'))
+
+    def reset(self):
+        ''' forget previous runs.
+        '''
+        self.watermark = None
+        self.pending = None
+        self.seen = BloomFilter(self._capacity, self._error_rate)
+
+    async def _fetch_page(self, skip: int) -> t.List[collection.Task]:
+        if self.use_search:
+            return await self.client.search(skip=skip, **self.query)
+        return await self.client.get_public_tasks(skip=skip, **self.query)
+
+    def _is_known(self, task: collection.Task, task_time: int) -> bool:
+        if self.watermark is None or task_time > self.watermark['time']:
+            return False
+        return task_time < self.watermark['time'] or task.task_uuid in self.seen
+
+    async def crawl(self) -> t.AsyncIterator[collection.Task]:
+        ''' yield tasks which are not fetched by previous runs, newest first.
+        state is saved when crawling finishes.
+        '''
+        fetched: t.Set[str] = set()
+        newest = self.pending
+        truncated = self.watermark is not None
+        for page in range(self.max_pages):
+            tasks = await self._fetch_page(page * self.PAGE_SIZE)
+            reached_known = False
+            for task in tasks:
+                started = task.start_time
+                task_time = round(started.timestamp() * 1000) if started else 0
+                if task.task_uuid in fetched:
+                    # page shifted by tasks added while paging
+                    continue
+                if self._is_known(task, task_time):
+                    reached_known = True
+                    continue
+                if self.pending is not None and task.task_uuid in self.seen:
+                    # fetched by previous run which stopped at `max_pages`
+                    continue
+
+                fetched.add(task.task_uuid)
+                self.seen.add(task.task_uuid)
+                if newest is None or task_time > newest['time']:
+                    newest = {'time': task_time, 'uuid': task.task_uuid}
+                yield task
+
+            logger.debug(f'Crawled page. name={self.name}, page={page}, fetched={len(fetched)}')
+            if reached_known or len(tasks) < self.PAGE_SIZE:
+                truncated = False
+                break
+
+        if truncated:
+            # tasks between the oldest fetched one and watermark are not fetched yet
+            logger.warning(
+                f'Stopped at max_pages before reaching tasks of previous runs, '
+                f'rest of them are fetched by next run. name={self.name}, max_pages={self.max_pages}')
+            self.pending = newest
+        else:
+            if newest is not None and (self.watermark is None or newest['time'] >= self.watermark['time']):
+                self.watermark = newest
+            self.pending = None
+        self.save()
+
+    async def fetch_new(self) -> t.List[collection.Task]:
+        ''' same as `crawl`, but returns all new tasks as list.
+        '''
+        return [task async for task in self.crawl()]
@@ -0,0 +1,598 @@
+''' Local stand-in server of ANY.RUN for load testing.
+
+It speaks the subset of SockJS/DDP used by `AnyRunClient`
+(`connect`, `login`, `logout`, `publicTasks`, `taskexists`, `singleTask`, `getTasks`,
+`getIOC`, `renderGraph`, `allIncidents`, `rawincidents`, `mitre`) and serves
+file and pcap downloads of the content server. All responses are built from fixtures.
+
+Usage:
+    ... from aio_anyrun.client import AnyRunClient
+    ... from aio_anyrun.fakeserver import FakeAnyRunServer
+    ... async with FakeAnyRunServer('tests/data', latency=0.01) as server:
+    ...     async with AnyRunClient.connect(base_url=server.base_url, content_url=server.content_url) as client:
+    ...         tasks = await client.get_public_tasks()
+
+or run standalone: `python -m aio_anyrun.fakeserver tests/data --port 8080`
+
+Fixtures directory may contain:
+    *.json: task documents, same as `singleTask` returns (i.e. `tests/data/file_task.json`)
+    ioc.json: `getIOC` report served for every task
+    incidents.json: list of incidents served for every task
+    mitre.json: list of MITRE ATT&CK techniques
+    graph.svg: process graph served for every task
+'''
+import aiohttp
+import asyncio
+import copy
+import hashlib
+import json
+import logging
+import random
+import socket
+import struct
+import threading
+import typing as t
+import uuid as uuid_
+from aiohttp import web
+from contextlib import contextmanager
+from pathlib import Path
+
+
+logger = logging.getLogger(__name__)
+
+
+FIXTURE_IOC = 'ioc.json'
+FIXTURE_INCIDENTS = 'incidents.json'
+FIXTURE_MITRE = 'mitre.json'
+FIXTURE_GRAPH = 'graph.svg'
+
+DEFAULT_GRAPH = '<svg xmlns="http://www.w3.org/2000/svg"></svg>'
+
+# page size of `publicTasks` and `getTasks`
+PAGE_SIZE = 50
+
+
+class Fixtures:
+    ''' Documents served by `FakeAnyRunServer`.
+    '''
+    def __init__(
+        self,
+        tasks: t.List[dict],
+        ioc: t.Optional[dict] = None,
+        incidents: t.Optional[t.List[dict]] = None,
+        mitre: t.Optional[t.List[dict]] = None,
+        graph: str = DEFAULT_GRAPH
+    ):
+        if not tasks:
+            raise ValueError('At least one task fixture is required.')
+        self.tasks = tasks
+        self.ioc = ioc or {}
+        self.incidents = incidents or []
+        self.mitre = mitre or []
+        self.graph = graph
+
+    @classmethod
+    def load(cls, fixtures_dir: t.Union[str, Path]) -> 'Fixtures':
+        fixtures_dir = Path(fixtures_dir)
+
+        def load_json(name: str) -> t.Any:
+            path = fixtures_dir / name
+            return json.loads(path.read_text()) if path.exists() else None
+
+        tasks = []
+        for path in sorted(fixtures_dir.glob('*.json')):
+            if path.name in (FIXTURE_IOC, FIXTURE_INCIDENTS, FIXTURE_MITRE):
+                continue
+            doc = json.loads(path.read_text())
+            if isinstance(doc, dict) and 'uuid' in doc and 'public' in doc:
+                tasks.append(doc)
+
+        graph = fixtures_dir / FIXTURE_GRAPH
+        return cls(
+            tasks,
+            ioc=load_json(FIXTURE_IOC),
+            incidents=load_json(FIXTURE_INCIDENTS),
+            mitre=load_json(FIXTURE_MITRE),
+            graph=graph.read_text() if graph.exists() else DEFAULT_GRAPH)
+
+
+def object_id(task_uuid: str) -> dict:
+    ''' fake mongo ObjectId of task, derived from its UUID.
+    '''
+    return {'$type': 'oid', '$value': task_uuid.replace('-', '')[:24]}
+
+
+def _pcap_packet(src: str, dst: str, sport: int, dport: int, proto: int, payload: bytes) -> bytes:
+    if proto == socket.IPPROTO_UDP:
+        l4 = struct.pack('!HHHH', sport, dport, 8 + len(payload), 0)
+    else:
+        # ACK|PSH
+        l4 = struct.pack('!HHIIBBHHH', sport, dport, 1, 1, 5 << 4, 0x18, 65535, 0, 0)
+    ip = struct.pack(
+        '!BBHHHBBH4s4s', 0x45, 0, 20 + len(l4) + len(payload), 0, 0, 64, proto, 0,
+        socket.inet_aton(src), socket.inet_aton(dst))
+    ether = b'\x00\x11\x22\x33\x44\x55' + b'\x66\x77\x88\x99\xaa\xbb' + b'\x08\x00'
+    return ether + ip + l4 + payload
+
+
+def _dns_query(name: str, query_id: int) -> bytes:
+    qname = b''.join(bytes([len(label)]) + label.encode('ascii') for label in name.split('.')) + b'\x00'
+    return struct.pack('!HHHHHH', query_id, 0x0100, 1, 0, 0, 0) + qname + struct.pack('!HH', 1, 1)
+
+
+def synthetic_pcap(size: int, domains: t.Sequence[str] = (), ips: t.Sequence[str] = ()) -> bytes:
+    ''' Build classic pcap (ethernet) of about `size` bytes with DNS queries
+    for `domains` and TCP traffic to `ips`.
+    '''
+    domains = list(domains) or ['example.com']
+    ips = list(ips) or ['198.51.100.1']
+    client_ip = '10.0.2.15'
+    records = [struct.pack('<IHHiIII', 0xa1b2c3d4, 2, 4, 0, 0, 65535, 1)]
+    total = len(records[0])
+    ts = 1580316119
+    i = 0
+    while total < size:
+        if i % 8 == 0:
+            packet = _pcap_packet(
+                client_ip, '10.0.2.1', 49152 + i % 1000, 53, socket.IPPROTO_UDP,
+                _dns_query(domains[(i // 8) % len(domains)], i & 0xffff))
+        else:
+            packet = _pcap_packet(
+                client_ip, ips[i % len(ips)], 49152 + i % len(ips), 443, socket.IPPROTO_TCP,
+                b'\x17\x03\x03' + b'\x00' * 1024)
+        records.append(struct.pack('<IIII', ts + i // 100, (i % 100) * 10000, len(packet), len(packet)))
+        records.append(packet)
+        total += 16 + len(packet)
+        i += 1
+    return b''.join(records)
+
+
+class FakeAnyRunServer:
+    ''' aiohttp based stand-in of ANY.RUN app and content server.
+
+    Args:
+        fixtures: fixtures directory or loaded `Fixtures`.
+        host: host to listen.
+        port: port to listen, 0 picks a free port.
+        latency: delay as second before responding each request.
+        jitter: random delay as second added on top of `latency`.
+        batch_size: number of DDP messages batched in one SockJS frame.
+        error_rate: probability to respond each request with error.
+        fail_methods: method or subscription names which always fail.
+        feed_size: number of tasks in public feed. tasks are cycled from fixtures with new UUIDs,
+            and task start time goes back one minute per task. see `publish` to add new tasks.
+        padding: extra bytes added to each task document to scale payload size.
+        pcap_size: size of served pcap.
+        file_size: size of served file.
+        seed: seed for random latency and error injection.
+        merge_box: send each document once per connection like Meteor does. document held by
+            open subscription is not sent to other subscriptions, and 'removed' is sent
+            when the last subscription holding it is unsubscribed.
+    '''
+    def __init__(
+        self,
+        fixtures: t.Union[str, Path, Fixtures],
+        host: str = '127.0.0.1',
+        port: int = 0,
+        latency: float = 0.0,
+        jitter: float = 0.0,
+        batch_size: int = 1,
+        error_rate: float = 0.0,
+        fail_methods: t.Iterable[str] = (),
+        feed_size: int = 1000,
+        padding: int = 0,
+        pcap_size: int = 64 * 1024,
+        file_size: int = 64 * 1024,
+        seed: t.Optional[int] = None,
+        merge_box: bool = False
+    ):
+        self.fixtures = fixtures if isinstance(fixtures, Fixtures) else Fixtures.load(fixtures)
+        self.host = host
+        self.port = port
+        self.latency = latency
+        self.jitter = jitter
+        self.batch_size = max(1, batch_size)
+        self.error_rate = error_rate
+        self.fail_methods = set(fail_methods)
+        self.feed_size = feed_size
+        self.padding = padding
+        self.pcap_size = pcap_size
+        self.file_size = file_size
+        self.merge_box = merge_box
+        self.requests: t.Dict[str, int] = {}
+
+        self._random = random.Random(seed)
+        self._runner: t.Optional[web.AppRunner] = None
+        self._feed_cache: t.Dict[int, dict] = {}
+        self._pcap: t.Optional[bytes] = None
+        self._file: t.Optional[bytes] = None
+        self._tasks_by_uuid: t.Dict[str, dict] = {}
+        self._tasks_by_object_id: t.Dict[str, dict] = {}
+        # open 'singleTask' subscriptions, id: (task UUID, send), see `update_task`
+        self._watchers: t.Dict[str, t.Tuple[str, t.Callable[[t.List[dict]], t.Awaitable[None]]]] = {}
+        for task in self.fixtures.tasks:
+            self._add_task(task)
+
+    @property
+    def base_url(self) -> str:
+        return f'http://{self.host}:{self.port}'
+
+    @property
+    def content_url(self) -> str:
+        return self.base_url
+
+    def make_app(self) -> web.Application:
+        app = web.Application()
+        app.router.add_get('/sockjs/{server_id}/{session_id}/websocket', self._handle_websocket)
+        app.router.add_get('/tasks/{task_uuid}/download/pcap', self._handle_download_pcap)
+        app.router.add_get('/tasks/{task_uuid}/download/files/{object_uuid}', self._handle_download_file)
+        return app
+
+    async def start(self):
+        self._runner = web.AppRunner(self.make_app())
+        await self._runner.setup()
+        site = web.TCPSite(self._runner, self.host, self.port)
+        await site.start()
+        if self.port == 0:
+            self.port = self._runner.addresses[0][1]
+        logger.debug(f'Fake server started. url={self.base_url}')
+
+    async def close(self):
+        if self._runner is not None:
+            await self._runner.cleanup()
+            self._runner = None
+
+    async def __aenter__(self) -> 'FakeAnyRunServer':
+        await self.start()
+        return self
+
+    async def __aexit__(self, *exc_info):
+        await self.close()
+
+    @contextmanager
+    def serve_in_thread(self) -> t.Iterator['FakeAnyRunServer']:
+        ''' Run server on event loop of background thread, so that it doesn't share
+        event loop (and CPU time of it) with client under test.
+        ... with FakeAnyRunServer('tests/data').serve_in_thread() as server:
+        ...     asyncio.run(bench(server.base_url))
+        '''
+        loop = asyncio.new_event_loop()
+        started = threading.Event()
+        errors: t.List[BaseException] = []
+
+        def run():
+            asyncio.set_event_loop(loop)
+            try:
+                loop.run_until_complete(self.start())
+            except BaseException as e:
+                errors.append(e)
+                loop.close()
+                return
+            finally:
+                started.set()
+            loop.run_forever()
+            loop.run_until_complete(self.close())
+            loop.close()
+
+        thread = threading.Thread(target=run, name='FakeAnyRunServer', daemon=True)
+        thread.start()
+        started.wait()
+        if errors:
+            raise errors[0]
+        try:
+            yield self
+        finally:
+            loop.call_soon_threadsafe(loop.stop)
+            thread.join()
+
+    # fixtures
+
+    def _add_task(self, task: dict):
+        self._tasks_by_uuid[task['uuid']] = task
+        self._tasks_by_object_id[object_id(task['uuid'])['$value']] = task
+
+    def feed_task(self, index: int) -> dict:
+        ''' task at `index` of public feed, newest first.
+        '''
+        # serial number of task, the oldest task in feed is 0
+        serial = self.feed_size - 1 - index
+        task = self._feed_cache.get(serial)
+        if task is None:
+            fixture = self.fixtures.tasks[serial % len(self.fixtures.tasks)]
+            task = copy.copy(fixture)
+            if serial >= len(self.fixtures.tasks):
+                task['uuid'] = str(uuid_.UUID(bytes=hashlib.md5(f'{fixture["uuid"]}:{serial}'.encode()).digest()))
+            task['times'] = dict(fixture.get('times') or {})
+            task['times']['taskStart'] = {'$date': 1580316101757 + serial * 60000}
+            if self.padding:
+                task['padding'] = 'x' * self.padding
+            self._feed_cache[serial] = task
+            self._add_task(task)
+        return task
+
+    def publish(self, count: int = 1) -> t.List[dict]:
+        ''' add `count` new tasks on top of public feed, returns them newest first.
+        '''
+        self.feed_size += count
+        return [self.feed_task(i) for i in range(count)]
+
+    async def update_task(
+        self,
+        task_uuid: str,
+        fields: t.Optional[dict] = None,
+        cleared: t.Iterable[str] = ()
+    ) -> dict:
+        ''' change top-level fields of task, i.e. `status` or `scores` of running task,
+        and send 'changed' message to open 'singleTask' subscriptions of it.
+        '''
+        task = self._tasks_by_uuid[task_uuid]
+        fields = fields or {}
+        cleared = list(cleared)
+        task.update(fields)
+        for key in cleared:
+            task.pop(key, None)
+
+        msg: t.Dict[str, t.Any] = {
+            'msg': 'changed', 'collection': 'tasks', 'id': object_id(task_uuid)['$value'], 'fields': fields}
+        if cleared:
+            msg['cleared'] = cleared
+        sends = {id(send): send for watched, send in self._watchers.values() if watched == task_uuid}
+        for send in sends.values():
+            await send([msg])
+        return task
+
+    def find_task(self, task_uuid: str) -> t.Optional[dict]:
+        return self._tasks_by_uuid.get(task_uuid)
+
+    def find_task_by_object_id(self, obj_id: dict) -> t.Optional[dict]:
+        value = obj_id.get('$value') if isinstance(obj_id, dict) else obj_id
+        return self._tasks_by_object_id.get(value)
+
+    def pcap(self) -> bytes:
+        if self._pcap is None:
+            ioc = self.fixtures.ioc
+            domains = [o['ioc'] for o in ioc.get('DNS requests') or []]
+            ips = [o['ioc'] for o in ioc.get('Connections') or []]
+            self._pcap = synthetic_pcap(self.pcap_size, domains, ips)
+        return self._pcap
+
+    def file(self) -> bytes:
+        if self._file is None:
+            self._file = bytes(range(256)) * (self.file_size // 256) + bytes(range(self.file_size % 256))
+        return self._file
+
+    # websocket
+
+    async def _delay(self):
+        delay = self.latency + (self._random.random() * self.jitter if self.jitter else 0)
+        if delay > 0:
+            await asyncio.sleep(delay)
+
+    def _should_fail(self, name: str) -> bool:
+        if name in self.fail_methods:
+            return True
+        return self.error_rate > 0 and self._random.random() < self.error_rate
+
+    @staticmethod
+    def _error(name: str) -> dict:
+        return {'error': 500, 'reason': 'Injected error', 'message': f'Injected error on {name} [500]', 'errorType': 'Meteor.Error'}
+
+    async def _handle_websocket(self, request: web.Request) -> web.WebSocketResponse:
+        ws = web.WebSocketResponse()
+        await ws.prepare(request)
+        await ws.send_str('o')
+
+        lock = asyncio.Lock()
+        tasks = set()
+        # documents sent on this connection, (collection, id): ids of subscriptions holding it
+        box: t.Dict[t.Tuple[str, str], t.Set[str]] = {}
+
+        async def send(messages: t.List[dict]):
+            async with lock:
+                for i in range(0, len(messages), self.batch_size):
+                    batch = messages[i:i + self.batch_size]
+                    await ws.send_str('a' + json.dumps([json.dumps(msg) for msg in batch]))
+
+        async for frame in ws:
+            if frame.type != aiohttp.WSMsgType.TEXT:
+                break
+            try:
+                messages = [json.loads(msg) for msg in json.loads(frame.data)]
+            except (ValueError, TypeError):
+                logger.debug(f'Bad frame. frame={frame.data}')
+                continue
+
+            for msg in messages:
+                task = asyncio.ensure_future(self._handle_message(msg, send, box))
+                tasks.add(task)
+                task.add_done_callback(tasks.discard)
+
+        for task in tasks:
+            task.cancel()
+        for sub_id, (_, watcher) in list(self._watchers.items()):
+            if watcher is send:
+                del self._watchers[sub_id]
+        return ws
+
+    async def _handle_message(
+        self,
+        msg: dict,
+        send: t.Callable[[t.List[dict]], t.Awaitable[None]],
+        box: t.Dict[t.Tuple[str, str], t.Set[str]]
+    ):
+        kind = msg.get('msg')
+        if kind == 'connect':
+            await send([{'msg': 'connected', 'session': uuid_.uuid4().hex[:17]}])
+        elif kind == 'ping':
+            await send([{'msg': 'pong', 'id': msg.get('id')}] if 'id' in msg else [{'msg': 'pong'}])
+        elif kind == 'method':
+            await self._handle_method(msg, send)
+        elif kind == 'sub':
+            await self._handle_sub(msg, send, box)
+        elif kind == 'unsub':
+            sub_id = msg.get('id')
+            self._watchers.pop(sub_id, None)
+            messages = []
+            for (collection, doc_id), holders in list(box.items()):
+                holders.discard(sub_id)
+                if not holders:
+                    del box[(collection, doc_id)]
+                    messages.append({'msg': 'removed', 'collection': collection, 'id': doc_id})
+            messages.append({'msg': 'nosub', 'id': sub_id})
+            await send(messages)
+
+    async def _handle_method(self, msg: dict, send: t.Callable[[t.List[dict]], t.Awaitable[None]]):
+        name, msg_id, params = msg.get('method'), msg.get('id'), msg.get('params') or []
+        self.requests[name] = self.requests.get(name, 0) + 1
+        await self._delay()
+
+        if self._should_fail(name):
+            await send([{'msg': 'result', 'id': msg_id, 'error': self._error(name)}])
+            return
+
+        messages = []
+        if name == 'login':
+            email = params[0]['user']['email']
+            token = hashlib.sha256(f'{email}:{msg_id}'.encode()).hexdigest()
+            messages.append({
+                'msg': 'added', 'collection': 'users', 'id': hashlib.md5(email.encode()).hexdigest()[:17],
+                'fields': {'emails': [{'address': email, 'verified': True}],
+                           'services': {'resume': {'loginTokens': [{'hashedToken': token}]}}}})
+            result: t.Any = {'id': email, 'token': token}
+        elif name == 'logout':
+            result = None
+        elif name == 'getTasks':
+            query = params[0] if params else {}
+            skip = query.get('skip', 0)
+            result = {'res': [self.feed_task(i) for i in range(skip, min(skip + PAGE_SIZE, self.feed_size))]}
+        elif name == 'getIOC':
+            result = self.fixtures.ioc
+        elif name == 'renderGraph':
+            result = self.fixtures.graph
+        else:
+            await send([{'msg': 'result', 'id': msg_id, 'error': {
+                'error': 404, 'reason': 'Method not found', 'message': f"Method '{name}' not found [404]"}}])
+            return
+
+        messages.append({'msg': 'result', 'id': msg_id, 'result': result})
+        await send(messages)
+
+    async def _handle_sub(
+        self,
+        msg: dict,
+        send: t.Callable[[t.List[dict]], t.Awaitable[None]],
+        box: t.Dict[t.Tuple[str, str], t.Set[str]]
+    ):
+        name, sub_id, params = msg.get('name'), msg.get('id'), msg.get('params') or []
+        self.requests[name] = self.requests.get(name, 0) + 1
+        await self._delay()
+
+        if self._should_fail(name):
+            await send([{'msg': 'nosub', 'id': sub_id, 'error': self._error(name)}])
+            return
+
+        def added(collection: str, doc_id: str, fields: dict) -> dict:
+            return {'msg': 'added', 'collection': collection, 'id': doc_id, 'fields': fields}
+
+        messages = []
+        watched = None
+        if name == 'publicTasks':
+            limit, skip = params[0], params[1]
+            for i in range(skip, min(limit, self.feed_size)):
+                task = self.feed_task(i)
+                messages.append(added('tasks', object_id(task['uuid'])['$value'], task))
+        elif name == 'taskexists':
+            task = self.find_task(params[0])
+            if task is not None:
+                messages.append(added('taskExists', task['uuid'], {'taskObjectId': object_id(task['uuid'])}))
+        elif name == 'singleTask':
+            task = self.find_task_by_object_id(params[0])
+            if task is not None:
+                messages.append(added('tasks', object_id(task['uuid'])['$value'], task))
+                watched = task['uuid']
+        elif name in ('allIncidents', 'rawincidents'):
+            collection = 'events.incidents' if name == 'allIncidents' else 'events.rawincidents'
+            task = self.find_task_by_object_id(params[0]) if params else None
+            if task is not None:
+                task_id = object_id(task['uuid'])
+                for i, incident in enumerate(self.fixtures.incidents):
+                    messages.append(added(collection, f'{task_id["$value"]}{i:04d}', dict(incident, task=task_id)))
+        elif name == 'mitre':
+            for technique in self.fixtures.mitre:
+                messages.append(added('mitre', technique['technique'], technique))
+        else:
+            await send([{'msg': 'nosub', 'id': sub_id, 'error': {
+                'error': 404, 'reason': 'Subscription not found', 'message': f"Subscription '{name}' not found [404]"}}])
+            return
+
+        if self.merge_box:
+            unsent = []
+            for message in messages:
+                holders = box.setdefault((message['collection'], message['id']), set())
+                if not holders:
+                    unsent.append(message)
+                holders.add(sub_id)
+            messages = unsent
+        messages.append({'msg': 'ready', 'subs': [sub_id]})
+        await send(messages)
+        if watched is not None:
+            # subscription stays open until unsub, and gets changes of task
+            self._watchers[sub_id] = (watched, send)
+
+    # content server
+
+    def _check_token(self, request: web.Request):
+        if not request.cookies.get('tokenLogin'):
+            raise web.HTTPForbidden(text='login token is required')
+
+    async def _handle_download_pcap(self, request: web.Request) -> web.StreamResponse:
+        self._check_token(request)
+        task_uuid = request.match_info['task_uuid']
+        self.requests['download_pcap'] = self.requests.get('download_pcap', 0) + 1
+        if self.find_task(task_uuid) is None:
+            raise web.HTTPNotFound()
+        await self._delay()
+        return web.Response(
+            body=self.pcap(),
+            content_type='application/vnd.tcpdump.pcap',
+            headers={'Content-Disposition': f'attachment; filename="{task_uuid}.pcap"'})
+
+    async def _handle_download_file(self, request: web.Request) -> web.StreamResponse:
+        self._check_token(request)
+        task_uuid = request.match_info['task_uuid']
+        object_uuid = request.match_info['object_uuid']
+        self.requests['download_file'] = self.requests.get('download_file', 0) + 1
+        if self.find_task(task_uuid) is None:
+            raise web.HTTPNotFound()
+        await self._delay()
+        return web.Response(
+            body=self.file(),
+            content_type='application/zip',
+            headers={'Content-Disposition': f'attachment; filename="{object_uuid}.zip"'})
+
+
+def main():
+    import click
+
+    @click.command(help='Run local stand-in server of ANY.RUN')
+    @click.argument('fixtures_dir', type=click.Path(exists=True, file_okay=False))
+    @click.option('--host', type=str, default='127.0.0.1', help='host to listen')
+    @click.option('--port', type=int, default=8080, help='port to listen')
+    @click.option('--latency', type=float, default=0.0, help='delay as second before responding')
+    @click.option('--jitter', type=float, default=0.0, help='random delay as second added on latency')
+    @click.option('--batch-size', type=int, default=1, help='DDP messages per SockJS frame')
+    @click.option('--error-rate', type=float, default=0.0, help='probability to respond with error')
+    @click.option('--fail-method', 'fail_methods', type=str, multiple=True, help='method which always fails')
+    @click.option('--feed-size', type=int, default=1000, help='number of tasks in public feed')
+    @click.option('--padding', type=int, default=0, help='extra bytes added to each task')
+    @click.option('--pcap-size', type=int, default=64 * 1024, help='size of served pcap')
+    @click.option('--file-size', type=int, default=64 * 1024, help='size of served file')
+    def run(fixtures_dir: str, host: str, port: int, **kwargs):
+        server = FakeAnyRunServer(fixtures_dir, **kwargs)
+        web.run_app(server.make_app(), host=host, port=port)
+
+    run()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,181 @@
+''' Predicates on raw task documents, to filter results before `Task` is built.
+
+Usage:
+    ... from aio_anyrun.filters import F
+    ... where = (F('public.objects.mainObject.info.meta.mime') == 'application/pdf') & F('tags').contains('emotet')
+    ... tasks = await client.get_public_tasks(where=where)
+    ... tasks = await client.search(verdict='malicious', where=~F('public.environment.OS.major').in_(['7']))
+
+Paths are dotted keys of raw document (`Task.raw_data`). lists on the way are searched for
+any matching element, i.e. 'public.objects.processes.name' matches name of any process.
+missing fields never match.
+'''
+import operator
+import re
+import typing as t
+
+
+def _resolve(value: t.Any, keys: t.Sequence[str]) -> t.Iterator[t.Any]:
+    for i, key in enumerate(keys):
+        if isinstance(value, list):
+            for item in value:
+                yield from _resolve(item, keys[i:])
+            return
+        if not isinstance(value, dict) or key not in value:
+            return
+        value = value[key]
+    yield value
+
+
+class Filter:
+    ''' Base of predicates, which can be combined with `&`, `|` and `~`.
+    any callable of `(doc: dict) -> bool` can be used where filter is accepted.
+    '''
+    def __call__(self, doc: dict) -> bool:
+        raise NotImplementedError
+
+    def __and__(self, other: 'Filter') -> 'Filter':
+        return All(self, other)
+
+    def __or__(self, other: 'Filter') -> 'Filter':
+        return Any(self, other)
+
+    def __invert__(self) -> 'Filter':
+        return Not(self)
+
+
+class All(Filter):
+    def __init__(self, *filters: t.Callable[[dict], bool]):
+        # flatten nested `&` to evaluate in one loop
+        self.filters = [f for flt in filters for f in (flt.filters if isinstance(flt, All) else [flt])]
+
+    def __call__(self, doc: dict) -> bool:
+        return all(f(doc) for f in self.filters)
+
+    def __repr__(self) -> str:
+        return '(' + ' & '.join(map(repr, self.filters)) + ')'
+
+
+class Any(Filter):
+    def __init__(self, *filters: t.Callable[[dict], bool]):
+        self.filters = [f for flt in filters for f in (flt.filters if isinstance(flt, Any) else [flt])]
+
+    def __call__(self, doc: dict) -> bool:
+        return any(f(doc) for f in self.filters)
+
+    def __repr__(self) -> str:
+        return '(' + ' | '.join(map(repr, self.filters)) + ')'
+
+
+class Not(Filter):
+    def __init__(self, flt: t.Callable[[dict], bool]):
+        self.filter = flt
+
+    def __call__(self, doc: dict) -> bool:
+        return not self.filter(doc)
+
+    def __repr__(self) -> str:
+        return f'~{self.filter!r}'
+
+
+class Match(Filter):
+    ''' true if `test` returns true for any value at `path`.
+    list value is tested element by element, unless `whole` is True.
+    '''
+    def __init__(
+        self,
+        path: str,
+        test: t.Callable[[t.Any], bool],
+        description: str = '',
+        whole: bool = False
+    ):
+        self.path = path
+        self.keys = path.split('.')
+        self.test = test
+        self.description = description
+        self.whole = whole
+
+    def _test(self, value: t.Any) -> bool:
+        try:
+            return bool(self.test(value))
+        except TypeError:
+            # i.e. comparing number with None
+            return False
+
+    def __call__(self, doc: dict) -> bool:
+        for value in _resolve(doc, self.keys):
+            if isinstance(value, list) and not self.whole:
+                if any(self._test(item) for item in value):
+                    return True
+            elif self._test(value):
+                return True
+        return False
+
+    def __repr__(self) -> str:
+        return f'F({self.path!r}){self.description}'
+
+
+class NotEqual(Match):
+    ''' true if field exists and none of its values equals `other`,
+    i.e. list matches only when no element equals it.
+    '''
+    def __init__(self, path: str, other: t.Any):
+        super().__init__(path, lambda value: value == other, f' != {other!r}')
+
+    def __call__(self, doc: dict) -> bool:
+        if next(_resolve(doc, self.keys), None) is None:
+            return False
+        return not super().__call__(doc)
+
+
+class F:
+    ''' Field of raw document at dotted `path`, which builds filters by comparison.
+    '''
+    def __init__(self, path: str):
+        self.path = path
+
+    def _compare(self, op: t.Callable[[t.Any, t.Any], bool], symbol: str, other: t.Any) -> Match:
+        return Match(self.path, lambda value: op(value, other), f' {symbol} {other!r}')
+
+    def __eq__(self, other: t.Any) -> Match:  # type: ignore
+        return self._compare(operator.eq, '==', other)
+
+    def __ne__(self, other: t.Any) -> Match:  # type: ignore
+        # missing field doesn't match, use `~(F(path) == other)` to include it
+        return NotEqual(self.path, other)
+
+    def __lt__(self, other: t.Any) -> Match:
+        return self._compare(operator.lt, '<', other)
+
+    def __le__(self, other: t.Any) -> Match:
+        return self._compare(operator.le, '<=', other)
+
+    def __gt__(self, other: t.Any) -> Match:
+        return self._compare(operator.gt, '>', other)
+
+    def __ge__(self, other: t.Any) -> Match:
+        return self._compare(operator.ge, '>=', other)
+
+    __hash__ = None  # type: ignore
+
+    def in_(self, values: t.Iterable[t.Any]) -> Match:
+        values = set(values)
+        return Match(self.path, lambda value: value in values, f'.in_({sorted(values, key=str)!r})')
+
+    def contains(self, item: t.Any) -> Match:
+        ''' list at path has `item`, or string at path has `item` as substring.
+        '''
+        return Match(self.path, lambda value: item in value, f'.contains({item!r})', whole=True)
+
+    def exists(self) -> Match:
+        return Match(self.path, lambda value: value is not None, '.exists()', whole=True)
+
+    def matches(self, pattern: str, flags: int = 0) -> Match:
+        ''' string at path matches regular expression `pattern` (`re.search`).
+        '''
+        regex = re.compile(pattern, flags)
+        return Match(self.path, lambda value: isinstance(value, str) and regex.search(value), f'.matches({pattern!r})')
+
+    def startswith(self, prefix: str) -> Match:
+        return Match(
+            self.path, lambda value: isinstance(value, str) and value.startswith(prefix), f'.startswith({prefix!r})')
@@ -0,0 +1,252 @@
+''' Local inverted index over fetched tasks and IoCs.
+
+Usage:
+    ... from aio_anyrun.client import AnyRunClient
+    ... from aio_anyrun.index import TaskIndex
+    ... index = TaskIndex()
+    ... async with AnyRunClient.connect(index=index) as client:
+    ...     await client.search(tag='emotet')            # results are added to index
+    ...     tasks = index.search(tag='emotet', verdict='malicious')     # no network
+    ...     tasks = await client.search(tag='emotet', local='merge')    # remote + local
+'''
+import heapq
+import json
+import typing as t
+from pathlib import Path
+
+from aio_anyrun import collection
+from aio_anyrun import const as cst
+
+
+HASH_TYPES = ('md5', 'sha1', 'sha256')
+
+# (keyword of mime type or file type, extension category), first match wins
+EXTENSION_RULES: t.List[t.Tuple[str, str]] = [
+    ('(dll)', 'dll'),
+    ('x-dosexec', 'exe'),
+    ('executable', 'exe'),
+    ('java-archive', 'java'),
+    ('x-java', 'java'),
+    ('html', 'html'),
+    ('shockwave-flash', 'flash'),
+    ('pdf', 'pdf'),
+    ('msword', 'office'),
+    ('ms-excel', 'office'),
+    ('ms-powerpoint', 'office'),
+    ('officedocument', 'office'),
+    ('opendocument', 'office'),
+    ('rtf', 'office'),
+    ('message/rfc822', 'email'),
+    ('ms-outlook', 'email'),
+    ('javascript', 'script'),
+    ('vbscript', 'script'),
+    ('x-python', 'script'),
+    ('x-shellscript', 'script'),
+    ('powershell', 'script'),
+    ('x-msdos-batch', 'script'),
+]
+
+# parameters of `_create_params` which can't be answered from index
+UNSUPPORTED_PARAMS = ('mitre_id', 'suricata_sid')
+
+
+class IndexQueryError(Exception):
+    pass
+
+
+def _norm(value: str) -> str:
+    return value.strip().lower()
+
+
+def _as_list(value: t.Union[None, str, t.Iterable[str]]) -> t.List[str]:
+    return [value] if isinstance(value, str) else list(value or [])
+
+
+def extension_of(task: collection.Task) -> t.Optional[str]:
+    ''' extension category of task, same as `extensions` param of search.
+    '''
+    if not task.is_downloadable:
+        return None
+    meta = task.info.get('meta') or {}
+    target = f'{meta.get("mime") or ""} {meta.get("file") or ""}'.lower()
+    for keyword, extension in EXTENSION_RULES:
+        if keyword in target:
+            return extension
+    return None
+
+
+class TaskIndex:
+    ''' In-memory inverted index of tasks and IoCs.
+
+    postings are kept by field and value:
+        hash: hashes of main object
+        file_hash: hashes of main object and any files found in IoC
+        ip, domain: IPs and domains found in IoC
+        tag, extension, verdict, run_type, significant: attributes of task
+    '''
+    PAGE_SIZE = 50
+
+    def __init__(self):
+        # tasks are kept as given, so `LazyTask` stays packed
+        self.tasks: t.Dict[str, collection.Task] = {}
+        self.iocs: t.Dict[str, dict] = {}
+        self.postings: t.Dict[str, t.Dict[t.Any, t.Set[str]]] = {}
+        # (field, value) pairs posted by each task, to remove them when task is replaced
+        self._posted: t.Dict[str, t.Set[t.Tuple[str, t.Any]]] = {}
+        self._times: t.Dict[str, int] = {}
+
+    def __len__(self) -> int:
+        return len(self.tasks)
+
+    def __contains__(self, task_uuid: str) -> bool:
+        return task_uuid in self.tasks
+
+    def _post(self, field: str, value: t.Any, task_uuid: str):
+        if value is None or value == '':
+            return
+        if isinstance(value, str):
+            value = _norm(value)
+        self.postings.setdefault(field, {}).setdefault(value, set()).add(task_uuid)
+        self._posted.setdefault(task_uuid, set()).add((field, value))
+
+    def _unpost(self, task_uuid: str):
+        for field, value in self._posted.pop(task_uuid, ()):
+            values = self.postings[field]
+            values[value].discard(task_uuid)
+            if not values[value]:
+                del values[value]
+                if not values:
+                    del self.postings[field]
+
+    def add_task(self, task: collection.Task):
+        ''' add task, or replace it if task of same UUID is already added.
+        '''
+        task_uuid = task.task_uuid
+        if task_uuid in self.tasks:
+            self._unpost(task_uuid)
+
+        self.tasks[task_uuid] = task
+        started = task.start_time
+        self._times[task_uuid] = started.timestamp() if started else 0
+
+        self._post('run_type', task.run_type, task_uuid)
+        self._post('verdict', task.verdict, task_uuid)
+        self._post('significant', bool(task['significant']), task_uuid)
+        for tag in task.tags or []:
+            self._post('tag', tag, task_uuid)
+        if task.is_downloadable:
+            self._post('extension', extension_of(task), task_uuid)
+            for hash_type in HASH_TYPES:
+                self._post('hash', task.hashes.get(hash_type), task_uuid)
+                self._post('file_hash', task.hashes.get(hash_type), task_uuid)
+
+        if task_uuid in self.iocs:
+            self._post_ioc(task_uuid, collection.IoC(self.iocs[task_uuid]))
+
+    def add_tasks(self, tasks: t.Iterable[collection.Task]):
+        for task in tasks:
+            self.add_task(task)
+
+    def _post_ioc(self, task_uuid: str, ioc: collection.IoC):
+        for category in ioc.raw_data.values():
+            for obj in category or []:
+                ioc_type = _norm(obj.get('type') or '')
+                if ioc_type in HASH_TYPES:
+                    self._post('file_hash', obj.get('ioc'), task_uuid)
+                elif ioc_type in ('ip', 'domain'):
+                    self._post(ioc_type, obj.get('ioc'), task_uuid)
+
+    def add_ioc(self, task_uuid: str, ioc: collection.IoC):
+        ''' add IoC of task, which can be retrieved by `AnyRunClient.get_ioc`.
+        '''
+        self.iocs[task_uuid] = ioc.raw_data
+        self._post_ioc(task_uuid, ioc)
+
+    def get_task(self, task_uuid: str) -> t.Optional[collection.Task]:
+        return self.tasks.get(task_uuid)
+
+    def get_ioc(self, task_uuid: str) -> t.Optional[collection.IoC]:
+        raw = self.iocs.get(task_uuid)
+        return collection.IoC(raw) if raw is not None else None
+
+    def _lookup(self, field: str, values: t.Iterable[t.Any]) -> t.Set[str]:
+        postings = self.postings.get(field, {})
+        result: t.Set[str] = set()
+        for value in values:
+            result |= postings.get(_norm(value) if isinstance(value, str) else value, set())
+        return result
+
+    def search(
+        self,
+        is_public: bool = True,
+        hash_: str = '',
+        run_type: t.Optional[cst.RUN_TYPES.types] = None,
+        name: str = '',
+        verdict: t.Optional[cst.VERDICTS.types] = None,
+        extensions: t.Optional[cst.EXTENSIONS.types] = None,
+        ip: str = '',
+        domain: str = '',
+        file_hash: str = '',
+        mitre_id: str = '',
+        suricata_sid: int = 0,
+        significant: bool = False,
+        tag: str = '',
+        skip: int = 0
+    ) -> t.List[collection.Task]:
+        ''' Search indexed tasks, newest first. parameters are same as `AnyRunClient.search`,
+        see `AnyRunClient._create_params` for details.
+        raise `IndexQueryError` if given parameters can't be answered from index.
+        '''
+        if mitre_id or suricata_sid:
+            raise IndexQueryError(f'Not indexed parameter. params={UNSUPPORTED_PARAMS}')
+
+        conditions = [
+            ('hash', [hash_] if hash_ else []),
+            ('run_type', _as_list(run_type)),
+            ('verdict', _as_list(verdict)),
+            ('extension', _as_list(extensions)),
+            ('ip', [ip] if ip else []),
+            ('domain', [domain] if domain else []),
+            ('file_hash', [file_hash] if file_hash else []),
+            ('tag', [tag] if tag else []),
+            ('significant', [True] if significant else []),
+        ]
+        candidates: t.Optional[t.Set[str]] = None
+        # intersect smallest postings first
+        for uuids in sorted((self._lookup(field, values) for field, values in conditions if values), key=len):
+            candidates = uuids if candidates is None else candidates & uuids
+            if not candidates:
+                return []
+        if candidates is None:
+            candidates = set(self.tasks)
+
+        if name:
+            name = _norm(name)
+            candidates = {uuid for uuid in candidates if name in _norm(self.get_task(uuid).name or '')}
+
+        newest = heapq.nlargest(skip + self.PAGE_SIZE, candidates, key=self._times.__getitem__)
+        return [self.get_task(uuid) for uuid in newest[skip:]]
+
+    def save(self, path: t.Union[str, Path]):
+        ''' save indexed documents as JSON lines. postings are rebuilt on `load`.
+        '''
+        with Path(path).open('w', encoding='utf-8') as fd:
+            for task_uuid, task in self.tasks.items():
+                fd.write(json.dumps({'task': task.raw_data, 'ioc': self.iocs.get(task_uuid)}))
+                fd.write('\n')
+            for task_uuid, raw in self.iocs.items():
+                if task_uuid not in self.tasks:
+                    fd.write(json.dumps({'uuid': task_uuid, 'ioc': raw}))
+                    fd.write('\n')
+
+    @classmethod
+    def load(cls, path: t.Union[str, Path]) -> 'TaskIndex':
+        index = cls()
+        with Path(path).open(encoding='utf-8') as fd:
+            for line in fd:
+                doc = json.loads(line)
+                if doc.get('task') is not None:
+                    index.add_task(collection.Task(doc['task']))
+                if doc.get('ioc') is not None:
+                    index.add_ioc(doc.get('uuid') or doc['task']['uuid'], collection.IoC(doc['ioc']))
+        return index
@@ -0,0 +1,107 @@
+''' Cached and indexed MITRE ATT&CK catalog.
+
+Usage:
+    ... from aio_anyrun.client import AnyRunClient
+    ... async with AnyRunClient.connect() as client:
+    ...     catalog = await client.get_mitre_catalog(path='mitre.json')
+    ...     catalog['T1060'].name
+    ...     catalog.tactic('persistence')
+    ...     catalog.for_incident(incident)
+'''
+import json
+import os
+import time
+import typing as t
+from pathlib import Path
+
+from aio_anyrun import collection
+
+
+# default interval as second to re-fetch catalog
+DEFAULT_REFRESH_INTERVAL = 24 * 60 * 60
+
+
+class MitreCatalog:
+    ''' MITRE ATT&CK techniques indexed by technique ID, tactic (`kill_chain_phases`) and platform.
+    dates and URLs are parsed once when catalog is built.
+
+    Args:
+        techniques: techniques, which can be retrieved by `AnyRunClient.get_mitre`.
+        fetched_at: epoch seconds when techniques are fetched from ANY.RUN.
+    '''
+    def __init__(
+        self,
+        techniques: t.Iterable[collection.MITRE_Attack],
+        fetched_at: t.Optional[float] = None
+    ):
+        self.fetched_at = time.time() if fetched_at is None else fetched_at
+        self.by_id: t.Dict[str, collection.MITRE_Attack] = {}
+        self.by_tactic: t.Dict[str, t.List[collection.MITRE_Attack]] = {}
+        self.by_platform: t.Dict[str, t.List[collection.MITRE_Attack]] = {}
+
+        for technique in techniques:
+            if not technique.technique:
+                continue
+            self.by_id[technique.technique] = technique
+            for tactic in technique.tactics:
+                self.by_tactic.setdefault(tactic.lower(), []).append(technique)
+            for platform in technique.platforms or []:
+                self.by_platform.setdefault(platform.lower(), []).append(technique)
+
+    @classmethod
+    def from_raw(cls, docs: t.Iterable[dict], fetched_at: t.Optional[float] = None) -> 'MitreCatalog':
+        return cls((collection.MITRE_Attack(doc) for doc in docs), fetched_at)
+
+    def __len__(self) -> int:
+        return len(self.by_id)
+
+    def __iter__(self) -> t.Iterator[collection.MITRE_Attack]:
+        return iter(self.by_id.values())
+
+    def __contains__(self, technique_id: str) -> bool:
+        return technique_id in self.by_id
+
+    def __getitem__(self, technique_id: str) -> collection.MITRE_Attack:
+        return self.by_id[technique_id]
+
+    def get(self, technique_id: str) -> t.Optional[collection.MITRE_Attack]:
+        return self.by_id.get(technique_id)
+
+    def tactic(self, name: str) -> t.List[collection.MITRE_Attack]:
+        ''' techniques of tactic, i.e. 'persistence'.
+        '''
+        return self.by_tactic.get(name.lower(), [])
+
+    def platform(self, name: str) -> t.List[collection.MITRE_Attack]:
+        ''' techniques for platform, i.e. 'Windows'.
+        '''
+        return self.by_platform.get(name.lower(), [])
+
+    def for_incident(self, incident: t.Union[dict, collection.Incident]) -> t.List[collection.MITRE_Attack]:
+        ''' techniques referred by incident, unknown IDs are ignored.
+        incident is `Incident` or its fields (`fields` of `events.incidents` message).
+        '''
+        ids = incident.mitre if isinstance(incident, collection.Incident) else incident.get('mitre')
+        return [self.by_id[i] for i in ids or [] if i in self.by_id]
+
+    def as_dict(self) -> t.Dict[str, collection.MITRE_Attack]:
+        ''' same as `AnyRunClient.get_mitre` returns.
+        '''
+        return dict(self.by_id)
+
+    def is_stale(self, refresh_interval: float = DEFAULT_REFRESH_INTERVAL) -> bool:
+        return time.time() - self.fetched_at > refresh_interval
+
+    def save(self, path: t.Union[str, Path]):
+        path = Path(path)
+        tmp = path.with_name(path.name + '.tmp')
+        tmp.write_text(json.dumps({
+            'fetched_at': self.fetched_at,
+            'techniques': [technique.raw_data for technique in self]
+        }))
+        os.replace(str(tmp), str(path))
+
+    @classmethod
+    def load(cls, path: t.Union[str, Path]) -> 'MitreCatalog':
+        data = json.loads(Path(path).read_text())
+        return cls.from_raw(data['techniques'], data['fetched_at'])
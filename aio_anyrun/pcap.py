@@ -0,0 +1,244 @@
+''' Streaming flow summary of pcap.
+
+Usage:
+    ... async with AnyRunClient.connect() as client:
+    ...     await client.login(email, password)
+    ...     task = await client.get_single_task(task_uuid)
+    ...     path = await client.download_pcap(task, summarize=True)   # '<UUID>.pcap.summary.json' is saved too
+    ...     summary = load_summary(summary_path(path))
+
+`FlowSummarizer` parses record headers of classic pcap as chunks arrive, and keeps only
+a flow table, so pcap is never read again (or even saved, see `keep_pcap` of `download_pcap`).
+'''
+import ipaddress
+import json
+import logging
+import struct
+import typing as t
+from pathlib import Path
+
+
+logger = logging.getLogger(__name__)
+
+SUMMARY_SUFFIX = '.summary.json'
+
+# magic: (byte order, fraction of second per unit of timestamp)
+_MAGICS = {
+    b'\xd4\xc3\xb2\xa1': ('<', 1e-6),
+    b'\xa1\xb2\xc3\xd4': ('>', 1e-6),
+    b'\x4d\x3c\xb2\xa1': ('<', 1e-9),
+    b'\xa1\xb2\x3c\x4d': ('>', 1e-9),
+}
+_GLOBAL_HEADER_SIZE = 24
+_RECORD_HEADER_SIZE = 16
+# bytes of each packet to parse, enough for link, IP, UDP headers and DNS question
+_SNAP_SIZE = 512
+# max length of packet, when snaplen of global header is not sane
+_MAX_PACKET_SIZE = 256 * 1024
+
+LINKTYPE_ETHERNET = 1
+LINKTYPE_RAW = (101, 228, 229)
+LINKTYPE_LINUX_SLL = 113
+
+PROTOCOLS = {6: 'tcp', 17: 'udp', 1: 'icmp', 58: 'icmpv6'}
+
+# (protocol, src, sport, dst, dport)
+FLOW_KEY = t.Tuple[str, str, int, str, int]
+
+
+class PcapError(Exception):
+    pass
+
+
+def _dns_names(payload: bytes) -> t.List[str]:
+    ''' names of question section of DNS message.
+    '''
+    if len(payload) < 12:
+        return []
+    qdcount = struct.unpack_from('!H', payload, 4)[0]
+    names = []
+    pos = 12
+    for _ in range(qdcount):
+        labels = []
+        while pos < len(payload):
+            length = payload[pos]
+            pos += 1
+            if length == 0 or length & 0xc0:
+                # compression pointer is not expected in question
+                break
+            labels.append(payload[pos:pos + length].decode('ascii', 'replace'))
+            pos += length
+        else:
+            return names
+        if labels:
+            names.append('.'.join(labels).lower())
+        pos += 4
+    return names
+
+
+class FlowSummarizer:
+    ''' Incremental flow table of classic pcap (not pcapng).
+    feed chunks in order by `feed`, and get result by `summary`.
+    unsupported or broken input doesn't raise, but stops parsing and is reported as `error`.
+    '''
+    def __init__(self):
+        self.flows: t.Dict[FLOW_KEY, t.List[float]] = {}
+        self.dns: t.Set[str] = set()
+        self.packets = 0
+        self.bytes = 0
+        self.start: t.Optional[float] = None
+        self.end: t.Optional[float] = None
+        self.error: t.Optional[str] = None
+        self._buf = bytearray()
+        self._record: t.Optional[struct.Struct] = None
+        self._ts_unit = 1e-6
+        self._linktype = LINKTYPE_ETHERNET
+        self._max_len = _MAX_PACKET_SIZE
+
+    def feed(self, chunk: bytes):
+        if self.error is not None:
+            return
+        self._buf += chunk
+        try:
+            with memoryview(self._buf) as view:
+                consumed = self._parse(view)
+        except (PcapError, struct.error, IndexError) as e:
+            self.error = str(e)
+            self._buf = bytearray()
+            logger.debug(f'Stop summarizing pcap. err={e}')
+            return
+        del self._buf[:consumed]
+
+    def _parse(self, buf: memoryview) -> int:
+        pos = 0
+        if self._record is None:
+            if len(buf) < _GLOBAL_HEADER_SIZE:
+                return 0
+            magic = bytes(buf[:4])
+            if magic not in _MAGICS:
+                raise PcapError(f'Not a classic pcap. magic={magic.hex()}')
+            order, self._ts_unit = _MAGICS[magic]
+            snaplen, linktype = struct.unpack_from(f'{order}II', buf, 16)
+            self._linktype = linktype & 0x0fffffff
+            # broken length would make whole rest of input buffered
+            self._max_len = snaplen if 0 < snaplen <= _MAX_PACKET_SIZE else _MAX_PACKET_SIZE
+            self._record = struct.Struct(f'{order}IIII')
+            pos = _GLOBAL_HEADER_SIZE
+
+        record = self._record
+        while len(buf) - pos >= _RECORD_HEADER_SIZE:
+            ts_sec, ts_frac, incl_len, orig_len = record.unpack_from(buf, pos)
+            if incl_len > self._max_len:
+                raise PcapError(f'Broken record. incl_len={incl_len}, max={self._max_len}')
+            end = pos + _RECORD_HEADER_SIZE + incl_len
+            if end > len(buf):
+                break
+            start = pos + _RECORD_HEADER_SIZE
+            self._packet(ts_sec + ts_frac * self._ts_unit, orig_len, bytes(buf[start:min(end, start + _SNAP_SIZE)]))
+            pos = end
+        return pos
+
+    def _packet(self, ts: float, size: int, data: bytes):
+        self.packets += 1
+        self.bytes += size
+        if self.start is None:
+            self.start = ts
+        self.end = ts
+
+        # packet too short for its link layer header is counted, but not in any flow
+        if self._linktype == LINKTYPE_ETHERNET:
+            if len(data) < 14:
+                return
+            ethertype, offset = struct.unpack_from('!H', data, 12)[0], 14
+            while ethertype in (0x8100, 0x88a8) and len(data) >= offset + 4:
+                ethertype, offset = struct.unpack_from('!H', data, offset + 2)[0], offset + 4
+        elif self._linktype == LINKTYPE_LINUX_SLL:
+            if len(data) < 16:
+                return
+            ethertype, offset = struct.unpack_from('!H', data, 14)[0], 16
+        elif self._linktype in LINKTYPE_RAW:
+            if not data:
+                return
+            ethertype, offset = (0x86dd if data[0] >> 4 == 6 else 0x0800), 0
+        else:
+            return
+
+        if ethertype == 0x0800 and len(data) >= offset + 20:
+            ihl = (data[offset] & 0x0f) * 4
+            proto = data[offset + 9]
+            fragment = struct.unpack_from('!H', data, offset + 6)[0] & 0x1fff
+            src = str(ipaddress.IPv4Address(data[offset + 12:offset + 16]))
+            dst = str(ipaddress.IPv4Address(data[offset + 16:offset + 20]))
+            payload = offset + ihl if not fragment else None
+        elif ethertype == 0x86dd and len(data) >= offset + 40:
+            proto = data[offset + 6]
+            src = str(ipaddress.IPv6Address(data[offset + 8:offset + 24]))
+            dst = str(ipaddress.IPv6Address(data[offset + 24:offset + 40]))
+            payload = offset + 40
+        else:
+            return
+
+        sport = dport = 0
+        if proto in (6, 17) and payload is not None and len(data) >= payload + 4:
+            sport, dport = struct.unpack_from('!HH', data, payload)
+            if proto == 17 and 53 in (sport, dport):
+                self.dns.update(_dns_names(data[payload + 8:]))
+        self._count((PROTOCOLS.get(proto, str(proto)), src, sport, dst, dport), ts, size)
+
+    def _count(self, key: FLOW_KEY, ts: float, size: int):
+        flow = self.flows.get(key)
+        if flow is None:
+            # flows are bidirectional, direction of the first packet wins
+            proto, src, sport, dst, dport = key
+            flow = self.flows.get((proto, dst, dport, src, sport))
+        if flow is None:
+            self.flows[key] = [1, size, ts, ts]
+        else:
+            flow[0] += 1
+            flow[1] += size
+            flow[3] = ts
+
+    def summary(self) -> dict:
+        ''' flows are sorted by bytes, largest first.
+        '''
+        flows = sorted(self.flows.items(), key=lambda item: item[1][1], reverse=True)
+        return {
+            'packets': self.packets,
+            'bytes': self.bytes,
+            'start': self.start,
+            'end': self.end,
+            'dns': sorted(self.dns),
+            'flows': [
+                {
+                    'proto': proto, 'src': src, 'sport': sport, 'dst': dst, 'dport': dport,
+                    'packets': packets, 'bytes': size, 'first': first, 'last': last
+                }
+                for (proto, src, sport, dst, dport), (packets, size, first, last) in flows
+            ],
+            'error': self.error or (f'Truncated pcap. remaining={len(self._buf)}' if self._buf else None)
+        }
+
+
+def summary_path(pcap_path: t.Union[str, Path]) -> Path:
+    pcap_path = Path(pcap_path)
+    return pcap_path.with_name(pcap_path.name + SUMMARY_SUFFIX)
+
+
+def save_summary(summary: dict, path: t.Union[str, Path]) -> Path:
+    path = Path(path)
+    path.write_text(json.dumps(summary, separators=(',', ':')))
+    return path
+
+
+def load_summary(path: t.Union[str, Path]) -> dict:
+    return json.loads(Path(path).read_text())
+
+
+def summarize(path: t.Union[str, Path], chunk_size: int = 1024 * 1024) -> dict:
+    ''' summary of pcap file already saved.
+    '''
+    summarizer = FlowSummarizer()
+    with Path(path).open('rb') as fd:
+        for chunk in iter(lambda: fd.read(chunk_size), b''):
+            summarizer.feed(chunk)
+    return summarizer.summary()
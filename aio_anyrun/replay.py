@@ -0,0 +1,314 @@
+''' Record and replay websocket sessions of `AnyRunClient`.
+
+Usage:
+    1. record a session against the real service
+    ... from aio_anyrun.client import AnyRunClient
+    ... from aio_anyrun.replay import SessionRecorder
+    ... recorder = SessionRecorder('session.jsonl.gz')
+    ... async with AnyRunClient.connect(transport=recorder) as client:
+    ...     tasks = await client.get_public_tasks()
+
+    2. replay it offline, optionally with recorded timings
+    ... from aio_anyrun.replay import ReplayTransport
+    ... async with AnyRunClient.connect(transport=ReplayTransport('session.jsonl.gz')) as client:
+    ...     tasks = await client.get_public_tasks()
+
+Recording file is JSON lines (gzipped if path ends with '.gz').
+first line is a header, and each following line is `[elapsed_ms, direction, frame]`
+where direction is 's' for sent frame and 'r' for received frame.
+'''
+import aiohttp
+import asyncio
+import gzip
+import json
+import time
+import typing as t
+from pathlib import Path
+
+from aio_anyrun import const as cst
+
+
+FORMAT_NAME = 'aio-anyrun-session'
+FORMAT_VERSION = 1
+
+SEND = 's'
+RECV = 'r'
+
+# single recorded frame, `[elapsed_ms, direction, frame]`
+Frame = t.Tuple[float, str, str]
+
+
+class ReplayError(Exception):
+    pass
+
+
+def _open(path: Path, mode: str) -> t.IO[str]:
+    if path.suffix == '.gz':
+        return gzip.open(str(path), mode + 't', encoding='utf-8')
+    return path.open(mode, encoding='utf-8')
+
+
+def save_frames(path: t.Union[str, Path], frames: t.Iterable[Frame], url: str = '') -> Path:
+    ''' Save recorded frames to `path`.
+    '''
+    path = Path(path)
+    with _open(path, 'w') as fd:
+        fd.write(json.dumps({'format': FORMAT_NAME, 'version': FORMAT_VERSION, 'url': url}))
+        fd.write('\n')
+        for frame in frames:
+            fd.write(json.dumps(frame, separators=(',', ':')))
+            fd.write('\n')
+    return path
+
+
+def load_frames(path: t.Union[str, Path]) -> t.List[Frame]:
+    ''' Load recorded frames from `path`.
+    '''
+    with _open(Path(path), 'r') as fd:
+        header = json.loads(fd.readline())
+        if header.get('format') != FORMAT_NAME:
+            raise ReplayError(f'Not a session recording. path={path}')
+        if header.get('version') != FORMAT_VERSION:
+            raise ReplayError(f'Unsupported recording version. version={header.get("version")}')
+        return [tuple(json.loads(line)) for line in fd if line.strip()]
+
+
+def _decode_frame(frame: str) -> t.List[dict]:
+    ''' decode DDP messages from SockJS frame. sent frame is like '["{...}"]' and
+    received frame is like 'a["{...}"]'. non-message frames ('o', 'h') return empty list.
+    '''
+    if frame.startswith('a'):
+        frame = frame[1:]
+    elif not frame.startswith('['):
+        return []
+    try:
+        return [json.loads(msg) for msg in json.loads(frame)]
+    except ValueError:
+        return []
+
+
+def _encode_frame(messages: t.List[dict]) -> str:
+    return 'a' + json.dumps([json.dumps(msg) for msg in messages])
+
+
+class RecordingWebSocket:
+    ''' Websocket wrapper to record every sent and received frame.
+    '''
+    def __init__(self, ws: aiohttp.ClientWebSocketResponse, recorder: 'SessionRecorder'):
+        self._ws = ws
+        self._recorder = recorder
+
+    @property
+    def closed(self) -> bool:
+        return self._ws.closed
+
+    async def send_str(self, data: str, compress: t.Optional[int] = None):
+        self._recorder._record(SEND, data)
+        await self._ws.send_str(data, compress)
+
+    async def send_json(
+        self,
+        data: t.Any,
+        compress: t.Optional[int] = None,
+        *,
+        dumps: t.Callable[[t.Any], str] = json.dumps
+    ):
+        await self.send_str(dumps(data), compress)
+
+    async def receive(self, timeout: t.Optional[float] = None) -> aiohttp.WSMessage:
+        msg = await self._ws.receive(timeout)
+        if msg.type == aiohttp.WSMsgType.TEXT:
+            self._recorder._record(RECV, msg.data)
+        return msg
+
+    async def close(self, **kwargs) -> bool:
+        try:
+            return await self._ws.close(**kwargs)
+        finally:
+            self._recorder.save()
+
+
+class SessionRecorder:
+    ''' Transport to record websocket session into file.
+    pass instance as `transport` of `AnyRunClient`, recording is saved when connection is closed.
+
+    Args:
+        path: file path to save recording. gzipped if it ends with '.gz'.
+        transport: underlying transport, default is `session.ws_connect`.
+    '''
+    def __init__(
+        self,
+        path: t.Union[str, Path],
+        transport: t.Optional[cst.TRANSPORT_FUNC] = None
+    ):
+        self.path = Path(path)
+        self.frames: t.List[Frame] = []
+        self.url = ''
+        self._transport = transport
+        self._started = 0.0
+
+    async def __call__(self, session: aiohttp.ClientSession, url: str, **kwargs) -> RecordingWebSocket:
+        self.frames = []
+        self.url = url
+        self._started = time.perf_counter()
+        if self._transport is None:
+            ws = await session.ws_connect(url, **kwargs)
+        else:
+            ws = await self._transport(session, url, **kwargs)
+        return RecordingWebSocket(ws, self)
+
+    def _record(self, direction: str, data: str):
+        elapsed = round((time.perf_counter() - self._started) * 1000, 3)
+        self.frames.append((elapsed, direction, data))
+
+    def save(self) -> Path:
+        return save_frames(self.path, self.frames, self.url)
+
+
+class _ReplayFrame:
+    __slots__ = ('time', 'data', 'messages', 'after_sends')
+
+    def __init__(self, time: float, data: str, after_sends: int):
+        self.time = time
+        self.data = data
+        self.after_sends = after_sends
+        # parsed messages, only set if frame refers ids of sent messages
+        self.messages: t.Optional[t.List[dict]] = None
+
+
+class ReplayWebSocket:
+    ''' Websocket stand-in to serve recorded frames.
+
+    received frames are served in recorded order, and each of them is held back until
+    the client has sent as many frames as it had when the frame was recorded.
+    ids of sent messages (method id, sub id) are random in `AnyRunClient`, so ids in
+    received frames are rewritten to the ones the client actually sent.
+    'unsub' and 'pong' are sent in background by the client, so they are not replayed.
+    when recorded frames run out, receiving waits until the connection is closed.
+    '''
+    UNORDERED_MESSAGES = ('unsub', 'pong')
+
+    def __init__(self, frames: t.List[Frame], speed: t.Optional[float] = None):
+        self._speed = speed
+        self._sent: t.List[t.Tuple[float, t.Optional[str]]] = []
+        self._frames: t.List[_ReplayFrame] = []
+        self._ids: t.Dict[str, str] = {}
+        self._n_sent = 0
+        self._pos = 0
+        self._last_time = 0.0
+        self._send_event = asyncio.Event()
+        self._close_event = asyncio.Event()
+        self._closed = False
+
+        sent_ids = set()
+        for elapsed, direction, data in frames:
+            if direction == SEND:
+                messages = _decode_frame('a' + data)
+                if self._is_unordered(messages):
+                    continue
+                msg_id = messages[0].get('id') if messages else None
+                self._sent.append((elapsed, msg_id))
+                if msg_id is not None:
+                    sent_ids.add(msg_id)
+            else:
+                frame = _ReplayFrame(elapsed, data, len(self._sent))
+                messages = _decode_frame(data)
+                if any(self._refers(msg, sent_ids) for msg in messages):
+                    frame.messages = messages
+                self._frames.append(frame)
+
+    @classmethod
+    def _is_unordered(cls, messages: t.List[dict]) -> bool:
+        return bool(messages) and messages[0].get('msg') in cls.UNORDERED_MESSAGES
+
+    @staticmethod
+    def _refers(msg: dict, ids: t.Set[str]) -> bool:
+        return msg.get('id') in ids or any(sub in ids for sub in msg.get('subs') or [])
+
+    @property
+    def closed(self) -> bool:
+        return self._closed
+
+    async def send_str(self, data: str, compress: t.Optional[int] = None):
+        if self._closed:
+            raise ReplayError('Replay connection is closed.')
+        if self._is_unordered(_decode_frame('a' + data)):
+            return
+        if self._n_sent >= len(self._sent):
+            raise ReplayError(f'Unexpected frame, recording has only {len(self._sent)} sent frames. frame={data}')
+
+        _, recorded_id = self._sent[self._n_sent]
+        if recorded_id is not None:
+            messages = _decode_frame('a' + data)
+            if messages and messages[0].get('id') is not None:
+                self._ids[recorded_id] = messages[0]['id']
+        self._n_sent += 1
+        self._send_event.set()
+
+    async def send_json(
+        self,
+        data: t.Any,
+        compress: t.Optional[int] = None,
+        *,
+        dumps: t.Callable[[t.Any], str] = json.dumps
+    ):
+        await self.send_str(dumps(data), compress)
+
+    def _rewrite(self, frame: _ReplayFrame) -> str:
+        if frame.messages is None:
+            return frame.data
+        messages = []
+        for msg in frame.messages:
+            msg = dict(msg)
+            if 'id' in msg:
+                msg['id'] = self._ids.get(msg['id'], msg['id'])
+            if 'subs' in msg:
+                msg['subs'] = [self._ids.get(sub, sub) for sub in msg['subs']]
+            messages.append(msg)
+        return _encode_frame(messages)
+
+    async def receive(self, timeout: t.Optional[float] = None) -> aiohttp.WSMessage:
+        if self._pos >= len(self._frames) and not self._closed:
+            await asyncio.wait_for(self._close_event.wait(), timeout)
+        if self._closed:
+            return aiohttp.WSMessage(aiohttp.WSMsgType.CLOSED, None, None)
+
+        frame = self._frames[self._pos]
+        while self._n_sent < frame.after_sends:
+            self._send_event.clear()
+            await asyncio.wait_for(self._send_event.wait(), timeout)
+            if self._closed:
+                return aiohttp.WSMessage(aiohttp.WSMsgType.CLOSED, None, None)
+
+        if frame.after_sends:
+            self._last_time = max(self._last_time, self._sent[frame.after_sends - 1][0])
+        if self._speed:
+            delay = (frame.time - self._last_time) / 1000 / self._speed
+            if delay > 0:
+                await asyncio.sleep(delay)
+        self._last_time = max(self._last_time, frame.time)
+
+        self._pos += 1
+        return aiohttp.WSMessage(aiohttp.WSMsgType.TEXT, self._rewrite(frame), None)
+
+    async def close(self, **kwargs) -> bool:
+        self._closed = True
+        self._send_event.set()
+        self._close_event.set()
+        return True
+
+
+class ReplayTransport:
+    ''' Transport to replay recorded session. pass instance as `transport` of `AnyRunClient`.
+
+    Args:
+        path: file path of recording made by `SessionRecorder`.
+        speed: multiplier of recorded timings, i.e. `2.0` replays twice as fast.
+            if None (default), frames are served without any delay.
+    '''
+    def __init__(self, path: t.Union[str, Path], speed: t.Optional[float] = None):
+        self.frames = load_frames(path)
+        self.speed = speed
+
+    async def __call__(self, session: aiohttp.ClientSession, url: str, **kwargs) -> ReplayWebSocket:
+        return ReplayWebSocket(self.frames, self.speed)
@@ -0,0 +1,111 @@
+''' Priority scheduling of requests sharing one client.
+
+Usage:
+    ... from aio_anyrun.scheduler import RequestScheduler
+    ... scheduler = RequestScheduler(capacity=8, quotas={'interactive': None, 'bulk': 2})
+    ... async with AnyRunClient.connect(scheduler=scheduler) as client:
+    ...     with client.priority('bulk'):
+    ...         pages = asyncio.gather(*(client.get_public_tasks(skip=i * 50) for i in range(20)))
+    ...     task = await client.get_single_task(task_uuid)     # runs ahead of queued pages
+
+Each request takes a slot of its priority class until its response is received.
+waiting requests of higher class are always started first, and each class can't take
+more slots than its quota, so bulk traffic only fills capacity left by interactive one.
+'''
+import asyncio
+import collections
+import typing as t
+
+
+# priority classes, highest first
+PRIORITIES = ('interactive', 'bulk')
+
+# max number of in-flight requests of each class, None means only `capacity` limits
+DEFAULT_QUOTAS: t.Dict[str, t.Optional[int]] = {'interactive': None, 'bulk': 4}
+
+# class of requests by request name (method or subscription), others are 'interactive'
+DEFAULT_REQUEST_PRIORITY: t.Dict[str, str] = {
+    'publicTasks': 'bulk',
+    'download': 'bulk',
+}
+
+
+class RequestScheduler:
+    ''' Concurrency limiter with priority classes and per-class quotas.
+
+    Args:
+        capacity: max number of in-flight requests in total.
+        quotas: max number of in-flight requests of each class. None means no limit but `capacity`.
+        priorities: names of classes, highest first.
+        request_priority: default class of requests by name, used when caller doesn't set one.
+    '''
+    def __init__(
+        self,
+        capacity: int = 16,
+        quotas: t.Optional[t.Dict[str, t.Optional[int]]] = None,
+        priorities: t.Sequence[str] = PRIORITIES,
+        request_priority: t.Optional[t.Dict[str, str]] = None
+    ):
+        if capacity < 1:
+            raise ValueError(f'capacity must be positive. capacity={capacity}')
+        self.capacity = capacity
+        self.priorities = list(priorities)
+        self.quotas = dict(DEFAULT_QUOTAS if quotas is None else quotas)
+        self.request_priority = dict(DEFAULT_REQUEST_PRIORITY if request_priority is None else request_priority)
+        self.active: t.Dict[str, int] = {priority: 0 for priority in self.priorities}
+        self._waiters: t.Dict[str, t.Deque[asyncio.Future]] = {
+            priority: collections.deque() for priority in self.priorities}
+
+    @property
+    def in_flight(self) -> int:
+        return sum(self.active.values())
+
+    def waiting(self, priority: t.Optional[str] = None) -> int:
+        if priority is not None:
+            return len(self._waiters[priority])
+        return sum(len(waiters) for waiters in self._waiters.values())
+
+    def priority_of(self, name: str) -> str:
+        return self.request_priority.get(name, self.priorities[0])
+
+    def _check(self, priority: str):
+        if priority not in self.active:
+            raise ValueError(f'Unknown priority. priority={priority}, choices={self.priorities}')
+
+    def _has_room(self, priority: str) -> bool:
+        quota = self.quotas.get(priority)
+        return self.in_flight < self.capacity and (quota is None or self.active[priority] < quota)
+
+    async def acquire(self, priority: str):
+        self._check(priority)
+        # waiting requests of higher class have no room either, they are woken as soon as they have
+        if self._has_room(priority) and not self._waiters[priority]:
+            self.active[priority] += 1
+            return
+
+        waiter = asyncio.get_event_loop().create_future()
+        self._waiters[priority].append(waiter)
+        try:
+            await waiter
+        except asyncio.CancelledError:
+            if waiter.done() and not waiter.cancelled():
+                # slot is given right before cancellation
+                self.release(priority)
+            elif waiter in self._waiters[priority]:
+                self._waiters[priority].remove(waiter)
+            raise
+
+    def release(self, priority: str):
+        self.active[priority] -= 1
+        self._wake()
+
+    def _wake(self):
+        for priority in self.priorities:
+            waiters = self._waiters[priority]
+            while waiters and self._has_room(priority):
+                waiter = waiters.popleft()
+                if not waiter.done():
+                    self.active[priority] += 1
+                    waiter.set_result(None)
+            if self.in_flight >= self.capacity:
+                return
@@ -0,0 +1,275 @@
+''' Compact probabilistic data structures.
+'''
+import hashlib
+import json
+import math
+import struct
+import sys
+import typing as t
+from array import array
+
+
+def _hash_pair(item: str) -> t.Tuple[int, int]:
+    digest = hashlib.blake2b(item.encode('utf-8'), digest_size=16).digest()
+    return struct.unpack('<QQ', digest)
+
+
+class BloomFilter:
+    ''' Bloom filter of strings. membership test may return false positive
+    with probability about `error_rate`, but never false negative.
+
+    Args:
+        capacity: expected number of items.
+        error_rate: acceptable false positive rate on `capacity` items.
+    '''
+    _HEADER = struct.Struct('<4sIQQ')
+    _MAGIC = b'BLM1'
+
+    def __init__(self, capacity: int = 100000, error_rate: float = 0.001):
+        n_bits = int(math.ceil(-capacity * math.log(error_rate) / math.log(2) ** 2))
+        self.n_bits = max(8, n_bits)
+        self.n_hashes = max(1, int(round(self.n_bits / capacity * math.log(2))))
+        self.count = 0
+        self._bits = bytearray((self.n_bits + 7) // 8)
+
+    def _positions(self, item: str) -> t.Iterator[int]:
+        h1, h2 = _hash_pair(item)
+        for i in range(self.n_hashes):
+            yield (h1 + i * h2) % self.n_bits
+
+    def add(self, item: str):
+        for pos in self._positions(item):
+            self._bits[pos >> 3] |= 1 << (pos & 7)
+        self.count += 1
+
+    def __contains__(self, item: str) -> bool:
+        return all(self._bits[pos >> 3] & (1 << (pos & 7)) for pos in self._positions(item))
+
+    def __len__(self) -> int:
+        return self.count
+
+    def to_bytes(self) -> bytes:
+        return self._HEADER.pack(self._MAGIC, self.n_hashes, self.n_bits, self.count) + bytes(self._bits)
+
+    @classmethod
+    def from_bytes(cls, data: bytes) -> 'BloomFilter':
+        magic, n_hashes, n_bits, count = cls._HEADER.unpack_from(data)
+        if magic != cls._MAGIC:
+            raise ValueError('Not a serialized BloomFilter.')
+        bloom = cls.__new__(cls)
+        bloom.n_bits = n_bits
+        bloom.n_hashes = n_hashes
+        bloom.count = count
+        bloom._bits = bytearray(data[cls._HEADER.size:])
+        if len(bloom._bits) != (n_bits + 7) // 8:
+            raise ValueError('Truncated BloomFilter.')
+        return bloom
+
+
+class CountMinSketch:
+    ''' Count-min sketch of strings. `estimate` never underestimates, and overestimates by
+    at most `e / width * total` with probability `1 - exp(-depth)`.
+    sketches of same `width` and `depth` can be merged.
+
+    Args:
+        width: counters per row.
+        depth: number of rows (hash functions).
+    '''
+    _HEADER = struct.Struct('<4sIIQ')
+    _MAGIC = b'CMS1'
+
+    def __init__(self, width: int = 2048, depth: int = 4):
+        self.width = width
+        self.depth = depth
+        self.total = 0
+        self._counters = array('Q', bytes(8 * width * depth))
+
+    def _positions(self, item: str) -> t.Iterator[int]:
+        h1, h2 = _hash_pair(item)
+        for i in range(self.depth):
+            yield i * self.width + (h1 + i * h2) % self.width
+
+    def add(self, item: str, count: int = 1):
+        for pos in self._positions(item):
+            self._counters[pos] += count
+        self.total += count
+
+    def estimate(self, item: str) -> int:
+        return min(self._counters[pos] for pos in self._positions(item))
+
+    def merge(self, other: 'CountMinSketch'):
+        if (self.width, self.depth) != (other.width, other.depth):
+            raise ValueError(
+                f'Shape of sketches differs. self={(self.width, self.depth)}, other={(other.width, other.depth)}')
+        counters = self._counters
+        for i, count in enumerate(other._counters):
+            if count:
+                counters[i] += count
+        self.total += other.total
+
+    def to_bytes(self) -> bytes:
+        counters = self._counters
+        if sys.byteorder != 'little':
+            counters = array('Q', counters)
+            counters.byteswap()
+        return self._HEADER.pack(self._MAGIC, self.width, self.depth, self.total) + counters.tobytes()
+
+    @classmethod
+    def from_bytes(cls, data: bytes) -> 'CountMinSketch':
+        magic, width, depth, total = cls._HEADER.unpack_from(data)
+        if magic != cls._MAGIC:
+            raise ValueError('Not a serialized CountMinSketch.')
+        body = data[cls._HEADER.size:]
+        if len(body) != 8 * width * depth:
+            raise ValueError('Truncated CountMinSketch.')
+        sketch = cls.__new__(cls)
+        sketch.width = width
+        sketch.depth = depth
+        sketch.total = total
+        sketch._counters = array('Q', body)
+        if sys.byteorder != 'little':
+            sketch._counters.byteswap()
+        return sketch
+
+
+class HyperLogLog:
+    ''' HyperLogLog counter of distinct strings, with standard error about `1.04 / sqrt(2 ** precision)`
+    in `2 ** precision` bytes. counters of same `precision` can be merged.
+
+    Args:
+        precision: number of index bits (4-18).
+    '''
+    _HEADER = struct.Struct('<4sI')
+    _MAGIC = b'HLL1'
+
+    def __init__(self, precision: int = 12):
+        if not 4 <= precision <= 18:
+            raise ValueError(f'precision must be in 4-18. precision={precision}')
+        self.precision = precision
+        self._registers = bytearray(1 << precision)
+
+    def add(self, item: str):
+        h1, _ = _hash_pair(item)
+        index = h1 >> (64 - self.precision)
+        rest = (h1 << self.precision) & 0xffffffffffffffff
+        # position of the first 1 bit in the rest of hash
+        rank = 65 - rest.bit_length() if rest else 65 - self.precision
+        if rank > self._registers[index]:
+            self._registers[index] = rank
+
+    def count(self) -> int:
+        m = len(self._registers)
+        alpha = {16: 0.673, 32: 0.697, 64: 0.709}.get(m, 0.7213 / (1 + 1.079 / m))
+        estimate = alpha * m * m / sum(2.0 ** -r for r in self._registers)
+        zeros = self._registers.count(0)
+        if estimate <= 2.5 * m and zeros:
+            # linear counting is more accurate on small cardinality
+            estimate = m * math.log(m / zeros)
+        return int(round(estimate))
+
+    def __len__(self) -> int:
+        return self.count()
+
+    def merge(self, other: 'HyperLogLog'):
+        if self.precision != other.precision:
+            raise ValueError(f'Precision differs. self={self.precision}, other={other.precision}')
+        self._registers = bytearray(map(max, self._registers, other._registers))
+
+    def to_bytes(self) -> bytes:
+        return self._HEADER.pack(self._MAGIC, self.precision) + bytes(self._registers)
+
+    @classmethod
+    def from_bytes(cls, data: bytes) -> 'HyperLogLog':
+        magic, precision = cls._HEADER.unpack_from(data)
+        if magic != cls._MAGIC:
+            raise ValueError('Not a serialized HyperLogLog.')
+        hll = cls(precision)
+        registers = data[cls._HEADER.size:]
+        if len(registers) != len(hll._registers):
+            raise ValueError('Truncated HyperLogLog.')
+        hll._registers = bytearray(registers)
+        return hll
+
+
+class TopK:
+    ''' Heavy hitters of strings (space-saving algorithm), keeps at most `2 * capacity` counters.
+    count of each tracked item is exact or overestimated by at most its `error`, and error is
+    bounded by `total / capacity`. so `top(k)` is exact for items counted more than that,
+    which is the case of recurring items when `capacity` is several times of `k`.
+    counters can be merged.
+
+    Args:
+        capacity: number of counters kept after pruning.
+    '''
+    _HEADER = struct.Struct('<4sIQQ')
+    _MAGIC = b'TOP1'
+
+    def __init__(self, capacity: int = 1000):
+        self.capacity = capacity
+        self.total = 0
+        # max count of dropped counters, given to new items as error
+        self.floor = 0
+        self._counters: t.Dict[str, t.List[int]] = {}
+
+    def add(self, item: str, count: int = 1):
+        counter = self._counters.get(item)
+        if counter is None:
+            self._counters[item] = [self.floor + count, self.floor]
+            if len(self._counters) > 2 * self.capacity:
+                self._prune()
+        else:
+            counter[0] += count
+        self.total += count
+
+    def _prune(self):
+        # prune by batch, so that each add costs amortized O(log capacity)
+        ranked = sorted(self._counters.items(), key=lambda item: item[1][0], reverse=True)
+        if len(ranked) > self.capacity:
+            self.floor = max(self.floor, ranked[self.capacity][1][0])
+            self._counters = dict(ranked[:self.capacity])
+
+    def top(self, k: t.Optional[int] = None) -> t.List[t.Tuple[str, int, int]]:
+        ''' list of `(item, count, error)`, most frequent first.
+        '''
+        ranked = sorted(self._counters.items(), key=lambda item: (-item[1][0], item[0]))
+        return [(item, count, error) for item, (count, error) in ranked[:k]]
+
+    def __contains__(self, item: str) -> bool:
+        return item in self._counters
+
+    def __len__(self) -> int:
+        return len(self._counters)
+
+    def merge(self, other: 'TopK'):
+        ''' item missing on one side may have been counted up to that side's `floor`.
+        '''
+        for item, (count, error) in self._counters.items():
+            if item not in other._counters:
+                self._counters[item] = [count + other.floor, error + other.floor]
+        for item, (count, error) in other._counters.items():
+            counter = self._counters.get(item)
+            if counter is None:
+                self._counters[item] = [count + self.floor, error + self.floor]
+            else:
+                counter[0] += count
+                counter[1] += error
+        self.floor += other.floor
+        self.total += other.total
+        self.capacity = max(self.capacity, other.capacity)
+        if len(self._counters) > 2 * self.capacity:
+            self._prune()
+
+    def to_bytes(self) -> bytes:
+        body = json.dumps(self._counters, separators=(',', ':')).encode('utf-8')
+        return self._HEADER.pack(self._MAGIC, self.capacity, self.total, self.floor) + body
+
+    @classmethod
+    def from_bytes(cls, data: bytes) -> 'TopK':
+        magic, capacity, total, floor = cls._HEADER.unpack_from(data)
+        if magic != cls._MAGIC:
+            raise ValueError('Not a serialized TopK.')
+        top = cls(capacity)
+        top.total = total
+        top.floor = floor
+        top._counters = json.loads(data[cls._HEADER.size:].decode('utf-8'))
+        return top
@@ -0,0 +1,169 @@
+''' Synchronous client for code which can't run event loop by itself, i.e. Celery or Flask workers.
+
+Usage:
+    ... from aio_anyrun.sync import SyncAnyRunClient
+    ... with SyncAnyRunClient() as client:
+    ...     tasks = client.search(tag='emotet')
+    ...     ioc = client.get_ioc(tasks[0].task_uuid)
+
+`SyncAnyRunClient` runs one `AnyRunClient` on event loop of background thread. it can be
+shared by threads, and calls from them are sent over the same websocket connection.
+'''
+import asyncio
+import logging
+import threading
+import typing as t
+from pathlib import Path
+
+from aio_anyrun import collection
+from aio_anyrun.client import AnyRunClient
+
+
+logger = logging.getLogger(__name__)
+
+
+class SyncAnyRunClient:
+    ''' Thread-safe blocking facade of `AnyRunClient`.
+    connection is opened at the first call, and reopened (and logged in again) if it's lost.
+
+    Args:
+        email: email to login on connection, optional.
+        password: password to login on connection, optional.
+        connect_kwargs: keyword arguments for `AnyRunClient.connect`.
+    '''
+    def __init__(self, email: t.Optional[str] = None, password: t.Optional[str] = None, **connect_kwargs):
+        self.email = email
+        self.password = password
+        self.connect_kwargs = connect_kwargs
+        self._loop = asyncio.new_event_loop()
+        self._thread = threading.Thread(target=self._run_loop, name='SyncAnyRunClient', daemon=True)
+        self._thread.start()
+        self._context: t.Optional[t.AsyncContextManager[AnyRunClient]] = None
+        self._client: t.Optional[AnyRunClient] = None
+        # guard of connection, only used on event loop thread
+        self._lock: t.Optional[asyncio.Lock] = None
+        self._closed = False
+
+    def _run_loop(self):
+        asyncio.set_event_loop(self._loop)
+        self._loop.run_forever()
+        self._loop.close()
+
+    def _run(self, func: t.Callable[..., t.Awaitable], *args, **kwargs) -> t.Any:
+        if self._closed:
+            raise RuntimeError('Client is closed.')
+        if threading.current_thread() is self._thread:
+            raise RuntimeError('Blocking call from event loop of client.')
+        return asyncio.run_coroutine_threadsafe(func(*args, **kwargs), self._loop).result()
+
+    def _is_alive(self) -> bool:
+        client = self._client
+        return (
+            client is not None
+            and client.client is not None
+            and not client.client.closed
+            and client._reader_error is None)
+
+    async def _disconnect(self):
+        context, self._context, self._client = self._context, None, None
+        if context is not None:
+            try:
+                await context.__aexit__(None, None, None)
+            except Exception as e:
+                logger.debug(f'Failed to close connection. err={e}')
+
+    async def _get_client(self) -> AnyRunClient:
+        if self._lock is None:
+            self._lock = asyncio.Lock()
+        async with self._lock:
+            if self._is_alive():
+                return self._client
+
+            await self._disconnect()
+            logger.debug('Open connection.')
+            context = AnyRunClient.connect(**self.connect_kwargs)
+            client = await context.__aenter__()
+            try:
+                if self.email is not None and self.password is not None:
+                    await client.login(self.email, self.password)
+            except BaseException:
+                await context.__aexit__(None, None, None)
+                raise
+            self._context, self._client = context, client
+            return client
+
+    async def _call(self, name: str, *args, **kwargs) -> t.Any:
+        client = await self._get_client()
+        return await getattr(client, name)(*args, **kwargs)
+
+    async def _collect(self, name: str, *args, **kwargs) -> list:
+        client = await self._get_client()
+        return [item async for item in getattr(client, name)(*args, **kwargs)]
+
+    def call(self, name: str, *args, **kwargs) -> t.Any:
+        ''' call coroutine method of `AnyRunClient` by name and wait for the result.
+        '''
+        return self._run(self._call, name, *args, **kwargs)
+
+    def get_public_tasks(self, **kwargs) -> t.List[collection.Task]:
+        return self.call('get_public_tasks', **kwargs)
+
+    def search(self, **kwargs) -> t.List[collection.Task]:
+        return self.call('search', **kwargs)
+
+    def get_single_task(self, task_uuid: str) -> collection.Task:
+        return self.call('get_single_task', task_uuid)
+
+    def get_ioc(self, task_uuid: str) -> collection.IoC:
+        return self.call('get_ioc', task_uuid)
+
+    def save_ioc(self, task_uuid: str, dest: t.Union[str, Path] = '.', compress: bool = False) -> Path:
+        return self.call('save_ioc', task_uuid, dest, compress)
+
+    def get_process_graph(self, task_uuid: str, **kwargs) -> t.Union[str, Path]:
+        return self.call('get_process_graph', task_uuid, **kwargs)
+
+    def get_incidents(self, task_uuid: str) -> t.List[dict]:
+        return self.call('get_incidents', task_uuid)
+
+    def incidents(self, task_uuid: str, **kwargs) -> t.List[collection.Incident]:
+        ''' same as `AnyRunClient.iter_incidents`, but returns all incidents as list.
+        '''
+        return self._run(self._collect, 'iter_incidents', task_uuid, **kwargs)
+
+    def get_mitre(self) -> t.Dict[str, collection.MITRE_Attack]:
+        return self.call('get_mitre')
+
+    def get_mitre_catalog(self, **kwargs):
+        return self.call('get_mitre_catalog', **kwargs)
+
+    def download_file(self, task: collection.Task, dest: str = '.') -> Path:
+        return self.call('download_file', task, dest)
+
+    def download_pcap(self, task: collection.Task, dest: str = '.', **kwargs) -> Path:
+        return self.call('download_pcap', task, dest, **kwargs)
+
+    def login(self, email: str, password: str) -> bool:
+        ''' login, and login again with same credential when connection is reopened.
+        '''
+        result = self.call('login', email, password)
+        self.email, self.password = email, password
+        return result
+
+    def logout(self):
+        self.email = self.password = None
+        return self.call('logout')
+
+    def close(self):
+        if self._closed:
+            return
+        asyncio.run_coroutine_threadsafe(self._disconnect(), self._loop).result()
+        self._closed = True
+        self._loop.call_soon_threadsafe(self._loop.stop)
+        self._thread.join()
+
+    def __enter__(self) -> 'SyncAnyRunClient':
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
@@ -0,0 +1,31 @@
+import asyncio
+import json
+from pathlib import Path
+
+import pytest
+
+from aio_anyrun import fakeserver
+
+TEST_DATA_DIR = Path(__file__).parent.parent / 'tests' / 'data'
+
+
+def load_test_json(name: str):
+    return json.loads((TEST_DATA_DIR / name).read_text())
+
+
+@pytest.fixture(scope='session')
+def fake_server():
+    ''' fake ANY.RUN server running on its own thread and event loop.
+    '''
+    server = fakeserver.FakeAnyRunServer(TEST_DATA_DIR, feed_size=10000, pcap_size=8 * 1024 * 1024)
+    with server.serve_in_thread():
+        yield server
+
+
+@pytest.fixture
+def run():
+    ''' run coroutine on fresh event loop, returns its result.
+    '''
+    def _run(coro):
+        return asyncio.run(coro)
+    return _run
@@ -0,0 +1,112 @@
+''' CPU cost of decoding SockJS frames and building collections.
+'''
+import json
+
+import pytest
+
+from aio_anyrun import client
+from aio_anyrun import collection
+from aio_anyrun.filters import F
+
+from .conftest import load_test_json
+
+
+def to_frame(*messages: dict) -> str:
+    return 'a' + json.dumps([json.dumps(msg) for msg in messages])
+
+
+@pytest.fixture(scope='module')
+def task_doc():
+    return load_test_json('file_task.json')
+
+
+@pytest.fixture(scope='module')
+def task_frame(task_doc):
+    return to_frame({'msg': 'added', 'collection': 'tasks', 'id': '1', 'fields': task_doc})
+
+
+@pytest.fixture(scope='module')
+def batched_frame(task_doc):
+    return to_frame(*[{'msg': 'added', 'collection': 'tasks', 'id': str(i), 'fields': task_doc} for i in range(50)])
+
+
+def test_decode_frame(benchmark, task_frame):
+    msg = benchmark(client.AnyRunClient._to_json, task_frame)
+    assert msg['msg'] == 'added'
+
+
+def test_decode_small_frame(benchmark):
+    frame = to_frame({'msg': 'ready', 'subs': ['abcdefghijklmnopq']})
+    msg = benchmark(client.AnyRunClient._to_json, frame)
+    assert msg['msg'] == 'ready'
+
+
+def test_decode_batched_frame(benchmark, batched_frame):
+    messages = benchmark(client.AnyRunClient._to_messages, batched_frame)
+    assert len(messages) == 50
+
+
+def test_task_construction(benchmark, task_doc):
+    task = benchmark(collection.Task, task_doc)
+    assert task.task_uuid == task_doc['uuid']
+
+
+def test_task_property_access(benchmark, task_doc):
+    task = collection.Task(task_doc)
+
+    def access():
+        return task.task_uuid, task.sha256, task.verdict, task.name, task.mime_type
+
+    assert benchmark(access)[2] == 'malicious'
+
+
+def test_lazy_task_construction(benchmark, task_doc):
+    text = json.dumps(task_doc)
+    task = benchmark(collection.LazyTask, text)
+    assert task.task_uuid == task_doc['uuid']
+
+
+def test_lazy_task_property_access(benchmark, task_doc):
+    def access():
+        # fresh task, so that sections are decoded on each round
+        task = collection.LazyTask(task_doc)
+        return task.task_uuid, task.sha256, task.verdict, task.name, task.mime_type
+
+    assert benchmark(access)[2] == 'malicious'
+
+
+def test_task_items(benchmark, task_doc):
+    task = collection.Task(task_doc)
+    assert benchmark(lambda: dict(task.items()))
+
+
+def test_filter_before_construction(benchmark, task_doc):
+    docs = [task_doc] * 50
+    where = (F('public.objects.mainObject.info.meta.mime') == 'application/pdf') | F('tags').contains('emotet')
+    tasks = benchmark(lambda: [collection.Task(doc) for doc in docs if where(doc)])
+    assert tasks == []
+
+
+def test_ioc_construction(benchmark):
+    ioc_doc = load_test_json('ioc.json')
+
+    def build():
+        ioc = collection.IoC(ioc_doc)
+        return ioc.main_objects + ioc.dropped_files + ioc.dns + ioc.connections
+
+    assert len(benchmark(build)) == 7
+
+
+def test_mitre_construction(benchmark):
+    mitre_docs = load_test_json('mitre.json')
+    mitre = benchmark(lambda: {doc['technique']: collection.MITRE_Attack(doc) for doc in mitre_docs})
+    assert 'T1060' in mitre
+
+
+def test_mitre_property_access(benchmark):
+    mitre = [collection.MITRE_Attack(doc) for doc in load_test_json('mitre.json')]
+
+    def access():
+        return [(m.created, m.mitre_url, m.platforms) for m in mitre]
+
+    assert benchmark(access)[0][1].startswith('https://attack.mitre.org/')
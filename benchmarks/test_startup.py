@@ -0,0 +1,50 @@
+''' Startup time of command line interface, which is called many times from scripts.
+wall time of each invocation and import time (`python -X importtime`) of modules loaded
+by it are stored in `extra_info`, and import time is checked against `IMPORT_BUDGET_MS`.
+'''
+import subprocess
+import sys
+import typing as t
+
+import pytest
+
+# max import time of all modules loaded by `--help` or argument error
+IMPORT_BUDGET_MS = 150
+
+CASES = {
+    'help': ['--help'],
+    'command_help': ['search', '--help'],
+    'argument_error': ['search', '-r', 'bogus'],
+}
+
+
+def run_cli(args: t.List[str], importtime: bool = False) -> subprocess.CompletedProcess:
+    options = ['-X', 'importtime'] if importtime else []
+    return subprocess.run(
+        [sys.executable, *options, '-m', 'aio_anyrun', *args], stdout=subprocess.PIPE, stderr=subprocess.PIPE)
+
+
+def import_time_ms(stderr: bytes) -> t.Dict[str, float]:
+    ''' self import time of each module, from output of `-X importtime`.
+    '''
+    times = {}
+    for line in stderr.decode().splitlines():
+        if not line.startswith('import time:') or 'self [us]' in line:
+            continue
+        self_us, _, name = line[len('import time:'):].split('|')
+        times[name.strip()] = int(self_us) / 1000
+    return times
+
+
+@pytest.mark.parametrize('case', list(CASES))
+def test_cli_startup(benchmark, case: str):
+    args = CASES[case]
+    proc = benchmark.pedantic(run_cli, args=(args,), rounds=10, iterations=1)
+    assert proc.returncode == (2 if case == 'argument_error' else 0)
+
+    times = import_time_ms(run_cli(args, importtime=True).stderr)
+    total = sum(times.values())
+    benchmark.extra_info['import_ms'] = round(total, 1)
+    benchmark.extra_info['slowest_imports'] = sorted(times, key=times.get, reverse=True)[:5]
+    assert 'aiohttp' not in times
+    assert total < IMPORT_BUDGET_MS, f'import time {total:.1f}ms exceeds budget {IMPORT_BUDGET_MS}ms'
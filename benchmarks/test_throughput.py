@@ -0,0 +1,170 @@
+''' End-to-end throughput against local fake server.
+requests/second and latency percentiles are stored in `extra_info` of each benchmark,
+so they are saved with `--benchmark-autosave` and can be compared across commits.
+'''
+import asyncio
+import tempfile
+import time
+import typing as t
+
+import pytest
+
+from aio_anyrun import client
+from aio_anyrun.scheduler import RequestScheduler
+
+TASK_UUID = 'acdcbcf3-4b3a-42ca-aae5-736683b86800'
+
+# requests per connection for each round
+REQUESTS = 50
+SEARCH_REQUESTS = 10
+
+
+def percentile(values: t.List[float], p: float) -> float:
+    values = sorted(values)
+    return values[min(len(values) - 1, int(len(values) * p))]
+
+
+def record(benchmark, latencies: t.List[float], elapsed: float):
+    benchmark.extra_info['requests'] = len(latencies)
+    benchmark.extra_info['rps'] = round(len(latencies) / elapsed, 1)
+    benchmark.extra_info['p50_ms'] = round(percentile(latencies, 0.50) * 1000, 3)
+    benchmark.extra_info['p99_ms'] = round(percentile(latencies, 0.99) * 1000, 3)
+
+
+async def run_workers(
+    server,
+    concurrency: int,
+    request: t.Callable[[client.AnyRunClient], t.Awaitable[t.Any]],
+    requests: int = REQUESTS
+) -> t.Tuple[t.List[float], float]:
+    ''' run `requests` requests on each of `concurrency` connections.
+    '''
+    latencies: t.List[float] = []
+
+    async def worker(c: client.AnyRunClient):
+        for _ in range(requests):
+            started = time.perf_counter()
+            await request(c)
+            latencies.append(time.perf_counter() - started)
+
+    clients = []
+    for _ in range(concurrency):
+        c = client.AnyRunClient(base_url=server.base_url, content_url=server.content_url)
+        await c.init_connection_with_default_client()
+        clients.append(c)
+    try:
+        started = time.perf_counter()
+        await asyncio.gather(*(worker(c) for c in clients))
+        elapsed = time.perf_counter() - started
+    finally:
+        for c in clients:
+            await c.close()
+    return latencies, elapsed
+
+
+@pytest.mark.parametrize('concurrency', [1, 4, 16])
+def test_single_task_throughput(benchmark, fake_server, run, concurrency):
+    async def request(c: client.AnyRunClient):
+        return await c.get_single_task(TASK_UUID)
+
+    latencies, elapsed = benchmark.pedantic(
+        lambda: run(run_workers(fake_server, concurrency, request)), rounds=3)
+    record(benchmark, latencies, elapsed)
+
+
+@pytest.mark.parametrize('concurrency', [1, 4, 16])
+def test_search_throughput(benchmark, fake_server, run, concurrency):
+    async def request(c: client.AnyRunClient):
+        return await c.search()
+
+    latencies, elapsed = benchmark.pedantic(
+        lambda: run(run_workers(fake_server, concurrency, request, SEARCH_REQUESTS)), rounds=3)
+    record(benchmark, latencies, elapsed)
+
+
+@pytest.mark.parametrize('parallel', [1, 4])
+def test_download_pcap(benchmark, fake_server, run, parallel):
+    async def download(dest: str):
+        async with client.AnyRunClient.connect(
+                base_url=fake_server.base_url, content_url=fake_server.content_url) as c:
+            await c.login('bench@example.com', 'password')
+            task = await c.get_single_task(TASK_UUID)
+            started = time.perf_counter()
+            await asyncio.gather(*(c.download_pcap(task, dest) for _ in range(parallel)))
+            return time.perf_counter() - started
+
+    with tempfile.TemporaryDirectory() as dest:
+        elapsed = benchmark.pedantic(lambda: run(download(dest)), rounds=3)
+    benchmark.extra_info['mb_per_s'] = round(parallel * fake_server.pcap_size / elapsed / 1024 / 1024, 1)
+
+
+@pytest.mark.parametrize('concurrency', [4, 16])
+def test_shared_connection_throughput(benchmark, fake_server, run, concurrency):
+    ''' same as `test_single_task_throughput`, but all workers share one connection.
+    '''
+    async def shared():
+        latencies: t.List[float] = []
+
+        async def worker(c: client.AnyRunClient):
+            for _ in range(REQUESTS):
+                started = time.perf_counter()
+                await c.get_single_task(TASK_UUID)
+                latencies.append(time.perf_counter() - started)
+
+        async with client.AnyRunClient.connect(
+                base_url=fake_server.base_url, content_url=fake_server.content_url) as c:
+            started = time.perf_counter()
+            await asyncio.gather(*(worker(c) for _ in range(concurrency)))
+            return latencies, time.perf_counter() - started
+
+    latencies, elapsed = benchmark.pedantic(lambda: run(shared()), rounds=3)
+    record(benchmark, latencies, elapsed)
+
+
+@pytest.mark.parametrize('parallel', [0, 4])
+def test_latency_during_downloads(benchmark, fake_server, run, parallel):
+    ''' latency of websocket requests while `parallel` pcaps are downloaded on the same event loop.
+    it should stay flat as `parallel` grows, because downloads are written on writer threads.
+    '''
+    async def requests_while_downloading(dest: str):
+        async with client.AnyRunClient.connect(
+                base_url=fake_server.base_url, content_url=fake_server.content_url) as c:
+            await c.login('bench@example.com', 'password')
+            task = await c.get_single_task(TASK_UUID)
+            downloads = asyncio.gather(*(c.download_pcap(task, dest) for _ in range(parallel)))
+            latencies: t.List[float] = []
+            started = time.perf_counter()
+            for _ in range(SEARCH_REQUESTS):
+                request_started = time.perf_counter()
+                await c.get_single_task(TASK_UUID)
+                latencies.append(time.perf_counter() - request_started)
+            elapsed = time.perf_counter() - started
+            await downloads
+            return latencies, elapsed
+
+    with tempfile.TemporaryDirectory() as dest:
+        latencies, elapsed = benchmark.pedantic(lambda: run(requests_while_downloading(dest)), rounds=3)
+    record(benchmark, latencies, elapsed)
+
+
+@pytest.mark.parametrize('scheduled', [False, True])
+def test_interactive_latency_under_bulk_load(benchmark, fake_server, run, scheduled):
+    ''' latency of `get_single_task` while public task pages are crawled on the same client.
+    '''
+    async def interactive_under_load():
+        scheduler = RequestScheduler(capacity=8, quotas={'interactive': None, 'bulk': 2}) if scheduled else None
+        async with client.AnyRunClient.connect(
+                base_url=fake_server.base_url, content_url=fake_server.content_url, scheduler=scheduler) as c:
+            pages = asyncio.gather(*(c.get_public_tasks(skip=i * 50) for i in range(40)))
+            latencies: t.List[float] = []
+            started = time.perf_counter()
+            for _ in range(SEARCH_REQUESTS):
+                request_started = time.perf_counter()
+                await c.get_single_task(TASK_UUID)
+                latencies.append(time.perf_counter() - request_started)
+            elapsed = time.perf_counter() - started
+            await pages
+            return latencies, elapsed
+
+    latencies, elapsed = benchmark.pedantic(lambda: run(interactive_under_load()), rounds=3)
+    record(benchmark, latencies, elapsed)
@@ -0,0 +1,125 @@
+import json
+import random
+import tempfile
+from pathlib import Path
+from unittest import TestCase
+
+from aio_anyrun import collection
+from aio_anyrun import sketch
+from aio_anyrun.aggregate import IoCAggregator
+
+TEST_DATA_DIR = Path(__file__).parent / 'data'
+
+
+def make_ioc(domains=(), ips=(), reputation=2) -> collection.IoC:
+    return collection.IoC({
+        'Main object': [],
+        'DNS requests': [
+            {'category': 'DNS requests', 'type': 'domain', 'ioc': domain, 'reputation': reputation, 'name': ''}
+            for domain in domains],
+        'Connections': [
+            {'category': 'Connections', 'type': 'ip', 'ioc': ip, 'reputation': 0, 'name': ''}
+            for ip in ips],
+    })
+
+
+class TestSketches(TestCase):
+
+    def test_count_min(self):
+        cms = sketch.CountMinSketch(width=256, depth=4)
+        for i in range(1000):
+            cms.add(f'item{i % 50}')
+        cms.add('heavy', 500)
+        self.assertGreaterEqual(cms.estimate('heavy'), 500)
+        self.assertLess(cms.estimate('heavy'), 550)
+        self.assertGreaterEqual(cms.estimate('item1'), 20)
+
+        restored = sketch.CountMinSketch.from_bytes(cms.to_bytes())
+        restored.merge(cms)
+        self.assertEqual(restored.total, 3000)
+        self.assertEqual(restored.estimate('heavy'), 2 * cms.estimate('heavy'))
+        with self.assertRaises(ValueError):
+            restored.merge(sketch.CountMinSketch(width=128))
+
+    def test_hyperloglog(self):
+        small = sketch.HyperLogLog(precision=10)
+        for i in range(100):
+            small.add(str(i))
+            small.add(str(i))
+        self.assertAlmostEqual(small.count(), 100, delta=5)
+
+        a, b = sketch.HyperLogLog(), sketch.HyperLogLog()
+        for i in range(30000):
+            (a if i % 2 else b).add(f'value{i}')
+        a.merge(sketch.HyperLogLog.from_bytes(b.to_bytes()))
+        self.assertAlmostEqual(a.count(), 30000, delta=30000 * 0.05)
+        with self.assertRaises(ValueError):
+            a.merge(sketch.HyperLogLog(precision=8))
+
+    def test_top_k(self):
+        rng = random.Random(0)
+        stream = [f'v{int(rng.paretovariate(1.1))}' for _ in range(20000)]
+        exact = {}
+        for item in stream:
+            exact[item] = exact.get(item, 0) + 1
+
+        half = len(stream) // 2
+        a, b = sketch.TopK(capacity=50), sketch.TopK(capacity=50)
+        for item in stream[:half]:
+            a.add(item)
+        for item in stream[half:]:
+            b.add(item)
+        self.assertLessEqual(len(a), 100)
+        a.merge(sketch.TopK.from_bytes(b.to_bytes()))
+
+        expected = sorted(exact, key=lambda item: (-exact[item], item))[:5]
+        top = a.top(5)
+        self.assertEqual([item for item, _, _ in top], expected)
+        for item, count, error in top:
+            self.assertLessEqual(count - error, exact[item])
+            self.assertGreaterEqual(count, exact[item])
+
+
+class TestIoCAggregator(TestCase):
+
+    def test_aggregate(self):
+        aggregator = IoCAggregator(k=5)
+        for i in range(40):
+            domains = ['common.example', f'task{i}.example', 'common.example']
+            aggregator.add(make_ioc(domains, ips=['10.0.0.1'] if i % 4 == 0 else []))
+        aggregator.add(collection.IoC(json.loads((TEST_DATA_DIR / 'ioc.json').read_text())))
+
+        self.assertEqual(aggregator.tasks, 41)
+        top = aggregator.top(1, category='DNS requests', reputation='malicious')
+        self.assertEqual(top, [('common.example', 40, 0)])
+        self.assertEqual(aggregator.estimate('10.0.0.1', category='Connections'), 10)
+        self.assertEqual(aggregator.estimate('10.0.0.1', reputation='malicious'), 0)
+        self.assertAlmostEqual(aggregator.distinct(category='DNS requests', reputation='malicious'), 41, delta=2)
+        self.assertIn(('Main object', 'malicious'), aggregator.groups)
+        self.assertEqual(aggregator.top(1)[0][:2], ('common.example', 40))
+
+    def test_merge_and_save(self):
+        workers = [IoCAggregator(k=5), IoCAggregator(k=5)]
+        for i in range(20):
+            workers[i % 2].add(make_ioc(['shared.example', f'only{i}.example'], ips=['192.0.2.1']))
+
+        merged = IoCAggregator(k=5)
+        for worker in workers:
+            merged.merge(worker)
+        self.assertEqual(merged.tasks, 20)
+        self.assertEqual(merged.top(1, category='DNS requests'), [('shared.example', 20, 0)])
+
+        with tempfile.TemporaryDirectory() as tmp:
+            path = Path(tmp) / 'iocs.agg'
+            merged.save(path)
+            restored = IoCAggregator.load(path)
+        self.assertEqual(restored.tasks, 20)
+        self.assertEqual(restored.groups, merged.groups)
+        self.assertEqual(restored.top(3), merged.top(3))
+        self.assertEqual(restored.estimate('192.0.2.1'), 20)
+        self.assertEqual(restored.distinct('DNS requests'), merged.distinct('DNS requests'))
+
+        with self.assertRaises(ValueError):
+            IoCAggregator.from_bytes(b'XXXX' + bytes(4))
+        with self.assertRaises(ValueError):
+            merged.merge(IoCAggregator(precision=10))
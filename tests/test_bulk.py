@@ -0,0 +1,92 @@
+import json
+import tempfile
+from pathlib import Path
+from unittest import TestCase
+
+from aio_anyrun import bulk
+from aio_anyrun import fakeserver
+
+TEST_DATA_DIR = Path(__file__).parent / 'data'
+
+TASK_UUID = 'acdcbcf3-4b3a-42ca-aae5-736683b86800'
+UNKNOWN_UUID = '00000000-0000-0000-0000-000000000000'
+
+
+class TestBulkRunner(TestCase):
+
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.output = Path(self.tmp.name) / 'out.jsonl'
+
+    def tearDown(self):
+        self.tmp.cleanup()
+
+    def test_ordered_output_and_resume(self):
+        fixtures = fakeserver.Fixtures.load(TEST_DATA_DIR)
+        uuids = [task['uuid'] for task in fixtures.tasks] * 3 + [UNKNOWN_UUID]
+        progress = []
+        with fakeserver.FakeAnyRunServer(TEST_DATA_DIR).serve_in_thread() as server:
+            runner = bulk.BulkRunner(
+                self.output, processes=2, chunk_size=2, progress=lambda done, total: progress.append(done),
+                base_url=server.base_url, content_url=server.content_url)
+            self.assertEqual(runner.run(uuids[:4]), 4)
+
+            # incomplete line of crashed run is dropped
+            with self.output.open('a') as fd:
+                fd.write('{"input": "broken')
+            self.assertEqual(runner.run(uuids), len(uuids) - 4)
+
+        results = list(bulk.read_results(self.output))
+        self.assertEqual([r['input'] for r in results], uuids)
+        self.assertEqual([r['result']['uuid'] for r in results[:-1]], uuids[:-1])
+        self.assertIn('error', results[-1])
+        self.assertEqual(progress[:2], [2, 4])
+        self.assertEqual(progress[-1], len(uuids))
+
+    def test_search(self):
+        with fakeserver.FakeAnyRunServer(TEST_DATA_DIR, feed_size=120).serve_in_thread() as server:
+            runner = bulk.BulkRunner(
+                self.output, operation='search', processes=2,
+                base_url=server.base_url, content_url=server.content_url)
+            runner.run([{'skip': 0}, {'skip': 50}, {'skip': 100}])
+
+        lines = self.output.read_text().splitlines()
+        self.assertEqual([len(json.loads(line)['result']) for line in lines], [50, 50, 20])
+
+    def test_retry_errors(self):
+        with fakeserver.FakeAnyRunServer(TEST_DATA_DIR).serve_in_thread() as server:
+            runner = bulk.BulkRunner(
+                self.output, processes=1, base_url=server.base_url, content_url=server.content_url)
+            self.assertEqual(runner.run([TASK_UUID, UNKNOWN_UUID]), 2)
+            requests = server.requests['taskexists']
+
+            # error line is kept as done by default
+            self.assertEqual(runner.run([TASK_UUID, UNKNOWN_UUID, TASK_UUID]), 1)
+            self.assertEqual(server.requests['taskexists'], requests + 1)
+
+            self.assertEqual(runner.run([TASK_UUID, UNKNOWN_UUID, TASK_UUID], retry_errors=True), 1)
+            self.assertEqual(server.requests['taskexists'], requests + 2)
+
+        results = list(bulk.read_results(self.output))
+        self.assertEqual([r['input'] for r in results], [TASK_UUID, UNKNOWN_UUID, TASK_UUID])
+        self.assertIn('error', results[1])
+        self.assertEqual(results[2]['result']['uuid'], TASK_UUID)
+
+    def test_workers_logout(self):
+        with fakeserver.FakeAnyRunServer(TEST_DATA_DIR).serve_in_thread() as server:
+            runner = bulk.BulkRunner(
+                self.output, processes=2, chunk_size=1, email='user@example.com', password='password',
+                base_url=server.base_url, content_url=server.content_url)
+            runner.run([TASK_UUID] * 4)
+            self.assertGreater(server.requests['login'], 0)
+            self.assertEqual(server.requests.get('logout'), server.requests['login'])
+
+    def test_resume_other_inputs(self):
+        with fakeserver.FakeAnyRunServer(TEST_DATA_DIR).serve_in_thread() as server:
+            runner = bulk.BulkRunner(
+                self.output, processes=1, base_url=server.base_url, content_url=server.content_url)
+            runner.run([TASK_UUID, UNKNOWN_UUID])
+            with self.assertRaises(ValueError):
+                runner.run([UNKNOWN_UUID, TASK_UUID, TASK_UUID])
+            # overwritten without resume
+            self.assertEqual(runner.run([UNKNOWN_UUID], resume=False), 1)
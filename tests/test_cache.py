@@ -0,0 +1,121 @@
+from pathlib import Path
+from unittest import TestCase
+
+try:
+    from unittest import IsolatedAsyncioTestCase as AsyncTestCase
+except ImportError:
+    from aiounittest import AsyncTestCase
+
+from aio_anyrun import client
+from aio_anyrun import fakeserver
+from aio_anyrun.cache import QueryCache, normalize
+from aio_anyrun.filters import F
+from aio_anyrun.index import TaskIndex
+
+TEST_DATA_DIR = Path(__file__).parent / 'data'
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = 0.0
+
+    def __call__(self) -> float:
+        return self.now
+
+
+class TestQueryCache(TestCase):
+
+    def test_normalized_key(self):
+        create_params = client.AnyRunClient._create_params
+        defaults = create_params()
+        self.assertEqual(normalize(defaults, defaults), {})
+        self.assertEqual(
+            QueryCache.key('getTasks', create_params(run_type='file'), defaults),
+            QueryCache.key('getTasks', create_params(run_type=['file']), defaults))
+        self.assertEqual(
+            QueryCache.key('getTasks', create_params(verdict=['normal', 'malicious'], tag='emotet'), defaults),
+            QueryCache.key('getTasks', create_params(tag='emotet', verdict=['malicious', 'normal']), defaults))
+        self.assertNotEqual(
+            QueryCache.key('getTasks', create_params(tag='emotet'), defaults),
+            QueryCache.key('getTasks', create_params(tag='emotet', skip=50), defaults))
+
+    def test_ttl_and_lru(self):
+        clock = FakeClock()
+        cache = QueryCache(ttl=10, max_size=2, clock=clock)
+        cache.put('a', [1])
+        cache.put('b', [2])
+        self.assertEqual(cache.get('a'), [1])
+        cache.put('c', [3])
+        # 'b' is least recently used
+        self.assertIsNone(cache.get('b'))
+        self.assertEqual(len(cache), 2)
+
+        clock.now = 10
+        self.assertNotIn('a', cache)
+        self.assertIsNone(cache.get('a'))
+        self.assertEqual((cache.hits, cache.misses), (1, 2))
+
+        cache.put('d', [4])
+        cache.invalidate('d')
+        self.assertIsNone(cache.get('d'))
+        cache.put('e', [5])
+        cache.invalidate()
+        self.assertEqual(len(cache), 0)
+
+
+class TestClientQueryCache(AsyncTestCase):
+
+    async def asyncSetUp(self):
+        self.server = fakeserver.FakeAnyRunServer(TEST_DATA_DIR, feed_size=100)
+        await self.server.start()
+
+    async def asyncTearDown(self):
+        await self.server.close()
+
+    async def test_search_cache(self):
+        clock = FakeClock()
+        cache = QueryCache(ttl=5, clock=clock)
+        async with client.AnyRunClient.connect(base_url=self.server.base_url, query_cache=cache) as c:
+            first = await c.search(run_type='file', verdict='malicious')
+            second = await c.search(run_type=['file'], verdict=['malicious'])
+            self.assertEqual(self.server.requests['getTasks'], 1)
+            self.assertEqual([task.task_uuid for task in first], [task.task_uuid for task in second])
+            self.assertIsNot(first[0], second[0])
+
+            # filter is applied to cached result
+            uuid = first[0].task_uuid
+            filtered = await c.search(run_type='file', verdict='malicious', where=F('uuid') == uuid)
+            self.assertEqual([task.task_uuid for task in filtered], [uuid])
+
+            # modifying result doesn't change cached one
+            first[0].raw_data['uuid'] = 'modified'
+            second[0].raw_data['tags'].append('modified')
+            third = await c.search(run_type='file', verdict='malicious')
+            self.assertEqual(third[0].task_uuid, second[0].task_uuid)
+            self.assertNotIn('modified', third[0].tags)
+
+            await c.search(run_type='file', verdict='malicious', cache=False)
+            await c.search(run_type='url')
+            self.assertEqual(self.server.requests['getTasks'], 3)
+
+            clock.now = 5
+            await c.search(run_type='file', verdict='malicious')
+            self.assertEqual(self.server.requests['getTasks'], 4)
+
+    async def test_cache_hit_is_indexed(self):
+        index = TaskIndex()
+        cache = QueryCache(ttl=30)
+        async with client.AnyRunClient.connect(base_url=self.server.base_url, query_cache=cache) as c:
+            await c.search(tag='emotet')
+        async with client.AnyRunClient.connect(
+                base_url=self.server.base_url, query_cache=cache, index=index) as c:
+            tasks = await c.search(tag='emotet')
+            self.assertEqual(self.server.requests['getTasks'], 1)
+            self.assertEqual(len(index), len(tasks))
+            self.assertIn(tasks[0].task_uuid, index)
+
+    async def test_without_cache(self):
+        async with client.AnyRunClient.connect(base_url=self.server.base_url) as c:
+            await c.search(tag='emotet')
+            await c.search(tag='emotet')
+            self.assertEqual(self.server.requests['getTasks'], 2)
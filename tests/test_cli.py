@@ -0,0 +1,63 @@
+import json
+import subprocess
+import sys
+from unittest import TestCase
+
+# modules which CLI must not import before a command runs
+HEAVY_MODULES = ('aiohttp', 'asyncio', 'aio_anyrun.client', 'aio_anyrun.bulk')
+
+# run CLI in fresh interpreter and print exit code and heavy modules loaded
+PROBE = '''
+import json, sys
+from aio_anyrun.__main__ import cli
+try:
+    cli.main(args=sys.argv[1:], prog_name='aio-anyrun')
+except SystemExit as e:
+    code = e.code
+print(json.dumps({'code': code, 'loaded': [name for name in %r if name in sys.modules]}), file=sys.stderr)
+''' % (HEAVY_MODULES,)
+
+
+def run_cli(*args: str) -> dict:
+    proc = subprocess.run(
+        [sys.executable, '-c', PROBE, *args], stdout=subprocess.PIPE, stderr=subprocess.PIPE, timeout=60)
+    return json.loads(proc.stderr.decode().strip().splitlines()[-1])
+
+
+class TestStartup(TestCase):
+
+    def test_help_is_lightweight(self):
+        for args in [('--help',), (), ('search', '--help'), ('bulk', '--help')]:
+            with self.subTest(args=args):
+                result = run_cli(*args)
+                self.assertEqual(result['code'], 0)
+                self.assertEqual(result['loaded'], [])
+
+    def test_argument_error_is_lightweight(self):
+        for args in [('unknown',), ('search', '-r', 'bogus'), ('get-ioc', '-u', 'not-uuid')]:
+            with self.subTest(args=args):
+                result = run_cli(*args)
+                self.assertEqual(result['code'], 2)
+                self.assertEqual(result['loaded'], [])
+
+    def test_package_attributes(self):
+        import aio_anyrun
+        from aio_anyrun.client import AnyRunClient
+        from aio_anyrun.collection import Task
+        self.assertIs(aio_anyrun.AnyRunClient, AnyRunClient)
+        self.assertIs(aio_anyrun.Task, Task)
+        self.assertIn('AnyRunClient', dir(aio_anyrun))
+        with self.assertRaises(AttributeError):
+            aio_anyrun.no_such_name
+
+    def test_star_import(self):
+        import aio_anyrun
+        from aio_anyrun import client, collection, const
+        namespace = {}
+        exec('from aio_anyrun import *', namespace)
+        self.assertIs(namespace['AnyRunClient'], client.AnyRunClient)
+        self.assertIs(namespace['Task'], collection.Task)
+        self.assertIs(namespace['RUN_TYPES'], const.RUN_TYPES)
+        self.assertNotIn('aiohttp', namespace)
+        for name in aio_anyrun.__all__:
+            self.assertTrue(hasattr(aio_anyrun, name), name)
@@ -3,6 +3,8 @@ import unittest
 from pathlib import Path
 
 from aio_anyrun import collection
+from aio_anyrun.filters import F
+from aio_anyrun.index import TaskIndex
 
 TEST_DATA_DIR = Path(__file__).parent  / 'data' 
 
@@ -66,4 +68,56 @@ class TestCollection(unittest.TestCase):
     def test_download_type_collection(self):
         tests = TESTS['download']
         task = self.load_test_json('download_task.json')
-        self.check(task, tests)
\ No newline at end of file
+        self.check(task, tests)
+
+class TestLazyTask(unittest.TestCase):
+
+    def test_same_as_task(self):
+        for kind, tests in TESTS.items():
+            text = (TEST_DATA_DIR / f'{kind}_task.json').read_text()
+            task = collection.Task(json.loads(text))
+            lazy = collection.LazyTask(text)
+            for method in tests:
+                self.assertEqual(getattr(lazy, method), tests[method])
+            self.assertEqual(dict(lazy.items()), dict(task.items()))
+            self.assertEqual(lazy.raw_data, task.raw_data)
+            self.assertEqual(lazy['times'], task['times'])
+
+    def test_sections_decoded_on_access(self):
+        doc = json.loads((TEST_DATA_DIR / 'file_task.json').read_text())
+        lazy = collection.LazyTask(doc)
+        main_object = dict.__getitem__(lazy._doc['public']['objects'], 'mainObject')
+        self.assertIsInstance(dict.__getitem__(main_object, 'info'), collection._Packed)
+
+        self.assertEqual(lazy.sha256, doc['public']['objects']['mainObject']['hashes']['sha256'])
+        self.assertEqual(lazy.verdict, 'malicious')
+        self.assertIsInstance(dict.__getitem__(main_object, 'info'), collection._Packed)
+
+        self.assertEqual(lazy.mime_type, 'application/x-dosexec')
+        self.assertIsInstance(dict.__getitem__(main_object, 'info'), dict)
+        # given document is not modified
+        self.assertIsInstance(doc['public']['objects']['mainObject']['info'], dict)
+
+    def test_indexed_without_decoding(self):
+        doc = json.loads((TEST_DATA_DIR / 'file_task.json').read_text())
+        lazy = collection.LazyTask(doc)
+        index = TaskIndex()
+        index.add_task(lazy)
+        self.assertIs(index.get_task(lazy.task_uuid), lazy)
+
+        tasks = index.search(verdict='malicious')
+        self.assertEqual([task for task in tasks if (F('uuid') == lazy.task_uuid)(task._doc)], [lazy])
+        self.assertIsInstance(dict.__getitem__(lazy._doc['public'], 'environment'), collection._Packed)
+        self.assertEqual(json.loads(lazy.json()), doc)
+        self.assertIsInstance(dict.__getitem__(lazy._doc['public'], 'environment'), collection._Packed)
+
+    def test_properties_of_subclass(self):
+        class AnnotatedTask(collection.LazyTask):
+            @property
+            def note(self) -> str:
+                return 'checked'
+
+        text = (TEST_DATA_DIR / 'file_task.json').read_text()
+        self.assertNotIn('note', collection.LazyTask(text).properties)
+        self.assertEqual(dict(AnnotatedTask(text).items())['note'], 'checked')
+        self.assertNotIn('note', collection.LazyTask(text).properties)
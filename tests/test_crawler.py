@@ -0,0 +1,80 @@
+import tempfile
+import unittest
+from pathlib import Path
+
+try:
+    from unittest import IsolatedAsyncioTestCase as AsyncTestCase
+except ImportError:
+    from aiounittest import AsyncTestCase
+
+from aio_anyrun import client
+from aio_anyrun import crawler
+from aio_anyrun import fakeserver
+from aio_anyrun import sketch
+
+TEST_DATA_DIR = Path(__file__).parent / 'data'
+
+
+class TestBloomFilter(unittest.TestCase):
+
+    def test_membership_and_serialization(self):
+        bloom = sketch.BloomFilter(capacity=1000, error_rate=0.01)
+        for i in range(1000):
+            bloom.add(f'uuid-{i}')
+        restored = sketch.BloomFilter.from_bytes(bloom.to_bytes())
+        self.assertTrue(all(f'uuid-{i}' in restored for i in range(1000)))
+        false_positives = sum(f'other-{i}' in restored for i in range(1000))
+        self.assertLess(false_positives, 50)
+
+
+class TestIncrementalCrawler(AsyncTestCase):
+
+    async def asyncSetUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.server = fakeserver.FakeAnyRunServer(TEST_DATA_DIR, feed_size=500)
+        await self.server.start()
+        self.client = client.AnyRunClient(base_url=self.server.base_url)
+        await self.client.init_connection_with_default_client()
+
+    async def asyncTearDown(self):
+        await self.client.close()
+        await self.server.close()
+        self.tmp.cleanup()
+
+    async def test_crawl_only_new_tasks(self):
+        first = await crawler.IncrementalCrawler(self.client, self.tmp.name, max_pages=3).fetch_new()
+        self.assertEqual(len(first), 150)
+
+        published = self.server.publish(7)
+        self.server.requests.clear()
+        second = await crawler.IncrementalCrawler(self.client, self.tmp.name, max_pages=3).fetch_new()
+        self.assertEqual([task.task_uuid for task in second], [task['uuid'] for task in published])
+        self.assertEqual(self.server.requests['publicTasks'], 1)
+
+        third = await crawler.IncrementalCrawler(self.client, self.tmp.name, max_pages=3).fetch_new()
+        self.assertEqual(third, [])
+
+    async def test_resume_after_max_pages(self):
+        await crawler.IncrementalCrawler(self.client, self.tmp.name, max_pages=1).fetch_new()
+        published = [task['uuid'] for task in self.server.publish(120)]
+
+        partial = crawler.IncrementalCrawler(self.client, self.tmp.name, max_pages=1)
+        watermark = partial.watermark
+        with self.assertLogs(crawler.logger, 'WARNING'):
+            first = await partial.fetch_new()
+        self.assertEqual([task.task_uuid for task in first], published[:50])
+        # gap below fetched tasks is not skipped by next run
+        self.assertEqual(partial.watermark, watermark)
+
+        rest = crawler.IncrementalCrawler(self.client, self.tmp.name, max_pages=3)
+        second = await rest.fetch_new()
+        self.assertEqual([task.task_uuid for task in second], published[50:])
+        self.assertEqual(rest.watermark['uuid'], published[0])
+        self.assertIsNone(rest.pending)
+        self.assertEqual(await crawler.IncrementalCrawler(self.client, self.tmp.name).fetch_new(), [])
+
+    async def test_state_per_query(self):
+        await crawler.IncrementalCrawler(self.client, self.tmp.name, max_pages=1).fetch_new()
+        other = crawler.IncrementalCrawler(self.client, self.tmp.name, max_pages=1, use_search=True)
+        self.assertIsNone(other.watermark)
+        self.assertEqual(len(await other.fetch_new()), 50)
@@ -0,0 +1,68 @@
+import tempfile
+from pathlib import Path
+
+try:
+    from unittest import IsolatedAsyncioTestCase as AsyncTestCase
+except ImportError:
+    from aiounittest import AsyncTestCase
+
+from aio_anyrun import client
+from aio_anyrun import fakeserver
+
+TEST_DATA_DIR = Path(__file__).parent / 'data'
+
+TASK_UUID = 'acdcbcf3-4b3a-42ca-aae5-736683b86800'
+
+
+class TestFakeAnyRunServer(AsyncTestCase):
+
+    async def asyncSetUp(self):
+        self.server = fakeserver.FakeAnyRunServer(TEST_DATA_DIR, batch_size=7, feed_size=120)
+        await self.server.start()
+
+    async def asyncTearDown(self):
+        await self.server.close()
+
+    def connect(self):
+        return client.AnyRunClient.connect(
+            base_url=self.server.base_url, content_url=self.server.content_url)
+
+    async def test_public_tasks_and_search(self):
+        async with self.connect() as c:
+            tasks = await c.get_public_tasks()
+            self.assertEqual(50, len(tasks))
+            self.assertEqual(len({task.task_uuid for task in tasks}), 50)
+
+            tasks = await c.search(skip=100)
+            self.assertEqual(20, len(tasks))
+
+    async def test_single_task_ioc_and_mitre(self):
+        async with self.connect() as c:
+            task = await c.get_single_task(TASK_UUID)
+            self.assertEqual(task.sha1, '96a2558e0fbc103907c6aa119e85598d30ad330a')
+
+            ioc = await c.get_ioc(TASK_UUID)
+            self.assertEqual(len(ioc.dns), 2)
+
+            mitre = await c.get_mitre()
+            self.assertIn('T1060', mitre)
+
+            incidents = await c.get_incidents(TASK_UUID)
+            self.assertEqual(len(incidents), 5)
+
+    async def test_login_and_download(self):
+        async with self.connect() as c:
+            self.assertTrue(await c.login('analyst@example.com', 'password'))
+            task = await c.get_single_task(TASK_UUID)
+            with tempfile.TemporaryDirectory() as dest:
+                pcap = await c.download_pcap(task, dest)
+                self.assertEqual(pcap.read_bytes(), self.server.pcap())
+                saved = await c.download_file(task, dest)
+                self.assertEqual(saved.stat().st_size, self.server.file_size)
+            await c.logout()
+
+    async def test_error_injection(self):
+        self.server.fail_methods.add('getIOC')
+        async with self.connect() as c:
+            with self.assertRaises(client.AnyRunError):
+                await c.get_ioc(TASK_UUID)
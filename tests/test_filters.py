@@ -0,0 +1,85 @@
+import json
+from pathlib import Path
+from unittest import TestCase
+
+try:
+    from unittest import IsolatedAsyncioTestCase as AsyncTestCase
+except ImportError:
+    from aiounittest import AsyncTestCase
+
+from aio_anyrun import client
+from aio_anyrun import fakeserver
+from aio_anyrun.filters import F
+
+TEST_DATA_DIR = Path(__file__).parent / 'data'
+
+MIME = 'public.objects.mainObject.info.meta.mime'
+
+
+def load_test_json(name: str) -> dict:
+    return json.loads((TEST_DATA_DIR / name).read_text())
+
+
+class TestFilters(TestCase):
+
+    def setUp(self):
+        self.file_task = load_test_json('file_task.json')
+        self.url_task = load_test_json('url_task.json')
+
+    def test_compare(self):
+        self.assertTrue((F(MIME) == 'application/x-dosexec')(self.file_task))
+        self.assertFalse((F(MIME) == 'application/x-dosexec')(self.url_task))
+        self.assertTrue((F(MIME) != 'application/pdf')(self.file_task))
+        self.assertFalse((F(MIME) != 'application/x-dosexec')(self.file_task))
+        # missing field never matches, but negation of equality does
+        self.assertFalse((F(MIME) != 'application/pdf')(self.url_task))
+        self.assertTrue((~(F(MIME) == 'application/pdf'))(self.url_task))
+        self.assertEqual(repr(F(MIME) != 'application/pdf'), f"F('{MIME}') != 'application/pdf'")
+        self.assertTrue((F('public.environment.OS.build') >= 7601)(self.file_task))
+        self.assertFalse((F('public.environment.OS.major') > 7)(self.file_task))
+        self.assertTrue(F('public.environment.OS.major').in_(['7', '10'])(self.file_task))
+        self.assertTrue(F(MIME).startswith('application/')(self.file_task))
+        self.assertTrue(F('public.objects.mainObject.info.meta.exif.EXE.PEType').matches('^PE3')(self.file_task))
+
+    def test_lists(self):
+        self.assertTrue((F('tags') == 'hawkeye')(self.file_task))
+        self.assertTrue(F('tags').contains('stealer')(self.file_task))
+        self.assertFalse(F('tags').contains('steal')(self.file_task))
+        self.assertTrue(F('items.name').contains('b')({'items': [{'name': 'a'}, {'name': 'abc'}]}))
+        # not equal matches only if no element equals
+        self.assertFalse((F('tags') != 'hawkeye')(self.file_task))
+        self.assertTrue((F('tags') != 'emotet')(self.file_task))
+        self.assertFalse((F('items.name') != 'a')({'items': [{'name': 'a'}, {'name': 'b'}]}))
+        self.assertTrue((F('items.name') != 'c')({'items': [{'name': 'a'}, {'name': 'b'}]}))
+        self.assertFalse((F('tags') != 'emotet')({}))
+
+    def test_combine(self):
+        where = F('tags').contains('hawkeye') & F('tags').contains('trojan') & ~F('tags').contains('emotet')
+        self.assertTrue(where(self.file_task))
+        self.assertEqual(len(where.filters), 3)
+        self.assertTrue((F('tags').contains('emotet') | F(MIME).exists())(self.file_task))
+        self.assertFalse((F('tags').contains('emotet') | F(MIME).exists())(self.url_task))
+        self.assertIn("F('tags').contains('emotet')", repr(~F('tags').contains('emotet')))
+
+
+class TestFilterPushdown(AsyncTestCase):
+
+    async def asyncSetUp(self):
+        self.server = fakeserver.FakeAnyRunServer(TEST_DATA_DIR, feed_size=50)
+        await self.server.start()
+
+    async def asyncTearDown(self):
+        await self.server.close()
+
+    async def test_public_tasks_and_search(self):
+        exe = F(MIME) == 'application/x-dosexec'
+        expected = sum(exe(self.server.feed_task(i)) for i in range(50))
+        self.assertTrue(0 < expected < 50)
+
+        async with client.AnyRunClient.connect(base_url=self.server.base_url) as c:
+            tasks = await c.get_public_tasks(where=exe)
+            self.assertEqual(len(tasks), expected)
+            self.assertTrue(all(task.mime_type == 'application/x-dosexec' for task in tasks))
+
+            tasks = await c.search(where=~exe)
+            self.assertEqual(len(tasks), 50 - expected)
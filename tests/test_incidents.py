@@ -0,0 +1,51 @@
+from pathlib import Path
+
+try:
+    from unittest import IsolatedAsyncioTestCase as AsyncTestCase
+except ImportError:
+    from aiounittest import AsyncTestCase
+
+from aio_anyrun import client
+from aio_anyrun import collection
+from aio_anyrun import fakeserver
+
+TEST_DATA_DIR = Path(__file__).parent / 'data'
+
+TASK_UUID = 'acdcbcf3-4b3a-42ca-aae5-736683b86800'
+
+
+class TestIterIncidents(AsyncTestCase):
+
+    async def asyncSetUp(self):
+        self.server = fakeserver.FakeAnyRunServer(TEST_DATA_DIR)
+        await self.server.start()
+
+    async def asyncTearDown(self):
+        await self.server.close()
+
+    def connect(self):
+        return client.AnyRunClient.connect(base_url=self.server.base_url)
+
+    async def test_iter_all(self):
+        async with self.connect() as c:
+            incidents = [incident async for incident in c.iter_incidents(TASK_UUID)]
+            self.assertEqual(len(incidents), 5)
+            self.assertIsInstance(incidents[0], collection.Incident)
+            self.assertEqual(incidents[1].mitre, ['T1060'])
+            self.assertEqual(incidents[1].first_seen.year, 2020)
+
+            # subscription is finished, so connection is usable for next request
+            task = await c.get_single_task(TASK_UUID)
+            self.assertEqual(task.task_uuid, TASK_UUID)
+
+    async def test_filters(self):
+        async with self.connect() as c:
+            incidents = [i async for i in c.iter_incidents(TASK_UUID, min_threat=2)]
+            self.assertEqual([i.threat_level for i in incidents], [2, 2])
+
+            incidents = [i async for i in c.iter_incidents(TASK_UUID, min_threat=1, types=['registry', 'file'])]
+            self.assertEqual([i.types for i in incidents], ['file', 'registry', 'registry'])
+
+            incidents = [i async for i in c.iter_incidents(TASK_UUID, types='network', raw=True)]
+            self.assertEqual([i.title for i in incidents], ['Checks for external IP'])
+            self.assertEqual(self.server.requests['rawincidents'], 1)
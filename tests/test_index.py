@@ -0,0 +1,109 @@
+import json
+import tempfile
+import unittest
+from pathlib import Path
+
+try:
+    from unittest import IsolatedAsyncioTestCase as AsyncTestCase
+except ImportError:
+    from aiounittest import AsyncTestCase
+
+from aio_anyrun import client
+from aio_anyrun import collection
+from aio_anyrun import fakeserver
+from aio_anyrun import index
+
+TEST_DATA_DIR = Path(__file__).parent / 'data'
+
+FILE_TASK_UUID = 'acdcbcf3-4b3a-42ca-aae5-736683b86800'
+URL_TASK_UUID = '08d7c9ed-df02-403f-b07d-3ceb9f1ba05f'
+DOWNLOAD_TASK_UUID = '640a15a3-7b2c-4b84-ab4a-fde92f409455'
+
+
+def load_test_json(name: str):
+    return json.loads((TEST_DATA_DIR / name).read_text())
+
+
+class TestTaskIndex(unittest.TestCase):
+
+    def setUp(self):
+        self.index = index.TaskIndex()
+        for name in ('file_task.json', 'url_task.json', 'download_task.json'):
+            self.index.add_task(collection.Task(load_test_json(name)))
+        self.index.add_ioc(FILE_TASK_UUID, collection.IoC(load_test_json('ioc.json')))
+
+    def uuids(self, **kwargs):
+        return {task.task_uuid for task in self.index.search(**kwargs)}
+
+    def test_search_by_task_attributes(self):
+        self.assertEqual(self.uuids(), {FILE_TASK_UUID, URL_TASK_UUID, DOWNLOAD_TASK_UUID})
+        self.assertEqual(self.uuids(verdict='malicious', run_type=['file']), {FILE_TASK_UUID})
+        self.assertEqual(self.uuids(tag='HawkEye'), {FILE_TASK_UUID})
+        self.assertEqual(self.uuids(extensions='exe'), {FILE_TASK_UUID})
+        self.assertEqual(self.uuids(extensions=['office', 'exe']), {FILE_TASK_UUID, DOWNLOAD_TASK_UUID})
+        self.assertEqual(self.uuids(hash_='96a2558e0fbc103907c6aa119e85598d30ad330a'), {FILE_TASK_UUID})
+        self.assertEqual(self.uuids(name='scan_draft'), {FILE_TASK_UUID})
+
+    def test_search_by_ioc(self):
+        self.assertEqual(self.uuids(domain='whatismyipaddress.com'), {FILE_TASK_UUID})
+        self.assertEqual(self.uuids(ip='104.16.154.36', verdict='malicious'), {FILE_TASK_UUID})
+        self.assertEqual(self.uuids(ip='104.16.154.36', verdict='no-threats'), set())
+        self.assertEqual(
+            self.uuids(file_hash='2f98e4f1a2b8a46fa6c66cbb6b1ad0b8de26ad2b4a0f4a8b1b6b1e6d3f1a9c01'),
+            {FILE_TASK_UUID})
+
+    def test_replace_task(self):
+        raw = load_test_json('file_task.json')
+        raw['tags'] = ['renamed']
+        self.index.add_task(collection.Task(raw))
+        self.assertEqual(self.uuids(tag='HawkEye'), set())
+        self.assertEqual(self.uuids(tag='renamed'), {FILE_TASK_UUID})
+        self.assertEqual(self.uuids(domain='whatismyipaddress.com'), {FILE_TASK_UUID})
+        # postings left empty are removed
+        self.assertNotIn(index._norm('HawkEye'), self.index.postings['tag'])
+        self.assertTrue(all(uuids for values in self.index.postings.values() for uuids in values.values()))
+
+    def test_unsupported_params(self):
+        with self.assertRaises(index.IndexQueryError):
+            self.index.search(mitre_id='T1060')
+
+    def test_save_and_load(self):
+        with tempfile.TemporaryDirectory() as tmp:
+            path = Path(tmp) / 'index.jsonl'
+            self.index.save(path)
+            loaded = index.TaskIndex.load(path)
+        self.assertEqual(len(loaded), 3)
+        self.assertEqual(
+            {task.task_uuid for task in loaded.search(domain='whatismyipaddress.com')}, {FILE_TASK_UUID})
+
+
+class TestClientWithIndex(AsyncTestCase):
+
+    async def asyncSetUp(self):
+        self.server = fakeserver.FakeAnyRunServer(TEST_DATA_DIR, feed_size=60)
+        await self.server.start()
+
+    async def asyncTearDown(self):
+        await self.server.close()
+
+    async def test_local_modes(self):
+        async with client.AnyRunClient.connect(base_url=self.server.base_url, index=index.TaskIndex()) as c:
+            remote = await c.search()
+            self.assertEqual(len(c.index), 50)
+            self.assertEqual(
+                [task.task_uuid for task in await c.search(local='only')],
+                [task.task_uuid for task in remote])
+
+            self.server.fail_methods.add('getTasks')
+            fallback = await c.search(local='fallback')
+            self.assertEqual(len(fallback), 50)
+            with self.assertRaises(client.AnyRunError):
+                await c.search()
+
+            self.server.fail_methods.clear()
+            newest = load_test_json('file_task.json')
+            newest['times']['taskStart']['$date'] = 2000000000000
+            c.index.add_task(collection.Task(newest))
+            merged = await c.search(local='merge')
+            self.assertEqual(len(merged), 51)
+            self.assertEqual(merged[0].task_uuid, FILE_TASK_UUID)
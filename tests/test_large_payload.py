@@ -0,0 +1,99 @@
+import gzip
+import json
+import tempfile
+from unittest import mock
+from pathlib import Path
+
+try:
+    from unittest import IsolatedAsyncioTestCase as AsyncTestCase
+except ImportError:
+    from aiounittest import AsyncTestCase
+
+from aio_anyrun import client
+from aio_anyrun import fakeserver
+
+TEST_DATA_DIR = Path(__file__).parent / 'data'
+
+TASK_UUID = 'acdcbcf3-4b3a-42ca-aae5-736683b86800'
+
+
+class TestLargePayload(AsyncTestCase):
+
+    async def asyncSetUp(self):
+        self.server = fakeserver.FakeAnyRunServer(TEST_DATA_DIR)
+        self.server.fixtures.graph = '<svg>' + 'x' * (5 * 1024 * 1024) + '</svg>'
+        await self.server.start()
+        self.tmp = tempfile.TemporaryDirectory()
+
+    async def asyncTearDown(self):
+        await self.server.close()
+        self.tmp.cleanup()
+
+    def connect(self, **kwargs):
+        return client.AnyRunClient.connect(base_url=self.server.base_url, **kwargs)
+
+    async def test_max_msg_size(self):
+        async with self.connect() as c:
+            with self.assertRaises(client.AnyRunError):
+                await c.get_process_graph(TASK_UUID)
+
+        async with self.connect(max_msg_size=16 * 1024 * 1024) as c:
+            graph = await c.get_process_graph(TASK_UUID)
+            self.assertEqual(graph, self.server.fixtures.graph)
+
+    async def test_compression_negotiated(self):
+        async with self.connect() as c:
+            self.assertEqual(c.client.compress, 0)
+        async with self.connect(compress=15) as c:
+            self.assertEqual(c.client.compress, 15)
+            self.assertTrue(await c.get_ioc(TASK_UUID))
+
+    async def test_spill_to_file(self):
+        async with self.connect(max_msg_size=0) as c:
+            path = await c.get_process_graph(TASK_UUID, dest=self.tmp.name, compress=True)
+            self.assertEqual(path.name, f'{TASK_UUID}.svg.gz')
+            with gzip.open(str(path), 'rt') as fd:
+                self.assertEqual(fd.read(), self.server.fixtures.graph)
+
+            path = await c.save_ioc(TASK_UUID, Path(self.tmp.name) / 'report.json')
+            self.assertEqual(json.loads(path.read_text()), self.server.fixtures.ioc)
+
+            # result is written as sliced from message, without decoding it
+            with mock.patch.object(client, '_save_result', wraps=client._save_result) as save:
+                await c.save_ioc(TASK_UUID, Path(self.tmp.name) / 'report.json')
+            self.assertIsInstance(save.call_args[0][0], client._RawResult)
+            self.assertEqual(json.loads(path.read_text()), self.server.fixtures.ioc)
+
+    def test_split_result(self):
+        fields, result = client._split_result('{"msg": "result", "id":"5" ,"result" : {"a": [1, "}"]} }')
+        self.assertEqual(fields, {'msg': 'result', 'id': '5'})
+        self.assertEqual(result, '{"a": [1, "}"]}')
+        self.assertEqual(client._split_result('{"msg":"result","id":"5","result":"<svg>"}')[1], '"<svg>"')
+        self.assertIsNone(client._split_result('{"msg":"result","id":"5","error":{"error":404}}'))
+        self.assertIsNone(client._split_result('{"msg":"added","collection":"tasks","id":"x","fields":{}}'))
+        self.assertIsNone(client._split_result('{"result":1,"msg":"result","id":"5"}'))
+
+
+class TestFileWriter(AsyncTestCase):
+
+    async def test_write_in_order(self):
+        chunks = [bytes([i]) * (i * 100 + 1) for i in range(100)]
+        with tempfile.TemporaryDirectory() as dest:
+            path = Path(dest, 'out.bin')
+            writer = client._FileWriter(path, buffer_size=4096, max_pending=2)
+            await writer.open()
+            for chunk in chunks:
+                await writer.write(chunk)
+            await writer.close()
+            self.assertEqual(path.read_bytes(), b''.join(chunks))
+
+    async def test_write_error(self):
+        with tempfile.TemporaryDirectory() as dest:
+            writer = client._FileWriter(Path(dest, 'out.bin'), buffer_size=1)
+            await writer.open()
+            writer._fd.close()
+            with self.assertRaises(ValueError):
+                for _ in range(10):
+                    await writer.write(b'x')
+                await writer.close()
+            await writer.close(abort=True)
@@ -0,0 +1,61 @@
+import json
+import tempfile
+import unittest
+from pathlib import Path
+
+try:
+    from unittest import IsolatedAsyncioTestCase as AsyncTestCase
+except ImportError:
+    from aiounittest import AsyncTestCase
+
+from aio_anyrun import client
+from aio_anyrun import fakeserver
+from aio_anyrun import mitre
+
+TEST_DATA_DIR = Path(__file__).parent / 'data'
+
+
+class TestMitreCatalog(unittest.TestCase):
+
+    def setUp(self):
+        self.catalog = mitre.MitreCatalog.from_raw(json.loads((TEST_DATA_DIR / 'mitre.json').read_text()))
+
+    def test_lookup(self):
+        self.assertEqual(len(self.catalog), 4)
+        self.assertEqual(self.catalog['T1060'].mitre_url, 'https://attack.mitre.org/techniques/T1060')
+        self.assertEqual(self.catalog['T1060'].created.year, 2017)
+        self.assertEqual([m.technique for m in self.catalog.tactic('Discovery')], ['T1082', 'T1016'])
+        self.assertEqual([m.technique for m in self.catalog.tactic('execution')], ['T1064'])
+        self.assertEqual(len(self.catalog.platform('windows')), 4)
+        self.assertEqual(len(self.catalog.platform('linux')), 3)
+
+    def test_for_incident(self):
+        incident = {'title': 'Changes the autorun value in the registry', 'mitre': ['T1060', 'T9999']}
+        self.assertEqual([m.technique for m in self.catalog.for_incident(incident)], ['T1060'])
+
+    def test_save_and_load(self):
+        with tempfile.TemporaryDirectory() as tmp:
+            path = Path(tmp) / 'mitre.json'
+            self.catalog.save(path)
+            loaded = mitre.MitreCatalog.load(path)
+        self.assertEqual(loaded.fetched_at, self.catalog.fetched_at)
+        self.assertEqual(list(loaded.by_id), list(self.catalog.by_id))
+
+
+class TestClientMitreCatalog(AsyncTestCase):
+
+    async def test_fetched_once(self):
+        async with fakeserver.FakeAnyRunServer(TEST_DATA_DIR) as server:
+            with tempfile.TemporaryDirectory() as tmp:
+                path = Path(tmp) / 'mitre.json'
+                async with client.AnyRunClient.connect(base_url=server.base_url) as c:
+                    catalog = await c.get_mitre_catalog(path)
+                    self.assertIs(await c.get_mitre_catalog(path), catalog)
+                    self.assertEqual(server.requests['mitre'], 1)
+
+                async with client.AnyRunClient.connect(base_url=server.base_url) as c:
+                    self.assertIn('T1064', await c.get_mitre_catalog(path))
+                    self.assertEqual(server.requests['mitre'], 1)
+
+                    self.assertEqual(len(await c.get_mitre_catalog(path, refresh_interval=-1)), 4)
+                    self.assertEqual(server.requests['mitre'], 2)
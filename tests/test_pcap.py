@@ -0,0 +1,126 @@
+import struct
+import tempfile
+from pathlib import Path
+from unittest import TestCase
+
+try:
+    from unittest import IsolatedAsyncioTestCase as AsyncTestCase
+except ImportError:
+    from aiounittest import AsyncTestCase
+
+from aio_anyrun import client
+from aio_anyrun import fakeserver
+from aio_anyrun import pcap
+
+TEST_DATA_DIR = Path(__file__).parent / 'data'
+
+TASK_UUID = 'acdcbcf3-4b3a-42ca-aae5-736683b86800'
+
+DOMAINS = ['evil.example.com', 'cdn.example.org']
+IPS = ['198.51.100.7', '203.0.113.9']
+
+
+class TestFlowSummarizer(TestCase):
+
+    def setUp(self):
+        self.data = fakeserver.synthetic_pcap(256 * 1024, DOMAINS, IPS)
+        self.expected = pcap.FlowSummarizer()
+        self.expected.feed(self.data)
+
+    def test_summary(self):
+        summary = self.expected.summary()
+        self.assertIsNone(summary['error'])
+        self.assertEqual(summary['dns'], sorted(DOMAINS))
+        self.assertEqual(summary['bytes'], sum(flow['bytes'] for flow in summary['flows']))
+        self.assertEqual(summary['packets'], sum(flow['packets'] for flow in summary['flows']))
+
+        https = [flow for flow in summary['flows'] if flow['dport'] == 443]
+        self.assertEqual({flow['dst'] for flow in https}, set(IPS))
+        self.assertTrue(all(flow['proto'] == 'tcp' and flow['src'] == '10.0.2.15' for flow in https))
+
+    def test_chunk_boundaries(self):
+        for chunk_size in (1, 17, 4096):
+            summarizer = pcap.FlowSummarizer()
+            for i in range(0, len(self.data), chunk_size):
+                summarizer.feed(self.data[i:i + chunk_size])
+            self.assertEqual(summarizer.summary(), self.expected.summary())
+
+    def test_broken_input(self):
+        summarizer = pcap.FlowSummarizer()
+        summarizer.feed(b'\x0a\x0d\x0d\x0a' + b'\x00' * 60)
+        self.assertIn('Not a classic pcap', summarizer.summary()['error'])
+
+        summarizer = pcap.FlowSummarizer()
+        summarizer.feed(self.data[:-10])
+        self.assertIn('Truncated', summarizer.summary()['error'])
+
+    def test_broken_record_length(self):
+        packet = fakeserver._pcap_packet('10.0.0.1', '10.0.0.2', 1234, 80, 6, b'x' * 10)
+        data = struct.pack('<IHHiIII', 0xa1b2c3d4, 2, 4, 0, 0, 65535, 1)
+        data += struct.pack('<IIII', 1, 0, len(packet), len(packet)) + packet
+        data += struct.pack('<IIII', 2, 0, 0x7fffffff, 0x7fffffff) + packet
+        summarizer = pcap.FlowSummarizer()
+        summarizer.feed(data)
+        summary = summarizer.summary()
+        self.assertIn('Broken record', summary['error'])
+        self.assertEqual(summary['packets'], 1)
+        self.assertEqual(len(summarizer._buf), 0)
+        # rest of input is ignored
+        summarizer.feed(packet * 100)
+        self.assertEqual(len(summarizer._buf), 0)
+
+    def test_big_endian_raw_ip(self):
+        packet = fakeserver._pcap_packet('10.0.0.1', '10.0.0.2', 1234, 80, 6, b'x' * 10)[14:]
+        data = struct.pack('>IHHiIII', 0xa1b2c3d4, 2, 4, 0, 0, 65535, 101)
+        data += struct.pack('>IIII', 1, 0, len(packet), len(packet)) + packet
+        summarizer = pcap.FlowSummarizer()
+        summarizer.feed(data)
+        flow, = summarizer.summary()['flows']
+        self.assertEqual((flow['src'], flow['sport'], flow['dst'], flow['dport']), ('10.0.0.1', 1234, '10.0.0.2', 80))
+
+    def test_short_packets(self):
+        packet = fakeserver._pcap_packet('10.0.0.1', '10.0.0.2', 1234, 80, 6, b'x' * 10)
+        for linktype, short in ((1, packet[:10]), (113, packet[:15]), (101, b'')):
+            with self.subTest(linktype=linktype):
+                good = packet[14:] if linktype == 101 else packet
+                if linktype == 113:
+                    good = b'\x00' * 14 + packet[12:]
+                data = struct.pack('<IHHiIII', 0xa1b2c3d4, 2, 4, 0, 0, 65535, linktype)
+                for frame in (short, good):
+                    data += struct.pack('<IIII', 1, 0, len(frame), len(frame)) + frame
+                summarizer = pcap.FlowSummarizer()
+                summarizer.feed(data)
+                summary = summarizer.summary()
+                # short packet is skipped, not the rest of pcap
+                self.assertIsNone(summary['error'])
+                self.assertEqual(summary['packets'], 2)
+                flow, = summary['flows']
+                self.assertEqual((flow['src'], flow['dport']), ('10.0.0.1', 80))
+
+
+class TestDownloadSummary(AsyncTestCase):
+
+    async def asyncSetUp(self):
+        self.server = fakeserver.FakeAnyRunServer(TEST_DATA_DIR, pcap_size=512 * 1024)
+        await self.server.start()
+
+    async def asyncTearDown(self):
+        await self.server.close()
+
+    async def test_download_pcap_summarize(self):
+        async with client.AnyRunClient.connect(
+                base_url=self.server.base_url, content_url=self.server.content_url) as c:
+            await c.login('analyst@example.com', 'password')
+            task = await c.get_single_task(TASK_UUID)
+            with tempfile.TemporaryDirectory() as dest:
+                saved = await c.download_pcap(task, dest, summarize=True)
+                summary = pcap.load_summary(pcap.summary_path(saved))
+                self.assertEqual(summary, pcap.summarize(saved))
+                self.assertEqual(summary['dns'], ['smtp.tesuya.example.c0m', 'whatismyipaddress.com'])
+
+                only = Path(dest, 'only')
+                only.mkdir()
+                saved = await c.download_pcap(task, only, summarize=True, keep_pcap=False)
+                self.assertEqual(saved, pcap.summary_path(only / f'{TASK_UUID}.pcap'))
+                self.assertEqual(pcap.load_summary(saved), summary)
+                self.assertEqual([p.name for p in only.iterdir()], [saved.name])
@@ -0,0 +1,79 @@
+import json
+import tempfile
+from pathlib import Path
+
+try:
+    from unittest import IsolatedAsyncioTestCase as AsyncTestCase
+except ImportError:
+    from aiounittest import AsyncTestCase
+
+from aio_anyrun import client
+from aio_anyrun import replay
+
+TEST_DATA_DIR = Path(__file__).parent / 'data'
+
+TASK_UUID = 'acdcbcf3-4b3a-42ca-aae5-736683b86800'
+TASK_OBJECT_ID = {'$type': 'oid', '$value': '5e31b5c5421642114a0f706d'}
+
+
+def sent(msg: dict) -> str:
+    return json.dumps([json.dumps(msg)])
+
+
+def received(msg: dict) -> str:
+    return 'a' + sent(msg)
+
+
+def single_task_frames() -> list:
+    task = json.loads((TEST_DATA_DIR / 'file_task.json').read_text())
+    return [
+        (0.0, replay.RECV, 'o'),
+        (1.0, replay.SEND, sent({'msg': 'connect', 'version': '1', 'support': ['1', 'pre2', 'pre1']})),
+        (2.0, replay.RECV, received({'msg': 'connected', 'session': 'abc'})),
+        (3.0, replay.SEND, sent({'msg': 'sub', 'name': 'taskexists', 'params': [TASK_UUID], 'id': 'sub1'})),
+        (4.0, replay.RECV, received({'msg': 'added', 'collection': 'taskExists', 'id': '1', 'fields': {'taskObjectId': TASK_OBJECT_ID}})),
+        (4.0, replay.RECV, received({'msg': 'ready', 'subs': ['sub1']})),
+        (5.0, replay.SEND, sent({'msg': 'sub', 'name': 'singleTask', 'params': [TASK_OBJECT_ID, False], 'id': 'sub2'})),
+        (6.0, replay.RECV, received({'msg': 'added', 'collection': 'tasks', 'id': '2', 'fields': task})),
+        (7.0, replay.RECV, received({'msg': 'ready', 'subs': ['sub2']})),
+    ]
+
+
+class TestReplay(AsyncTestCase):
+
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.path = Path(self.tmp.name) / 'session.jsonl.gz'
+        replay.save_frames(self.path, single_task_frames())
+
+    def tearDown(self):
+        self.tmp.cleanup()
+
+    async def test_replay_single_task(self):
+        transport = replay.ReplayTransport(self.path)
+        async with client.AnyRunClient.connect(transport=transport) as c:
+            task = await c.get_single_task(TASK_UUID)
+            self.assertEqual(task.task_uuid, TASK_UUID)
+            self.assertEqual(task.sha1, '96a2558e0fbc103907c6aa119e85598d30ad330a')
+
+    async def test_record_and_replay(self):
+        recorded = Path(self.tmp.name) / 'recorded.jsonl'
+        recorder = replay.SessionRecorder(recorded, transport=replay.ReplayTransport(self.path))
+        async with client.AnyRunClient.connect(transport=recorder) as c:
+            await c.get_single_task(TASK_UUID)
+
+        frames = replay.load_frames(recorded)
+        unsubs = [f for f in frames if f[1] == replay.SEND and json.loads(json.loads(f[2])[0])['msg'] == 'unsub']
+        self.assertEqual(len(unsubs), 2)
+        frames = [f for f in frames if f not in unsubs]
+        self.assertEqual(sorted(f[1] for f in frames), sorted(f[1] for f in single_task_frames()))
+
+        async with client.AnyRunClient.connect(transport=replay.ReplayTransport(recorded, speed=100)) as c:
+            task = await c.get_single_task(TASK_UUID)
+            self.assertEqual(task.verdict, 'malicious')
+
+    async def test_replay_unexpected_frame(self):
+        async with client.AnyRunClient.connect(transport=replay.ReplayTransport(self.path)) as c:
+            await c.get_single_task(TASK_UUID)
+            with self.assertRaises(replay.ReplayError):
+                await c.get_mitre()
@@ -0,0 +1,87 @@
+import asyncio
+from pathlib import Path
+
+try:
+    from unittest import IsolatedAsyncioTestCase as AsyncTestCase
+except ImportError:
+    from aiounittest import AsyncTestCase
+
+from aio_anyrun import client
+from aio_anyrun import fakeserver
+from aio_anyrun.scheduler import RequestScheduler
+
+TEST_DATA_DIR = Path(__file__).parent / 'data'
+
+TASK_UUID = 'acdcbcf3-4b3a-42ca-aae5-736683b86800'
+
+
+class TestRequestScheduler(AsyncTestCase):
+
+    async def test_priority_and_quota(self):
+        scheduler = RequestScheduler(capacity=2, quotas={'interactive': None, 'bulk': 1})
+        started = []
+
+        async def request(priority: str, name: str):
+            await scheduler.acquire(priority)
+            started.append(name)
+            await asyncio.sleep(0.01)
+            scheduler.release(priority)
+
+        bulk = [asyncio.ensure_future(request('bulk', f'bulk{i}')) for i in range(3)]
+        await asyncio.sleep(0)
+        self.assertEqual(scheduler.active, {'interactive': 0, 'bulk': 1})
+        self.assertEqual(scheduler.waiting('bulk'), 2)
+
+        interactive = [asyncio.ensure_future(request('interactive', f'interactive{i}')) for i in range(3)]
+        await asyncio.gather(*bulk, *interactive)
+        self.assertEqual(started[:4], ['bulk0', 'interactive0', 'interactive1', 'interactive2'])
+        self.assertEqual(scheduler.in_flight, 0)
+
+    async def test_cancel_waiting(self):
+        scheduler = RequestScheduler(capacity=1)
+        await scheduler.acquire('interactive')
+        waiter = asyncio.ensure_future(scheduler.acquire('bulk'))
+        await asyncio.sleep(0)
+        waiter.cancel()
+        with self.assertRaises(asyncio.CancelledError):
+            await waiter
+        self.assertEqual(scheduler.waiting(), 0)
+        scheduler.release('interactive')
+        self.assertEqual(scheduler.in_flight, 0)
+
+        with self.assertRaises(ValueError):
+            await scheduler.acquire('unknown')
+
+
+class TestClientScheduling(AsyncTestCase):
+
+    async def asyncSetUp(self):
+        self.server = fakeserver.FakeAnyRunServer(TEST_DATA_DIR, latency=0.02, feed_size=500)
+        await self.server.start()
+
+    async def asyncTearDown(self):
+        await self.server.close()
+
+    async def test_interactive_jumps_queue(self):
+        scheduler = RequestScheduler(capacity=4, quotas={'interactive': None, 'bulk': 1})
+        finished = []
+
+        async def page(skip: int):
+            await c.get_public_tasks(skip=skip)
+            finished.append('bulk')
+
+        async with client.AnyRunClient.connect(base_url=self.server.base_url, scheduler=scheduler) as c:
+            pages = [asyncio.ensure_future(page(i * 50)) for i in range(8)]
+            await asyncio.sleep(0.01)
+            with c.priority('interactive'):
+                task = await c.get_single_task(TASK_UUID)
+            finished.append('interactive')
+            await asyncio.gather(*pages)
+
+            self.assertEqual(task.task_uuid, TASK_UUID)
+            self.assertLessEqual(finished.index('interactive'), 2)
+            self.assertEqual(scheduler.in_flight, 0)
+
+            with self.assertRaises(ValueError):
+                with c.priority('unknown'):
+                    pass
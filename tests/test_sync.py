@@ -0,0 +1,94 @@
+import asyncio
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+from unittest import TestCase
+
+try:
+    from unittest import IsolatedAsyncioTestCase as AsyncTestCase
+except ImportError:
+    from aiounittest import AsyncTestCase
+
+from aio_anyrun import client
+from aio_anyrun import fakeserver
+from aio_anyrun.sync import SyncAnyRunClient
+
+TEST_DATA_DIR = Path(__file__).parent / 'data'
+
+TASK_UUID = 'acdcbcf3-4b3a-42ca-aae5-736683b86800'
+
+
+class TestSharedConnection(AsyncTestCase):
+
+    async def asyncSetUp(self):
+        self.server = fakeserver.FakeAnyRunServer(TEST_DATA_DIR, latency=0.01, jitter=0.01, feed_size=200)
+        await self.server.start()
+
+    async def asyncTearDown(self):
+        await self.server.close()
+
+    async def test_concurrent_requests(self):
+        async with client.AnyRunClient.connect(
+                base_url=self.server.base_url, content_url=self.server.content_url) as c:
+            results = await asyncio.gather(
+                *(c.search(skip=i * 50) for i in range(4)),
+                *(c.get_single_task(TASK_UUID) for _ in range(4)),
+                c.get_ioc(TASK_UUID),
+                c.get_public_tasks())
+
+            pages = results[:4]
+            self.assertEqual([len(page) for page in pages], [50, 50, 50, 50])
+            self.assertEqual(len({task.task_uuid for page in pages for task in page}), 200)
+            for task in results[4:8]:
+                self.assertEqual(task.task_uuid, TASK_UUID)
+            self.assertEqual(len(results[8].dns), 2)
+            self.assertEqual(len(results[9]), 50)
+
+    async def test_subscriptions_of_collection_in_order(self):
+        async with client.AnyRunClient.connect(base_url=self.server.base_url) as c:
+            sent = []
+            send_message = c._send_message
+
+            async def _send_message(msg: dict):
+                sent.append(msg)
+                await send_message(msg)
+            c._send_message = _send_message
+
+            await asyncio.gather(*(c.check_task_exists(TASK_UUID) for _ in range(3)))
+            await asyncio.sleep(0.05)
+            # next subscription of the same collection is sent after previous one is unsubscribed
+            kinds = [msg['msg'] for msg in sent if msg['msg'] in ('sub', 'unsub')]
+            self.assertEqual(kinds, ['sub', 'unsub'] * 3)
+            self.assertFalse(c._collection_locks['taskExists'].locked())
+
+            # websocket is owned by dispatcher
+            with self.assertRaises(client.AnyRunError):
+                await c.recv_message_loop()
+
+
+class TestSyncAnyRunClient(TestCase):
+
+    def test_threads_share_connection(self):
+        server = fakeserver.FakeAnyRunServer(TEST_DATA_DIR, latency=0.005)
+        with server.serve_in_thread():
+            with SyncAnyRunClient(
+                    'analyst@example.com', 'password',
+                    base_url=server.base_url, content_url=server.content_url) as c:
+                with ThreadPoolExecutor(8) as pool:
+                    tasks = list(pool.map(lambda _: c.get_single_task(TASK_UUID), range(16)))
+                self.assertEqual({task.task_uuid for task in tasks}, {TASK_UUID})
+                self.assertEqual(len(c.incidents(TASK_UUID)), 5)
+                self.assertEqual(server.requests['login'], 1)
+
+    def test_reconnect(self):
+        server = fakeserver.FakeAnyRunServer(TEST_DATA_DIR)
+        with server.serve_in_thread():
+            with SyncAnyRunClient(base_url=server.base_url, content_url=server.content_url) as c:
+                self.assertEqual(len(c.search()), 50)
+                c.call('close')
+                self.assertEqual(len(c.search()), 50)
+
+    def test_closed(self):
+        c = SyncAnyRunClient()
+        c.close()
+        with self.assertRaises(RuntimeError):
+            c.search()
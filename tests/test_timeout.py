@@ -0,0 +1,99 @@
+import asyncio
+from pathlib import Path
+
+try:
+    from unittest import IsolatedAsyncioTestCase as AsyncTestCase
+except ImportError:
+    from aiounittest import AsyncTestCase
+
+from aio_anyrun import client
+from aio_anyrun import fakeserver
+
+TEST_DATA_DIR = Path(__file__).parent / 'data'
+
+TASK_UUID = 'acdcbcf3-4b3a-42ca-aae5-736683b86800'
+
+
+class TestRequestTimeout(AsyncTestCase):
+
+    async def asyncSetUp(self):
+        self.server = fakeserver.FakeAnyRunServer(TEST_DATA_DIR, latency=0.2)
+        await self.server.start()
+
+    async def asyncTearDown(self):
+        await self.server.close()
+
+    def _record_sent(self, c: client.AnyRunClient) -> list:
+        sent = []
+        send_message = c._send_message
+
+        async def _send_message(msg: dict):
+            sent.append(msg)
+            await send_message(msg)
+        c._send_message = _send_message
+        return sent
+
+    async def test_method_timeout(self):
+        async with client.AnyRunClient.connect(base_url=self.server.base_url) as c:
+            with self.assertRaises(client.AnyRunTimeoutError):
+                await c.get_ioc(TASK_UUID, timeout=0.05)
+            self.assertEqual(c._routes, {})
+            self.assertEqual(c._collection_routes.get('getIOC'), {})
+
+            # late result of cancelled request doesn't reach next one
+            ioc = await c.get_ioc(TASK_UUID, timeout=1)
+            self.assertTrue(ioc.raw_data)
+
+    async def test_subscription_timeout_unsubscribes(self):
+        async with client.AnyRunClient.connect(base_url=self.server.base_url, request_timeout=0.05) as c:
+            sent = self._record_sent(c)
+            with self.assertRaises(asyncio.TimeoutError):
+                await c.get_mitre()
+            await asyncio.sleep(0)
+            self.assertEqual(c._routes, {})
+            sub_ids = [msg['id'] for msg in sent if msg['msg'] == 'sub']
+            unsub_ids = [msg['id'] for msg in sent if msg['msg'] == 'unsub']
+            self.assertEqual(sub_ids, unsub_ids)
+            self.assertFalse(c._collection_locks['mitre'].locked())
+
+            # per-call timeout overrides default
+            mitre = await c.get_mitre(timeout=2)
+            self.assertTrue(mitre)
+
+    async def test_cancel(self):
+        async with client.AnyRunClient.connect(base_url=self.server.base_url) as c:
+            sent = self._record_sent(c)
+            request = asyncio.ensure_future(c.get_single_task(TASK_UUID))
+            await asyncio.sleep(0.05)
+            request.cancel()
+            with self.assertRaises(asyncio.CancelledError):
+                await request
+            await asyncio.sleep(0)
+            self.assertEqual(c._routes, {})
+            self.assertEqual([msg['msg'] for msg in sent], ['sub', 'unsub'])
+
+            task = await c.get_single_task(TASK_UUID)
+            self.assertEqual(task.task_uuid, TASK_UUID)
+
+    async def test_iterator_deadline(self):
+        async with client.AnyRunClient.connect(base_url=self.server.base_url) as c:
+            with self.assertRaises(client.AnyRunTimeoutError):
+                async for _ in c.iter_incidents(TASK_UUID, timeout=0.1):
+                    pass
+            await asyncio.sleep(0)
+            self.assertEqual(c._routes, {})
+
+    async def test_disable_default(self):
+        async with client.AnyRunClient.connect(base_url=self.server.base_url, request_timeout=0.05) as c:
+            with self.assertRaises(client.AnyRunTimeoutError):
+                await c.get_ioc(TASK_UUID)
+            # explicit None means no deadline
+            ioc = await c.get_ioc(TASK_UUID, timeout=None)
+            self.assertTrue(ioc.raw_data)
+            # nested requests follow timeout of outer one
+            task = await c.get_single_task(TASK_UUID, timeout=None)
+            self.assertEqual(task.task_uuid, TASK_UUID)
+
+            # streams are not limited by client default
+            incidents = [incident async for incident in c.iter_incidents(TASK_UUID)]
+            self.assertTrue(incidents)
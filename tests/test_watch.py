@@ -0,0 +1,156 @@
+import asyncio
+import copy
+from pathlib import Path
+
+try:
+    from unittest import IsolatedAsyncioTestCase as AsyncTestCase
+except ImportError:
+    from aiounittest import AsyncTestCase
+
+from aio_anyrun import client
+from aio_anyrun import collection
+from aio_anyrun import fakeserver
+from aio_anyrun.filters import F
+from aio_anyrun.scheduler import RequestScheduler
+
+TEST_DATA_DIR = Path(__file__).parent / 'data'
+
+TASK_UUID = 'acdcbcf3-4b3a-42ca-aae5-736683b86800'
+UNKNOWN_UUID = '00000000-0000-0000-0000-000000000000'
+
+
+class TestWatchTask(AsyncTestCase):
+
+    async def asyncSetUp(self):
+        self.server = fakeserver.FakeAnyRunServer(TEST_DATA_DIR)
+        await self.server.start()
+        task = self.server.find_task(TASK_UUID)
+        self.final_scores = copy.deepcopy(task['scores'])
+        self.running_scores = copy.deepcopy(task['scores'])
+        self.running_scores['verdict'] = {'threat_level': 0, 'text': 'No threats detected'}
+        await self.server.update_task(TASK_UUID, {'status': 20, 'scores': self.running_scores})
+
+    async def asyncTearDown(self):
+        await self.server.close()
+
+    async def test_apply_changes_until_finished(self):
+        for lazy in (False, True):
+            with self.subTest(lazy=lazy):
+                await self.server.update_task(
+                    TASK_UUID, {'status': 20, 'remaining': 60, 'scores': self.running_scores})
+                async with client.AnyRunClient.connect(base_url=self.server.base_url, lazy=lazy) as c:
+                    updates = []
+                    async for update in c.watch_task(TASK_UUID, timeout=5):
+                        updates.append(update)
+                        if len(updates) == 1:
+                            await self.server.update_task(TASK_UUID, {'status': 60})
+                        elif len(updates) == 2:
+                            await self.server.update_task(TASK_UUID, {'scores': self.final_scores})
+                        elif len(updates) == 3:
+                            await self.server.update_task(TASK_UUID, {'status': 100}, cleared=['remaining'])
+
+                    self.assertEqual([update.kind for update in updates], ['added', 'changed', 'changed', 'changed'])
+                    self.assertEqual([update.finished for update in updates], [False, False, False, True])
+                    self.assertEqual([update.verdict_changed for update in updates], [False, False, True, False])
+                    self.assertEqual(updates[1].previous, {'status': 20})
+                    self.assertEqual(updates[3].fields, {'status', 'remaining'})
+
+                    task = updates[-1].task
+                    self.assertTrue(all(update.task is task for update in updates))
+                    self.assertIsInstance(task, collection.LazyTask if lazy else collection.Task)
+                    self.assertEqual(task.status, 100)
+                    self.assertEqual(task.verdict, 'malicious')
+                    self.assertIsNone(task['remaining'])
+                    self.assertEqual(task.raw_data['scores'], self.final_scores)
+
+                    await asyncio.sleep(0.05)
+                    self.assertEqual(c._routes, {})
+                    self.assertEqual(self.server._watchers, {})
+
+    async def test_finished_task(self):
+        await self.server.update_task(TASK_UUID, {'status': 100})
+        async with client.AnyRunClient.connect(base_url=self.server.base_url) as c:
+            updates = [update async for update in c.watch_task(TASK_UUID)]
+            self.assertEqual(len(updates), 1)
+            self.assertTrue(updates[0].finished)
+
+            with self.assertRaises(client.AnyRunError):
+                async for _ in c.watch_task(UNKNOWN_UUID):
+                    pass
+
+    async def test_stop_watching(self):
+        async with client.AnyRunClient.connect(base_url=self.server.base_url) as c:
+            watch = c.watch_task(TASK_UUID)
+            update = await watch.__anext__()
+            self.assertFalse(update.finished)
+            self.assertEqual(len(self.server._watchers), 1)
+            await watch.aclose()
+
+            await asyncio.sleep(0.05)
+            self.assertEqual(c._routes, {})
+            self.assertEqual(self.server._watchers, {})
+
+            with self.assertRaises(client.AnyRunTimeoutError):
+                async for _ in c.watch_task(TASK_UUID, timeout=0.1):
+                    pass
+            await asyncio.sleep(0.05)
+            self.assertEqual(self.server._watchers, {})
+
+            # other requests of 'tasks' collection run while watching
+            watch = c.watch_task(TASK_UUID)
+            await watch.__anext__()
+            task = await c.get_single_task(TASK_UUID, timeout=2)
+            self.assertEqual(task.task_uuid, TASK_UUID)
+            tasks = await c.get_public_tasks(timeout=2)
+            self.assertEqual(len(tasks), 50)
+            self.assertEqual(len({task.task_uuid for task in tasks}), 50)
+            await watch.aclose()
+
+
+class TestMergeBox(AsyncTestCase):
+    ''' server sends each document once per connection, like Meteor does.
+    '''
+    async def asyncSetUp(self):
+        self.server = fakeserver.FakeAnyRunServer(TEST_DATA_DIR, feed_size=3, merge_box=True)
+        await self.server.start()
+        await self.server.update_task(TASK_UUID, {'status': 20})
+
+    async def asyncTearDown(self):
+        await self.server.close()
+
+    async def test_requests_while_watching(self):
+        # watch doesn't keep the only slot after its first document
+        scheduler = RequestScheduler(capacity=1)
+        async with client.AnyRunClient.connect(base_url=self.server.base_url, scheduler=scheduler) as c:
+            watch = c.watch_task(TASK_UUID)
+            update = await watch.__anext__()
+            self.assertFalse(update.finished)
+            self.assertEqual(scheduler.in_flight, 0)
+            requests = self.server.requests.get('singleTask')
+
+            task = await c.get_single_task(TASK_UUID)
+            self.assertEqual(task.task_uuid, TASK_UUID)
+            self.assertEqual(task.status, 20)
+            # served by client, server doesn't send document held by watch again
+            self.assertEqual(self.server.requests['singleTask'], requests)
+
+            await self.server.update_task(TASK_UUID, {'status': 60})
+            update = await watch.__anext__()
+            self.assertEqual((await c.get_single_task(TASK_UUID)).status, 60)
+
+            # watched task is not sent to feed either, but merged from client
+            tasks = await c.get_public_tasks(timeout=2)
+            self.assertEqual(len(tasks), 3)
+            watched, = [task for task in tasks if task.task_uuid == TASK_UUID]
+            self.assertEqual(watched.status, 60)
+            tasks = await c.get_public_tasks(where=F('uuid') != TASK_UUID, timeout=2)
+            self.assertEqual(len(tasks), 2)
+            self.assertNotIn(TASK_UUID, [task.task_uuid for task in await c.get_public_tasks(run_type='url')])
+            await watch.aclose()
+
+            # documents are sent again after all subscriptions holding them are stopped
+            task = await c.get_single_task(TASK_UUID)
+            self.assertEqual(task.task_uuid, TASK_UUID)
+            await asyncio.sleep(0.05)
+            self.assertEqual(c._routes, {})
+            self.assertEqual(c._documents, {})